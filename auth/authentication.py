@@ -4,11 +4,18 @@ import hashlib
 import uuid
 from datetime import datetime
 import streamlit as st
+from services.metrics import METRICS
+from services.events import EventFeed
+from services.file_lock import CollectionLocks, atomic_write_text, locked
+from services.timestamps import read_timestamp_format, stamp
 
 class Authentication:
-    def __init__(self):
-        self.students_file = 'data/students.json'
-        self.admin_file = 'data/admin.json'
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
+        self.students_file = os.path.join(data_dir, 'students.json')
+        self.admin_file = os.path.join(data_dir, 'admin.json')
+        self.locks = CollectionLocks(data_dir)
+        self.events = EventFeed(data_dir)
         
         # Create admin file if it doesn't exist
         if not os.path.exists(self.admin_file):
@@ -27,8 +34,9 @@ class Authentication:
             }
             
             os.makedirs(os.path.dirname(self.admin_file), exist_ok=True)
-            with open(self.admin_file, 'w') as f:
-                json.dump([admin_data], f, indent=4)
+            with self.locks.exclusive('admin.json'):
+                if not os.path.exists(self.admin_file):
+                    atomic_write_text(self.admin_file, json.dumps([admin_data], indent=4))
         except Exception as e:
             st.error(f"Error creating default admin: {str(e)}")
     
@@ -47,8 +55,14 @@ class Authentication:
             if not os.path.exists(file_path):
                 return False, "User database not found"
             
-            with open(file_path, 'r') as f:
-                users = json.load(f)
+            with self.locks.shared(file_path):
+                with open(file_path, 'r') as f:
+                    content = f.read()
+            
+            if METRICS.enabled:
+                METRICS.add_bytes_read(os.path.basename(file_path), len(content))
+            
+            users = json.loads(content)
             
             hashed_password = self._hash_password(password)
             
@@ -71,14 +85,14 @@ class Authentication:
         except Exception as e:
             return False, f"Login error: {str(e)}"
     
+    @locked(exclusive=['students.json'])
     def register_student(self, name, email, password):
         """Register a new student"""
         try:
             # Create students file if it doesn't exist
             if not os.path.exists(self.students_file):
                 os.makedirs(os.path.dirname(self.students_file), exist_ok=True)
-                with open(self.students_file, 'w') as f:
-                    json.dump([], f)
+                atomic_write_text(self.students_file, json.dumps([]))
             
             # Check if email already exists
             with open(self.students_file, 'r') as f:
@@ -97,14 +111,16 @@ class Authentication:
                 "role": "student",
                 "approved": False,
                 "flagged": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "created_at": stamp(datetime.now(), read_timestamp_format(self.data_dir))
             }
             
             students.append(new_student)
             
             # Save updated students list
-            with open(self.students_file, 'w') as f:
-                json.dump(students, f, indent=4)
+            atomic_write_text(self.students_file, json.dumps(students, indent=4))
+            self.events.append('student_registered', {
+                key: value for key, value in new_student.items() if key != 'password'
+            })
             
             return True, "Registration successful! Please wait for admin approval."
         except Exception as e:
@@ -0,0 +1,229 @@
+import csv
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from services.isbn import isbn13_check_digit
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# sha256 of "123456", same as the mock students in FileHandler
+DEFAULT_PASSWORD_HASH = "8d969eef6ecad3c29a3a629280e686cf0c3f5d5a86aff3ca12020c923adc6c92"
+
+GENRES = [
+    "Fiction", "Science Fiction", "Fantasy", "Romance", "Mystery", "Biography",
+    "History", "Science", "Poetry", "Philosophy", "Children", "Horror"
+]
+
+TITLE_WORDS = [
+    "Shadow", "River", "Garden", "Empire", "Silent", "Night", "Winter", "Glass",
+    "Stone", "Crown", "Ocean", "Forest", "Memory", "Light", "Iron", "Paper",
+    "Storm", "Golden", "Hidden", "Last", "First", "Broken", "Secret", "Distant"
+]
+
+FIRST_NAMES = [
+    "John", "Jane", "Bob", "Alice", "Charlie", "Maria", "Ahmed", "Wei", "Fatima",
+    "Luca", "Sara", "Omar", "Priya", "Noah", "Emma", "Hassan", "Yuki", "Elena"
+]
+
+LAST_NAMES = [
+    "Doe", "Smith", "Johnson", "Brown", "Wilson", "Khan", "Garcia", "Chen",
+    "Ali", "Rossi", "Novak", "Tanaka", "Patel", "Silva", "Moreau", "Ivanova"
+]
+
+LOG_ACTIONS = [
+    ("login", "student"), ("logout", "student"), ("request_book", "student"),
+    ("request_return", "student"), ("login", "admin"), ("add_book", "admin"),
+    ("approve_issue_request", "admin"), ("approve_return_request", "admin"),
+    ("issue_book", "admin"), ("return_book", "admin"), ("student_approve", "admin")
+]
+
+
+class SyntheticLibraryGenerator:
+    """Deterministic generator for large synthetic library datasets.
+
+    The output uses the same file layout as the ``data`` directory so a
+    ``FileHandler(data_dir=...)`` can be pointed straight at it. The same
+    seed and counts always produce byte-identical files.
+    """
+
+    def __init__(self, books=1000, students=500, issues=5000, requests=1000,
+                 logs=20000, seed=42, base_date=datetime(2024, 1, 1)):
+        self.book_count = books
+        self.student_count = students
+        self.issue_count = issues
+        self.request_count = requests
+        self.log_count = logs
+        self.seed = seed
+        self.base_date = base_date
+
+    def generate(self, data_dir):
+        """Write a full dataset into data_dir and return a manifest of useful ids"""
+        rng = random.Random(self.seed)
+        os.makedirs(data_dir, exist_ok=True)
+
+        books = self._generate_books(rng)
+        students = self._generate_students(rng)
+        issued_books = self._generate_issues(rng, books, students)
+        requests = self._generate_requests(rng, books, students, issued_books)
+
+        self._write_json(os.path.join(data_dir, 'books.json'), books)
+        self._write_json(os.path.join(data_dir, 'students.json'), students)
+        self._write_json(os.path.join(data_dir, 'issued_books.json'), issued_books)
+        self._write_json(os.path.join(data_dir, 'requests.json'), requests)
+        self._write_json(os.path.join(data_dir, 'admin.json'), [self._admin()])
+        self._write_logs(rng, os.path.join(data_dir, 'logs.csv'), students)
+
+        return {
+            "book_ids": [book['id'] for book in books],
+            "isbns": [book['isbn'] for book in books],
+            "available_book_ids": [book['id'] for book in books if book['available_copies'] > 0],
+            "student_ids": [student['id'] for student in students],
+            "approved_student_ids": [s['id'] for s in students if s['approved'] and not s['flagged']],
+            "student_emails": [student['email'] for student in students],
+            "open_issue_ids": [issue['id'] for issue in issued_books if not issue['returned']],
+            "pending_request_ids": [req['id'] for req in requests if req['status'] == "pending"],
+        }
+
+    def _date(self, rng, max_days=365):
+        offset = rng.randint(0, max_days * 24 * 3600)
+        return self.base_date + timedelta(seconds=offset)
+
+    def _generate_books(self, rng):
+        books = []
+        for i in range(1, self.book_count + 1):
+            copies = rng.randint(1, 5)
+            title = " ".join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+            author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            books.append({
+                "id": f"BK-{str(i).zfill(3)}",
+                "title": f"{title} {i}",
+                "author": author,
+                "genre": rng.choice(GENRES),
+                "available": True,
+                "total_copies": copies,
+                "available_copies": copies,
+                "added_at": self._date(rng, 30).strftime(DATE_FORMAT),
+                "isbn": self._isbn(i)
+            })
+        return books
+
+    @staticmethod
+    def _isbn(i):
+        digits = f"978{i:09d}"
+        return digits + isbn13_check_digit(digits)
+
+    def _generate_students(self, rng):
+        students = []
+        for i in range(1, self.student_count + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            students.append({
+                "id": f"STU-{i:06X}",
+                "name": f"{first} {last}",
+                "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+                "password": DEFAULT_PASSWORD_HASH,
+                "role": "student",
+                "approved": rng.random() < 0.9,
+                "flagged": rng.random() < 0.05,
+                "created_at": self._date(rng, 60).strftime(DATE_FORMAT)
+            })
+        return students
+
+    def _generate_issues(self, rng, books, students):
+        issued_books = []
+        approved = [student for student in students if student['approved']] or students
+        now = self.base_date + timedelta(days=365)
+
+        for i in range(1, self.issue_count + 1):
+            book = rng.choice(books)
+            student = rng.choice(approved)
+            issue_date = self._date(rng)
+            due_date = issue_date + timedelta(days=7)
+
+            # Only leave an issue open while the book still has a free copy
+            returned = rng.random() < 0.85 or book['available_copies'] == 0
+            if returned:
+                return_date = min(issue_date + timedelta(days=rng.randint(0, 12), hours=rng.randint(0, 23)), now)
+            else:
+                book['available_copies'] -= 1
+                book['available'] = book['available_copies'] > 0
+
+            issued_books.append({
+                "id": f"ISS-{i}",
+                "student_id": student['id'],
+                "book_id": book['id'],
+                "issue_date": issue_date.strftime(DATE_FORMAT),
+                "due_date": due_date.strftime(DATE_FORMAT),
+                "returned": returned,
+                "return_date": return_date.strftime(DATE_FORMAT) if returned else None
+            })
+
+        return issued_books
+
+    def _generate_requests(self, rng, books, students, issued_books):
+        requests = []
+        open_issues = [issue for issue in issued_books if not issue['returned']]
+        returned_issues = [issue for issue in issued_books if issue['returned']]
+
+        for i in range(1, self.request_count + 1):
+            requested_at = self._date(rng)
+            status = "pending" if rng.random() < 0.2 else "approved"
+
+            # Pending returns point at open issues (one each), approved ones at returned issues
+            candidates = open_issues if status == "pending" else returned_issues
+            if candidates and rng.random() < 0.3:
+                issue = candidates.pop(rng.randrange(len(candidates))) if status == "pending" else rng.choice(candidates)
+                if status == "pending":
+                    issue['return_requested'] = True
+                request = {
+                    "id": f"REQ-{i}",
+                    "type": "return",
+                    "student_id": issue['student_id'],
+                    "book_id": issue['book_id'],
+                    "issue_id": issue['id'],
+                    "requested_at": requested_at.strftime(DATE_FORMAT),
+                    "status": status
+                }
+            else:
+                request = {
+                    "id": f"REQ-{i}",
+                    "type": "issue",
+                    "student_id": rng.choice(students)['id'],
+                    "book_id": rng.choice(books)['id'],
+                    "requested_at": requested_at.strftime(DATE_FORMAT),
+                    "status": status
+                }
+
+            if status == "approved":
+                request['approved_at'] = (requested_at + timedelta(hours=rng.randint(1, 48))).strftime(DATE_FORMAT)
+
+            requests.append(request)
+
+        return requests
+
+    def _admin(self):
+        return {
+            "id": "admin-001",
+            "name": "Library Admin",
+            "email": "admin@library.com",
+            "password": "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9",  # admin123
+            "role": "admin",
+            "created_at": self.base_date.strftime(DATE_FORMAT)
+        }
+
+    def _write_logs(self, rng, file_path, students):
+        timestamps = sorted(self._date(rng) for _ in range(self.log_count))
+
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'user_id', 'user_role', 'action', 'details'])
+
+            for timestamp in timestamps:
+                action, role = rng.choice(LOG_ACTIONS)
+                user_id = "admin-001" if role == "admin" else rng.choice(students)['id']
+                writer.writerow([timestamp.strftime(DATE_FORMAT), user_id, role, action, f"Synthetic {action} event"])
+
+    def _write_json(self, file_path, data):
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=4)
@@ -0,0 +1,311 @@
+"""Concurrent load test for the data layer.
+
+Drives a storage backend from a thread pool and/or a process pool with a
+realistic mix of logins, browsing, requests, approvals and returns, then
+checks the data invariants that lost updates would break.
+
+The backend is given as "module:Class" and is constructed with
+``data_dir=...``, so any class exposing the FileHandler API can be tested:
+
+    python -m benchmarks.load_test --mode thread --workers 8 --ops 200
+    python -m benchmarks.load_test --mode process --backend services.file_handler:FileHandler
+    python -m benchmarks.load_test --backend services.storage_server:StorageClient --serve
+"""
+import argparse
+import importlib
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from auth.authentication import Authentication
+from benchmarks.data_generator import SyntheticLibraryGenerator
+from benchmarks.run_benchmarks import summarize
+from services import page_data
+from services.inventory import CopyInventory
+
+DEFAULT_BACKEND = "services.file_handler:FileHandler"
+
+DEFAULT_MIX = {
+    "login": 20,
+    "browse": 35,
+    "request_issue": 15,
+    "approve_issue": 10,
+    "request_return": 10,
+    "approve_return": 10,
+}
+
+
+def load_backend(spec, data_dir):
+    """Construct a backend from a "module:Class" spec"""
+    module_name, class_name = spec.split(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(data_dir=data_dir)
+
+
+class LoadWorker:
+    """Runs one worker's share of the operation mix against a backend"""
+
+    def __init__(self, backend, auth, manifest, rng):
+        self.backend = backend
+        self.auth = auth
+        self.manifest = manifest
+        self.rng = rng
+
+    def login(self):
+        email = self.rng.choice(self.manifest['student_emails'])
+        success, _ = self.auth.login(email, "123456", "student")
+        return success
+
+    def browse(self):
+        books = self.backend.read_json_file('books.json')
+        page_data.filter_books(books, self.rng.choice(["", "shadow", "river"]), "All", "Available")
+        return True
+
+    def request_issue(self):
+        student_id = self.rng.choice(self.manifest['approved_student_ids'])
+        book_id = self.rng.choice(self.manifest['book_ids'])
+        success, _ = self.backend.request_book_issue(student_id, book_id)
+        return success
+
+    def _approve_pending(self, request_type):
+        requests = self.backend.read_json_file('requests.json')
+        pending = [req['id'] for req in requests if req['status'] == "pending" and req['type'] == request_type]
+        if not pending:
+            return False
+        success, _ = self.backend.approve_book_request(self.rng.choice(pending))
+        return success
+
+    def approve_issue(self):
+        return self._approve_pending("issue")
+
+    def request_return(self):
+        issued_books = self.backend.read_json_file('issued_books.json')
+        open_issues = [
+            issue for issue in issued_books
+            if not issue.get('returned', False) and not issue.get('return_requested', False)
+        ]
+        if not open_issues:
+            return False
+        issue = self.rng.choice(open_issues)
+        success, _ = self.backend.request_book_return(issue['student_id'], issue['id'])
+        return success
+
+    def approve_return(self):
+        return self._approve_pending("return")
+
+    def run(self, mix, ops):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        samples = []
+
+        for _ in range(ops):
+            name = self.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = getattr(self, name)()
+                error = None
+            except Exception as e:
+                ok = False
+                error = str(e)
+            samples.append((name, time.perf_counter() - start, bool(ok), error))
+
+        return samples
+
+
+def run_worker(backend_spec, data_dir, manifest, mix, ops, seed):
+    """Entry point for a pool worker (module level so process pools can pickle it)"""
+    backend = load_backend(backend_spec, data_dir)
+    auth = Authentication(data_dir=data_dir)
+    return LoadWorker(backend, auth, manifest, random.Random(seed)).run(mix, ops)
+
+
+def check_invariants(backend):
+    """Return a list of human readable invariant violations"""
+    violations = []
+    books = backend.read_json_file('books.json')
+    issued_books = backend.read_json_file('issued_books.json')
+    requests = backend.read_json_file('requests.json')
+    students = backend.read_json_file('students.json')
+
+    for name, records in (("books", books), ("issued_books", issued_books),
+                          ("requests", requests), ("students", students)):
+        duplicates = [record_id for record_id, count in Counter(r['id'] for r in records).items() if count > 1]
+        if duplicates:
+            violations.append(f"{name}: {len(duplicates)} duplicate ids (e.g. {duplicates[:3]})")
+
+    # At most one open request per student, title and type
+    open_requests = Counter(
+        (req['student_id'], req['book_id'], req['type']) for req in requests if req['status'] in ("pending", "on_hold")
+    )
+    repeated = [key for key, count in open_requests.items() if count > 1]
+    if repeated:
+        violations.append(f"requests: {len(repeated)} duplicate open requests (e.g. {repeated[:3]})")
+
+    open_counts = Counter(issue['book_id'] for issue in issued_books if not issue.get('returned', False))
+    # Copies set aside for holds are off the shelf but not yet issued
+    reserved_counts = Counter(
+        req['book_id'] for req in requests
+        if req['status'] == "pending" and req.get('reserved_copy_id')
+    )
+    waiting_counts = Counter(req['book_id'] for req in requests if req['status'] == "on_hold")
+    for book in books:
+        expected = book.get('total_copies', 1) - open_counts.get(book['id'], 0) - reserved_counts.get(book['id'], 0)
+        available = book.get('available_copies', 0)
+        if available != expected:
+            violations.append(
+                f"{book['id']}: available_copies={available}, expected {expected} "
+                f"(total {book.get('total_copies', 1)}, open issues {open_counts.get(book['id'], 0)}, "
+                f"reserved {reserved_counts.get(book['id'], 0)})"
+            )
+        if available > 0 and waiting_counts.get(book['id']):
+            violations.append(f"{book['id']}: {available} copies on the shelf with {waiting_counts[book['id']]} holds waiting")
+        if available < 0:
+            violations.append(f"{book['id']}: negative available_copies {available}")
+        if book.get('available') != (available > 0):
+            violations.append(f"{book['id']}: available flag {book.get('available')} disagrees with {available} copies")
+
+    inventory = CopyInventory(backend.read_json_file('copies.json') or {})
+    for book in books:
+        title = inventory.title(book['id'])
+        if title is not None and title.available != book.get('available_copies', 0):
+            violations.append(f"{book['id']}: {title.available} copies on the shelf, book says {book.get('available_copies', 0)}")
+
+    issues_by_id = page_data.index_by_id(issued_books)
+    for req in requests:
+        if req['type'] == "return" and req['status'] == "approved":
+            issue = issues_by_id.get(req.get('issue_id'))
+            if issue and not issue.get('returned', False):
+                violations.append(f"{req['id']}: approved return but {issue['id']} is still open")
+
+    # Every committed issue and return is in the change feed exactly once, in sequence
+    events = backend.events_since(0)
+    if [event['seq'] for event in events] != list(range(1, len(events) + 1)):
+        violations.append("events: sequence numbers are not contiguous")
+    created = Counter(event['data']['id'] for event in events if event['type'] == "issue_created")
+    returned = Counter(event['data']['issue_id'] for event in events if event['type'] == "issue_returned")
+    for counts in (created, returned):
+        for issue_id in [issue_id for issue_id, count in counts.items() if count > 1]:
+            violations.append(f"events: {issue_id} recorded more than once")
+    for issue_id in created:
+        if issue_id not in issues_by_id:
+            violations.append(f"events: issue_created for unknown issue {issue_id}")
+    for issue_id in returned:
+        if not issues_by_id.get(issue_id, {}).get('returned', False):
+            violations.append(f"events: issue_returned for {issue_id} which is still open")
+
+    return violations
+
+
+def run_load_test(backend_spec=DEFAULT_BACKEND, mode="thread", workers=4, ops=100,
+                  mix=None, seed=7, dataset=None, data_dir=None, serve=False):
+    """Run a load test and return a result document.
+
+    With serve=True a StorageServer for the generated dataset runs in a
+    background thread for the duration of the test.
+    """
+    mix = mix or DEFAULT_MIX
+    dataset = dataset or dict(books=200, students=100, issues=1000, requests=200, logs=1000)
+    owns_data_dir = data_dir is None
+    data_dir = data_dir or tempfile.mkdtemp(prefix="library-load-")
+    server = None
+
+    try:
+        manifest = SyntheticLibraryGenerator(seed=seed, **dataset).generate(data_dir)
+
+        if serve:
+            from services.storage_server import StorageServer
+            server = StorageServer(data_dir)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        pool_class = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+
+        start = time.perf_counter()
+        with pool_class(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_worker, backend_spec, data_dir, manifest, mix, ops, seed * 1000 + i)
+                for i in range(workers)
+            ]
+            samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - start
+
+        violations = check_invariants(load_backend(backend_spec, data_dir))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if owns_data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    by_operation = {}
+    for name, latency, ok, error in samples:
+        entry = by_operation.setdefault(name, {"latencies": [], "ok": 0, "failed": 0, "errors": Counter()})
+        entry["latencies"].append(latency)
+        entry["ok" if ok else "failed"] += 1
+        if error:
+            entry["errors"][error] += 1
+
+    return {
+        "backend": backend_spec,
+        "mode": mode,
+        "workers": workers,
+        "ops_per_worker": ops,
+        "dataset": dataset,
+        "elapsed_s": elapsed,
+        "throughput_ops_s": len(samples) / elapsed if elapsed else 0.0,
+        "operations": {
+            name: dict(summarize(entry["latencies"]), ok=entry["ok"], failed=entry["failed"],
+                       errors=dict(entry["errors"].most_common(5)))
+            for name, entry in sorted(by_operation.items())
+        },
+        "violations": violations,
+    }
+
+
+def print_report(result):
+    print(f"backend={result['backend']} mode={result['mode']} workers={result['workers']} "
+          f"ops/worker={result['ops_per_worker']}")
+    print(f"elapsed {result['elapsed_s']:.2f}s, throughput {result['throughput_ops_s']:.1f} ops/s\n")
+    print(f"{'operation':<18}{'ok':>6}{'failed':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, summary in result["operations"].items():
+        print(f"{name:<18}{summary['ok']:>6}{summary['failed']:>8}{summary['p50_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+        for error, count in summary["errors"].items():
+            print(f"    {count}x exception: {error}")
+
+    if result["violations"]:
+        print(f"\n{len(result['violations'])} invariant violations:")
+        for violation in result["violations"][:20]:
+            print(f"  {violation}")
+    else:
+        print("\nAll invariants hold")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the library data layer")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, help="storage backend as module:Class")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=100, help="operations per worker")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mix", help="JSON object of operation weights, e.g. '{\"browse\": 50, \"login\": 50}'")
+    parser.add_argument("--output", help="write the result document as JSON")
+    parser.add_argument("--serve", action="store_true", help="run a storage server for the generated dataset")
+    args = parser.parse_args(argv)
+
+    mix = json.loads(args.mix) if args.mix else None
+    result = run_load_test(args.backend, args.mode, args.workers, args.ops, mix, args.seed, serve=args.serve)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+
+    return 1 if result["violations"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
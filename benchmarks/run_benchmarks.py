@@ -0,0 +1,313 @@
+"""Benchmark suite for the data layer.
+
+Generates synthetic libraries of increasing size, times every FileHandler
+method, Authentication.login and the page data-prep helpers against them,
+and writes latency percentiles, scaling curves and the memory footprint
+of the logs DataFrame to a JSON file.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes small,medium --repeat 20
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/previous.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from auth.authentication import Authentication
+from benchmarks.data_generator import SyntheticLibraryGenerator
+from services import circulation, page_data
+from services.async_file_handler import AsyncFileHandler, run_async
+from services.file_handler import FileHandler
+from services.timestamps import day
+
+SIZES = {
+    "tiny": dict(books=100, students=50, issues=500, requests=100, logs=1000),
+    "small": dict(books=1000, students=500, issues=5000, requests=1000, logs=10000),
+    "medium": dict(books=10000, students=5000, issues=50000, requests=10000, logs=100000),
+    "large": dict(books=50000, students=20000, issues=250000, requests=50000, logs=500000),
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Latency summary (milliseconds) for a list of samples in seconds"""
+    values = sorted(sample * 1000.0 for sample in samples)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) if values else 0.0,
+        "min_ms": values[0] if values else 0.0,
+        "p50_ms": percentile(values, 50),
+        "p90_ms": percentile(values, 90),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else 0.0,
+    }
+
+
+class BenchmarkRunner:
+    """Times the data layer against a synthetic dataset of one size"""
+
+    def __init__(self, data_dir, manifest, repeat=20):
+        self.data_dir = data_dir
+        self.manifest = manifest
+        self.repeat = repeat
+        self.file_handler = FileHandler(data_dir=data_dir)
+        self.auth = Authentication(data_dir=data_dir)
+
+    def time_call(self, func, args_for_run):
+        """Call func(*args_for_run(i)) repeat times and return the samples"""
+        samples = []
+        for i in range(self.repeat):
+            args = args_for_run(i)
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    def _pick(self, key, i):
+        values = self.manifest[key]
+        return values[i % len(values)] if values else None
+
+    def read_benchmarks(self):
+        fh = self.file_handler
+        return {
+            "read_json_file[books]": (fh.read_json_file, lambda i: ('books.json',)),
+            "read_json_file[students]": (fh.read_json_file, lambda i: ('students.json',)),
+            "read_json_file[issued_books]": (fh.read_json_file, lambda i: ('issued_books.json',)),
+            "read_json_file[requests]": (fh.read_json_file, lambda i: ('requests.json',)),
+            "get_logs": (fh.get_logs, lambda i: ()),
+            "get_logs[limit=10]": (fh.get_logs, lambda i: (10,)),
+            "get_logs[no_details]": (fh.get_logs, lambda i: (None, False)),
+            "get_analytics": (fh.get_analytics, lambda i: ()),
+            "ensure_data_integrity": (fh.ensure_data_integrity, lambda i: ()),
+            "login[student]": (self.auth.login, lambda i: (self._pick('student_emails', i), "123456", "student")),
+            "login[admin]": (self.auth.login, lambda i: ("admin@library.com", "admin123", "admin")),
+        }
+
+    def page_benchmarks(self):
+        fh = self.file_handler
+        books = fh.read_json_file('books.json')
+        catalog = fh.get_catalog()
+        logs = fh.get_logs()
+        students = fh.read_json_file('students.json')
+        issued_books = fh.read_json_file('issued_books.json')
+        requests = fh.read_json_file('requests.json')
+        current_issues = [issue for issue in issued_books if not issue.get('returned', False)]
+        rollups = fh.get_circulation_rollups()
+        issue_days = sorted(day(issue['issue_date']) for issue in issued_books) or ["2024-01-01"]
+        first_day, last_day = issue_days[0], issue_days[-1]
+        issues = circulation.issues_frame(issued_books)
+
+        async_handler = AsyncFileHandler(fh)
+
+        def admin_overview_serial():
+            fh.get_analytics()
+            fh.get_logs(10)
+            for file_name in ('issued_books.json', 'books.json', 'students.json'):
+                fh.read_json_file(file_name)
+
+        async def admin_overview_gather():
+            _, (issued, book_list, student_list) = await asyncio.gather(
+                async_handler.get_logs(10),
+                async_handler.read_collections('issued_books.json', 'books.json', 'students.json')
+            )
+            fh.compute_analytics(book_list, student_list, issued)
+
+        def student_page(i):
+            _, current, past = page_data.student_issues(issued_books, self._pick('student_ids', i))
+            page_data.student_current_rows(current, books)
+            page_data.student_history_rows(past, books)
+
+        def filter_logs(logs, action, role):
+            return logs[(logs['action'] == action) & (logs['user_role'] == role)]
+
+        return {
+            "page.due_soon_rows": (page_data.due_soon_rows, lambda i: (issued_books, books, students)),
+            "page.currently_issued_rows": (page_data.currently_issued_rows, lambda i: (current_issues, books, students)),
+            "page.request_rows": (page_data.request_rows, lambda i: (requests, books, students, "issue")),
+            "page.filter_books": (page_data.filter_books, lambda i: (books, "shadow", "Fiction", "Available")),
+            "page.catalog_filter_books": (catalog.filter_books, lambda i: ("shadow", "Fiction", "Available", "title")),
+            "page.find_book_by_isbn": (fh.find_book_by_isbn, lambda i: (self._pick('isbns', i),)),
+            "page.catalog_filter_books[isbn]": (catalog.filter_books, lambda i: (self._pick('isbns', i),)),
+            "page.picker_books": (fh.search_books, lambda i: ("th", 20, True)),
+            "page.picker_students": (fh.search_students, lambda i: ("a", 20, True)),
+            "page.student_books": (student_page, lambda i: (i,)),
+            "page.filter_logs": (filter_logs, lambda i: (logs, "login", "student")),
+            "page.circulation_frame": (circulation.issues_frame, lambda i: (issued_books,)),
+            "page.circulation_daily": (circulation.daily_series, lambda i: (rollups, issues, first_day, last_day)),
+            "page.circulation_utilization[genre]": (circulation.utilization, lambda i: (issues, books, first_day, last_day, "genre")),
+            "page.circulation_top_borrowers": (circulation.top_borrowers, lambda i: (issues, students, first_day, last_day)),
+            "page.admin_overview_load[serial]": (admin_overview_serial, lambda i: ()),
+            "page.admin_overview_load[gather]": (lambda: run_async(admin_overview_gather()), lambda i: ()),
+        }
+
+    def write_benchmarks(self):
+        fh = self.file_handler
+        return {
+            "log_action": (fh.log_action, lambda i: ("admin-001", "admin", "benchmark", f"Benchmark event {i}")),
+            "add_book": (fh.add_book, lambda i: (f"Benchmark Book {i}", "Bench Author", "Fiction", 2)),
+            "update_book": (fh.update_book, lambda i: (self._pick('book_ids', i), f"Updated {i}", "Bench Author", "Fiction", 5, 5)),
+            "request_book_issue": (fh.request_book_issue, lambda i: (self._pick('approved_student_ids', i), self._pick('available_book_ids', i))),
+            "approve_book_request": (fh.approve_book_request, lambda i: (self._pick('pending_request_ids', i),)),
+            "issue_book": (fh.issue_book, lambda i: (self._pick('approved_student_ids', i), self._pick('available_book_ids', i))),
+            "return_book": (fh.return_book, lambda i: (self._pick('open_issue_ids', i),)),
+            "return_books[stack=50]": (fh.return_books, lambda i: ([self._pick('open_issue_ids', 50 * i + k) for k in range(50)],)),
+            "issue_books[stack=10]": (fh.issue_books, lambda i: (self._pick('approved_student_ids', i), [self._pick('available_book_ids', 10 * i + k) for k in range(10)])),
+            "request_book_return": (fh.request_book_return, lambda i: ("STU-NOPE", self._pick('open_issue_ids', i))),
+            "approve_student": (fh.approve_student, lambda i: (self._pick('student_ids', i),)),
+            "flag_student": (fh.flag_student, lambda i: (self._pick('student_ids', i), i % 2 == 0)),
+            "block_student": (fh.block_student, lambda i: ("STU-NOPE",)),
+            "delete_book": (fh.delete_book, lambda i: ("BK-NOPE",)),
+        }
+
+    def memory_report(self):
+        """Deep memory (MB) of the logs DataFrame as get_logs loads it, and as plain strings for comparison"""
+        fh = self.file_handler
+        untyped = pd.read_csv(fh.logs_file)
+        return {
+            "logs[untyped]": untyped.memory_usage(deep=True).sum() / 1e6,
+            "get_logs": fh.get_logs().memory_usage(deep=True).sum() / 1e6,
+            "get_logs[no_details]": fh.get_logs(include_details=False).memory_usage(deep=True).sum() / 1e6,
+        }
+
+    def run(self, only=None):
+        """Run every benchmark group and return {name: summary}"""
+        results = {}
+        # Reads first so the writes below don't skew the dataset they measure
+        for group in (self.read_benchmarks, self.page_benchmarks, self.write_benchmarks):
+            for name, (func, args_for_run) in group().items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                results[name] = summarize(self.time_call(func, args_for_run))
+        return results
+
+
+def run_suite(sizes, repeat=20, seed=42, only=None, keep_data=False):
+    """Benchmark every requested size and return the full result document"""
+    document = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "seed": seed,
+        "sizes": {},
+        "scaling": {},
+    }
+
+    for size in sizes:
+        counts = SIZES[size]
+        data_dir = tempfile.mkdtemp(prefix=f"library-bench-{size}-")
+        try:
+            manifest = SyntheticLibraryGenerator(seed=seed, **counts).generate(data_dir)
+            runner = BenchmarkRunner(data_dir, manifest, repeat=repeat)
+            results = runner.run(only)
+            document["sizes"][size] = {"counts": counts, "results": results, "memory_mb": runner.memory_report()}
+            print(f"[{size}] {len(results)} benchmarks done")
+        finally:
+            if keep_data:
+                print(f"[{size}] dataset kept in {data_dir}")
+            else:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    # Scaling curves: p50 per operation across the sizes that were run
+    for size, entry in document["sizes"].items():
+        for name, summary in entry["results"].items():
+            document["scaling"].setdefault(name, []).append({
+                "size": size,
+                "records": entry["counts"]["issues"],
+                "p50_ms": summary["p50_ms"],
+                "p99_ms": summary["p99_ms"],
+            })
+
+    return document
+
+
+def compare(current, baseline, threshold=0.2):
+    """Return (name, size, baseline_p50, current_p50, change) rows that regressed"""
+    regressions = []
+    for size, entry in current["sizes"].items():
+        base_entry = baseline.get("sizes", {}).get(size)
+        if not base_entry:
+            continue
+        for name, summary in entry["results"].items():
+            base = base_entry["results"].get(name)
+            if not base or base["p50_ms"] <= 0:
+                continue
+            change = (summary["p50_ms"] - base["p50_ms"]) / base["p50_ms"]
+            if change > threshold:
+                regressions.append((name, size, base["p50_ms"], summary["p50_ms"], change))
+    return regressions
+
+
+def print_report(document):
+    for size, entry in document["sizes"].items():
+        print(f"\n== {size} ({entry['counts']}) ==")
+        print(f"{'operation':<34}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, summary in entry["results"].items():
+            print(f"{name:<34}{summary['p50_ms']:>10.3f}{summary['p90_ms']:>10.3f}"
+                  f"{summary['p99_ms']:>10.3f}{summary['max_ms']:>10.3f}")
+        if entry.get("memory_mb"):
+            print(f"{'memory':<34}{'MB':>10}")
+            for name, megabytes in entry["memory_mb"].items():
+                print(f"{name:<34}{megabytes:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the library data layer")
+    parser.add_argument("--sizes", default="tiny,small", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=20, help="samples per operation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", default="", help="comma separated substrings of benchmark names")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous result JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown that counts as a regression")
+    parser.add_argument("--keep-data", action="store_true", help="keep the generated datasets")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    only = [name.strip() for name in args.only.split(",") if name.strip()]
+    document = run_suite(sizes, args.repeat, args.seed, only, args.keep_data)
+    print_report(document)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=4)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for name, size, before, after, change in regressions:
+                print(f"  {name} [{size}]: {before:.3f} ms -> {after:.3f} ms (+{change:.0%})")
+            return 1
+        print("\nNo regressions against baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,25 @@
+import streamlit as st
+
+# Matches offered by a picker; type more of the title, name or id to narrow them
+PICKER_LIMIT = 20
+
+
+def search_picker(label, search, format_option, key, placeholder="Type the start of a title or ID, or an ISBN",
+                  empty_message="No matches", limit=PICKER_LIMIT):
+    """Search box plus a selectbox of the top matches; returns the chosen record or None.
+
+    search(prefix, limit) queries the data layer (e.g. FileHandler.search_books),
+    so only the matches are sent to the browser, not the whole collection.
+    """
+    query = st.text_input(f"Search: {label}", key=f"{key}_query", placeholder=placeholder)
+    matches = search(query.strip(), limit)
+
+    if not matches:
+        st.info(empty_message)
+        return None
+
+    # Keyed by id: two records can share a label (e.g. two editions of a title)
+    options = {record['id']: record for record in matches}
+    selected = st.selectbox(label, list(options.keys()), format_func=lambda record_id: format_option(options[record_id]),
+                            key=f"{key}_choice")
+    return options[selected]
@@ -0,0 +1,20 @@
+import uuid
+
+import streamlit as st
+
+
+def submission_key(form):
+    """Idempotency key for the next submission of a form, kept across reruns until it succeeds.
+
+    A retried or repeated submission sends the same key, so the data layer
+    returns the request it already created instead of adding another.
+    """
+    state_key = f"{form}_submission_key"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = uuid.uuid4().hex
+    return st.session_state[state_key]
+
+
+def submission_done(form):
+    """Start a fresh key for the form's next submission"""
+    st.session_state.pop(f"{form}_submission_key", None)
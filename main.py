@@ -9,6 +9,7 @@ from pages.student_dashboard import StudentDashboard
 from pages.login_page import LoginPage
 from pages.register_page import RegisterPage
 from services.file_handler import FileHandler
+from services.metrics import METRICS
 
 # Initialize session state if not already done
 if 'logged_in' not in st.session_state:
@@ -22,8 +23,14 @@ if not os.path.exists('data'):
     os.makedirs('data')
 
 # Initialize data files if they don't exist
-file_handler = FileHandler()
+# (through the local storage server when LIBRARY_STORAGE_SOCKET is set)
+if os.environ.get('LIBRARY_STORAGE_SOCKET'):
+    from services.storage_server import StorageClient
+    file_handler = StorageClient(socket_path=os.environ['LIBRARY_STORAGE_SOCKET'])
+else:
+    file_handler = FileHandler()
 file_handler.initialize_data_files()
+METRICS.instrument(file_handler, "file_handler")
 
 # Set page config
 st.set_page_config(
@@ -89,6 +96,7 @@ st.markdown("<h1 class='main-header'>📚 Library Management System</h1>", unsaf
 
 # Authentication instance
 auth = Authentication()
+METRICS.instrument(auth, "authentication")
 
 # Main application flow
 def main():
@@ -168,4 +176,5 @@ def main():
             st.warning(f"Could not load sample books: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    METRICS.maybe_export(file_handler.metrics_file)
\ No newline at end of file
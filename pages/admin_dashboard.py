@@ -1,10 +1,21 @@
+import asyncio
+import os
+import tempfile
+import time
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+from components.pickers import search_picker
+from services import circulation, export, page_data
+from services.holds import overdue_holds
+from services.metrics import METRICS
+from services.timestamps import to_datetime, to_display
+from services.async_file_handler import AsyncFileHandler, run_async
 
 class AdminDashboard:
     def __init__(self, file_handler):
         self.file_handler = file_handler
+        self.async_file_handler = AsyncFileHandler(file_handler)
     
 
 
@@ -13,54 +24,48 @@ class AdminDashboard:
     def show(self):
         st.markdown("<h2 class='sub-header'>Admin Dashboard</h2>", unsafe_allow_html=True)
         
-        # Tabs for different admin functions
-        tabs = st.tabs(["Dashboard", "Books", "Students", "Issue/Return", "Pending Requests", "Logs"])
-        
-        # Dashboard Tab
-        with tabs[0]:
-            self._show_dashboard()
-        
-        # Books Tab
-        with tabs[1]:
-            self._show_books_management()
-        
-        # Students Tab
-        with tabs[2]:
-            self._show_students_management()
-        
-        # Issue/Return Tab
-        with tabs[3]:
-            self._show_issue_return()
-        
-        # Pending Requests Tab
-        with tabs[4]:
-            self._show_pending_requests()
-        
-        # Logs Tab
-        with tabs[5]:
-            self._show_logs()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        # Sections of the admin dashboard; only the open one runs
+        self._show_sections({
+            "Dashboard": self._show_dashboard,
+            "Books": self._show_books_management,
+            "Students": self._show_students_management,
+            "Issue/Return": self._show_issue_return,
+            "Pending Requests": self._show_pending_requests,
+            "Logs": self._show_logs,
+            "Fines": self._show_fines,
+            "Analytics": self._show_circulation_analytics,
+            "Maintenance": self._show_maintenance,
+            "Performance": self._show_performance
+        }, key="admin_section", fragments=True)
+    
+    def _show_sections(self, sections, key, fragments=False):
+        """Tabs that only run the open section.
+        
+        Plain st.tabs runs every tab body (and the data loads in it) on each
+        rerun. With a key and on_change="rerun" the tabs track which one is
+        open, so hidden sections are skipped. With fragments=True each
+        section runs as a fragment: its own widgets rerun only that section.
+        """
+        tabs = st.tabs(list(sections), key=key, on_change="rerun")
+        
+        for tab, render in zip(tabs, sections.values()):
+            if tab.open:
+                with tab:
+                    if fragments:
+                        st.fragment(render)()
+                    else:
+                        render()
+    
+    def _open_tabs(self, labels, key):
+        """Lazy st.tabs for sections written inline: check .open before running a body"""
+        return st.tabs(labels, key=key, on_change="rerun")
     
     def _show_dashboard(self):
         st.markdown("<h3>Library Overview</h3>", unsafe_allow_html=True)
         
-        # Get analytics
-        analytics = self.file_handler.get_analytics()
+        # Load everything the overview needs concurrently, reading each file once
+        logs, issued_books, books, students = run_async(self._load_dashboard_data())
+        analytics = self.file_handler.compute_analytics(books, students, issued_books)
         
         if not analytics:
             st.error("Could not load analytics data")
@@ -101,8 +106,6 @@ class AdminDashboard:
         # Recent activity
         st.markdown("<h3>Recent Activity</h3>", unsafe_allow_html=True)
         
-        logs = self.file_handler.get_logs(limit=10)
-        
         if not logs.empty:
             st.dataframe(logs, use_container_width=True)
         else:
@@ -111,32 +114,8 @@ class AdminDashboard:
         # Books due soon
         st.markdown("<h3>Books Due Soon</h3>", unsafe_allow_html=True)
         
-        issued_books = self.file_handler.read_json_file('issued_books.json')
-        books = self.file_handler.read_json_file('books.json')
-        students = self.file_handler.read_json_file('students.json')
-        
         # Filter for books that are not returned and due within 3 days
-        current_date = datetime.now()
-        due_soon = []
-        
-        for issue in issued_books:
-            if not issue.get('returned', False):
-                due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                days_left = (due_date - current_date).days
-                
-                if days_left <= 3:
-                    # Get book and student details
-                    book = next((b for b in books if b['id'] == issue['book_id']), None)
-                    student = next((s for s in students if s['id'] == issue['student_id']), None)
-                    
-                    if book and student:
-                        due_soon.append({
-                            "Issue ID": issue['id'],
-                            "Book": book['title'],
-                            "Student": student['name'],
-                            "Due Date": issue['due_date'],
-                            "Days Left": days_left
-                        })
+        due_soon = page_data.due_soon_rows(issued_books, books, students)
         
         if due_soon:
             due_soon_df = pd.DataFrame(due_soon)
@@ -161,84 +140,59 @@ class AdminDashboard:
 
 
     
+    async def _load_dashboard_data(self):
+        handler = self.async_file_handler
+        return await asyncio.gather(
+            handler.get_logs(limit=10),
+            handler.read_json_file('issued_books.json'),
+            handler.read_json_file('books.json'),
+            handler.read_json_file('students.json')
+        )
+    
     def _show_books_management(self):
         st.markdown("<h3>Books Management</h3>", unsafe_allow_html=True)
         
         # Tabs for different book operations
-        book_tabs = st.tabs(["All Books", "Add Book", "Edit Book", "Delete Book"])
-        
-        # All Books Tab
-        with book_tabs[0]:
-            self._show_all_books()
-        
-        # Add Book Tab
-        with book_tabs[1]:
-            self._show_add_book()
-        
-        # Edit Book Tab
-        with book_tabs[2]:
-            self._show_edit_book()
-        
-        # Delete Book Tab
-        with book_tabs[3]:
-            self._show_delete_book()
+        self._show_sections({
+            "All Books": self._show_all_books,
+            "Add Book": self._show_add_book,
+            "Import Books": self._show_import_books,
+            "Edit Book": self._show_edit_book,
+            "Copies": self._show_book_copies,
+            "Delete Book": self._show_delete_book
+        }, key="admin_books_section")
     
-
-
-
-
-
     def _show_all_books(self):
         st.markdown("<h4>All Books</h4>", unsafe_allow_html=True)
         
-        books = self.file_handler.read_json_file('books.json')
+        catalog = self.file_handler.get_catalog()
         
-        if not books:
+        if not len(catalog):
             st.info("No books found")
             return
         
         # Search and filter
-        search_col, filter_col = st.columns(2)
+        search_col, filter_col, sort_col = st.columns(3)
         
         with search_col:
-            search_term = st.text_input("Search by title or author")
+            search_term = st.text_input("Search by title, author or ISBN")
         
         with filter_col:
             genre_filter = st.selectbox(
                 "Filter by genre",
-                ["All"] + sorted(list(set(book['genre'] for book in books)))
+                ["All"] + catalog.genres
             )
         
-        # Apply filters
-        filtered_books = books
-        
-        if search_term:
-            filtered_books = [
-                book for book in filtered_books
-                if search_term.lower() in book['title'].lower() or search_term.lower() in book['author'].lower()
-            ]
+        with sort_col:
+            sort_label = st.selectbox("Sort by", list(page_data.BOOK_SORT_OPTIONS))
         
-        if genre_filter != "All":
-            filtered_books = [book for book in filtered_books if book['genre'] == genre_filter]
+        # Apply filters
+        sort_by, descending = page_data.BOOK_SORT_OPTIONS[sort_label]
+        positions = catalog.filter_books(search_term, genre_filter, sort_by=sort_by, descending=descending)
         
         # Display books
-        if filtered_books:
-            books_data = []
-            
-            for book in filtered_books:
-                books_data.append({
-                    "ID": book['id'],
-                    "Title": book['title'],
-                    "Author": book['author'],
-                    "Genre": book['genre'],
-                    "Total Copies": book.get('total_copies', 1),
-                    "Available Copies": book.get('available_copies', 1 if book['available'] else 0),
-                    "Status": "Available" if book['available'] else "Not Available",
-                    "Added On": book['added_at']
-                })
-            
-            books_df = pd.DataFrame(books_data)
-            st.dataframe(books_df, use_container_width=True)
+        if len(positions):
+            st.dataframe(catalog.frame(positions), use_container_width=True)
         else:
             st.info("No books match your search criteria")
     
@@ -267,6 +221,7 @@ class AdminDashboard:
             author = st.text_input("Author")
             genre = st.text_input("Genre")
             copies = st.number_input("Number of Copies", min_value=1, value=1)
+            isbn = st.text_input("ISBN (optional)", help="ISBN-10 or ISBN-13; hyphens are ignored")
             
             submit_button = st.form_submit_button("Add Book")
             
@@ -274,7 +229,7 @@ class AdminDashboard:
                 if not title or not author or not genre:
                     st.error("Please fill in all fields")
                 else:
-                    success, result = self.file_handler.add_book(title, author, genre, copies)
+                    success, result = self.file_handler.add_book(title, author, genre, copies, isbn.strip() or None)
                     
                     if success:
                         # Log the action
@@ -288,6 +243,32 @@ class AdminDashboard:
                         st.success(f"Book added successfully with ID: {result}")
                     else:
                         st.error(result)
+    
+    def _show_import_books(self):
+        st.markdown("<h4>Import Books</h4>", unsafe_allow_html=True)
+        st.caption("CSV with columns title, author, genre and optionally copies and isbn. "
+                   "Rows whose ISBN is already in the catalog are skipped.")
+        
+        uploaded = st.file_uploader("Books CSV", type=["csv"])
+        
+        if uploaded is not None and st.button("Import Books"):
+            try:
+                rows = pd.read_csv(uploaded, dtype=str).fillna("").to_dict('records')
+            except Exception as e:
+                st.error(f"Could not read the CSV file: {str(e)}")
+                return
+            
+            results = self.file_handler.import_books(rows)
+            added = sum(1 for _, success, _ in results if success)
+            if added:
+                # Log the action
+                self.file_handler.log_action(
+                    st.session_state.user_id,
+                    st.session_state.user_role,
+                    "add_book",
+                    f"Imported {added} of {len(rows)} books"
+                )
+            self._show_item_results(results, f"Imported {added} of {len(rows)} books")
 
 
 
@@ -295,27 +276,23 @@ class AdminDashboard:
     def _show_edit_book(self):
         st.markdown("<h4>Edit Book</h4>", unsafe_allow_html=True)
         
-        books = self.file_handler.read_json_file('books.json')
-        
-        if not books:
-            st.info("No books found")
-            return
-        
-        # Book selection
-        book_options = {f"{book['title']} ({book['id']})": book['id'] for book in books}
-        selected_book_name = st.selectbox("Select Book", list(book_options.keys()))
-        selected_book_id = book_options[selected_book_name]
-        
-        # Get selected book details
-        selected_book = next((book for book in books if book['id'] == selected_book_id), None)
+        # Book selection: only the top matches for the typed prefix are loaded
+        selected_book = search_picker(
+            "Select Book", self.file_handler.search_books, self._book_label, key="edit_book", empty_message="No books match"
+        )
         
         if selected_book:
+            selected_book_id = selected_book['id']
             with st.form("edit_book_form"):
                 title = st.text_input("Title", value=selected_book['title'])
                 author = st.text_input("Author", value=selected_book['author'])
                 genre = st.text_input("Genre", value=selected_book['genre'])
                 total_copies = st.number_input("Total Copies", min_value=1, value=selected_book.get('total_copies', 1))
-                available_copies = st.number_input("Available Copies", min_value=0, max_value=total_copies, value=selected_book.get('available_copies', 1 if selected_book['available'] else 0))
+                isbn = st.text_input("ISBN (optional)", value=selected_book.get('isbn', ""))
+                st.caption(
+                    f"Available copies: {selected_book.get('available_copies', 1 if selected_book['available'] else 0)} "
+                    "(follows the copies on the shelf; lowering the total withdraws shelved copies)"
+                )
                 
                 submit_button = st.form_submit_button("Update Book")
                 
@@ -324,7 +301,7 @@ class AdminDashboard:
                         st.error("Please fill in all fields")
                     else:
                         success, message = self.file_handler.update_book(
-                            selected_book_id, title, author, genre, total_copies, available_copies
+                            selected_book_id, title, author, genre, total_copies, isbn=isbn.strip()
                         )
                         
                         if success:
@@ -349,24 +326,78 @@ class AdminDashboard:
 
 
 
-    def _show_delete_book(self):
-        st.markdown("<h4>Delete Book</h4>", unsafe_allow_html=True)
+    def _show_book_copies(self):
+        st.markdown("<h4>Book Copies</h4>", unsafe_allow_html=True)
         
-        books = self.file_handler.read_json_file('books.json')
+        # Book selection
+        selected_book = search_picker(
+            "Select Book", self.file_handler.search_books, self._book_label, key="copies_book", empty_message="No books match"
+        )
         
-        if not books:
-            st.info("No books found")
+        if not selected_book:
             return
         
-        # Book selection
-        book_options = {f"{book['title']} ({book['id']})": book['id'] for book in books}
-        selected_book_name = st.selectbox("Select Book to Delete", list(book_options.keys()))
-        selected_book_id = book_options[selected_book_name]
+        selected_book_id = selected_book['id']
+        copies = self.file_handler.get_book_copies(selected_book_id)
         
-        # Get selected book details
-        selected_book = next((book for book in books if book['id'] == selected_book_id), None)
+        if not copies:
+            st.info("No copies recorded for this book")
+            return
+        
+        copies_df = pd.DataFrame([
+            {
+                "Copy ID": copy['copy_id'],
+                "Barcode": copy['barcode'],
+                "Status": copy['status'],
+                "Condition": copy['condition'],
+                "Location": copy['location'],
+                "Added On": copy['added_at']
+            }
+            for copy in copies
+        ])
+        st.dataframe(copies_df, use_container_width=True)
+        
+        with st.form("update_copy_form"):
+            copy_id = st.selectbox("Copy", [copy['copy_id'] for copy in copies])
+            condition = st.selectbox("Condition", ["", "good", "fair", "damaged", "withdrawn"])
+            location = st.text_input("Location")
+            
+            submit_button = st.form_submit_button("Update Copy")
+            
+            if submit_button:
+                if not condition and not location:
+                    st.error("Enter a condition or location to update")
+                else:
+                    success, message = self.file_handler.update_copy(selected_book_id, copy_id, condition, location)
+                    
+                    if success:
+                        # Log the action
+                        self.file_handler.log_action(
+                            st.session_state.user_id,
+                            st.session_state.user_role,
+                            "update_copy",
+                            f"Updated copy {copy_id}: condition={condition or '-'}, location={location or '-'}"
+                        )
+                        
+                        st.success(message)
+                    else:
+                        st.error(message)
+    
+    @staticmethod
+    def _book_label(book):
+        return f"{book['title']} ({book['id']})"
+    
+    def _show_delete_book(self):
+        st.markdown("<h4>Delete Book</h4>", unsafe_allow_html=True)
+        
+        # Book selection
+        selected_book = search_picker(
+            "Select Book to Delete", self.file_handler.search_books, self._book_label, key="delete_book",
+            empty_message="No books match"
+        )
         
         if selected_book:
+            selected_book_id = selected_book['id']
             st.markdown(f"""
             <div class='card'>
                 <h4>{selected_book['title']}</h4>
@@ -402,19 +433,11 @@ class AdminDashboard:
         st.markdown("<h3>Students Management</h3>", unsafe_allow_html=True)
         
         # Tabs for different student operations
-        student_tabs = st.tabs(["All Students", "Pending Approvals", "Flagged Students"])
-        
-        # All Students Tab
-        with student_tabs[0]:
-            self._show_all_students()
-        
-        # Pending Approvals Tab
-        with student_tabs[1]:
-            self._show_pending_students()
-        
-        # Flagged Students Tab
-        with student_tabs[2]:
-            self._show_flagged_students()
+        self._show_sections({
+            "All Students": self._show_all_students,
+            "Pending Approvals": self._show_pending_students,
+            "Flagged Students": self._show_flagged_students
+        }, key="admin_students_section")
     
     def _show_all_students(self):
         st.markdown("<h4>All Students</h4>", unsafe_allow_html=True)
@@ -448,7 +471,7 @@ class AdminDashboard:
                     "Email": student['email'],
                     "Status": "Approved" if student.get('approved', False) else "Pending",
                     "Flagged": "Yes" if student.get('flagged', False) else "No",
-                    "Registered On": student['created_at']
+                    "Registered On": to_display(student['created_at'])
                 })
             
             students_df = pd.DataFrame(students_data)
@@ -514,6 +537,16 @@ class AdminDashboard:
         st.markdown("<h3>Pending Requests</h3>", unsafe_allow_html=True)
         
         requests = self.file_handler.read_json_file('requests.json')
+        
+        # Uncollected hold reservations; approvals and the holds job also expire them
+        overdue = overdue_holds(requests)
+        if overdue:
+            st.warning(f"{overdue} hold reservation(s) are past their pickup deadline")
+            if st.button("Expire Uncollected Holds"):
+                expired = self.file_handler.expire_holds()
+                st.success(f"{expired} reservation(s) expired and their copies were passed on")
+                requests = self.file_handler.read_json_file('requests.json')
+        
         books = self.file_handler.read_json_file('books.json')
         students = self.file_handler.read_json_file('students.json')
         
@@ -525,108 +558,89 @@ class AdminDashboard:
             return
         
         # Tabs for different request types
-        request_tabs = st.tabs(["Issue Requests", "Return Requests"])
+        request_tabs = self._open_tabs(["Issue Requests", "Return Requests"], key="admin_requests_section")
         
         # Issue Requests Tab
-        with request_tabs[0]:
-            issue_requests = [req for req in pending_requests if req['type'] == "issue"]
+        if request_tabs[0].open:
+            with request_tabs[0]:
+                issue_requests = [req for req in pending_requests if req['type'] == "issue"]
             
-            if not issue_requests:
-                st.info("No pending issue requests")
-            else:
-                request_data = []
+                if not issue_requests:
+                    st.info("No pending issue requests")
+                else:
+                    request_data = page_data.request_rows(issue_requests, books, students, "issue")
                 
-                for req in issue_requests:
-                    book = next((b for b in books if b['id'] == req['book_id']), None)
-                    student = next((s for s in students if s['id'] == req['student_id']), None)
-                    
-                    if book and student:
-                        request_data.append({
-                            "Request ID": req['id'],
-                            "Student": student['name'],
-                            "Book": book['title'],
-                            "Requested At": req['requested_at']
-                        })
+                    waiting = sum(1 for req in requests if req['status'] == "on_hold")
+                    if waiting:
+                        st.caption(f"{waiting} request(s) waiting in hold queues")
                 
-                if request_data:
-                    st.dataframe(pd.DataFrame(request_data), use_container_width=True)
+                    if request_data:
+                        st.dataframe(pd.DataFrame(request_data), use_container_width=True)
                     
-                    # Request approval
-                    request_options = {
-                        f"{req['id']} - {next((b['title'] for b in books if b['id'] == req['book_id']), 'Unknown')} by {next((s['name'] for s in students if s['id'] == req['student_id']), 'Unknown')}": req['id'] 
-                        for req in issue_requests
-                    }
+                        # Request approval
+                        request_options = {
+                            f"{req['id']} - {next((b['title'] for b in books if b['id'] == req['book_id']), 'Unknown')} by {next((s['name'] for s in students if s['id'] == req['student_id']), 'Unknown')}": req['id'] 
+                            for req in issue_requests
+                        }
                     
-                    selected_request_name = st.selectbox("Select issue request to approve", list(request_options.keys()))
-                    selected_request_id = request_options[selected_request_name]
+                        selected_request_name = st.selectbox("Select issue request to approve", list(request_options.keys()))
+                        selected_request_id = request_options[selected_request_name]
                     
-                    if st.button("Approve Issue Request"):
-                        success, message = self.file_handler.approve_book_request(selected_request_id)
+                        if st.button("Approve Issue Request"):
+                            success, message = self.file_handler.approve_book_request(selected_request_id)
                         
-                        if success:
-                            # Log the action
-                            self.file_handler.log_action(
-                                st.session_state.user_id,
-                                st.session_state.user_role,
-                                "approve_issue_request",
-                                f"Approved issue request: {selected_request_name}"
-                            )
+                            if success:
+                                # Log the action
+                                self.file_handler.log_action(
+                                    st.session_state.user_id,
+                                    st.session_state.user_role,
+                                    "approve_issue_request",
+                                    f"Approved issue request: {selected_request_name}"
+                                )
                             
-                            st.success(message)
-                            st.rerun()
-                        else:
-                            st.error(message)
+                                st.success(message)
+                                st.rerun()
+                            else:
+                                st.error(message)
         
         # Return Requests Tab
-        with request_tabs[1]:
-            return_requests = [req for req in pending_requests if req['type'] == "return"]
+        if request_tabs[1].open:
+            with request_tabs[1]:
+                return_requests = [req for req in pending_requests if req['type'] == "return"]
             
-            if not return_requests:
-                st.info("No pending return requests")
-            else:
-                request_data = []
-                
-                for req in return_requests:
-                    book = next((b for b in books if b['id'] == req['book_id']), None)
-                    student = next((s for s in students if s['id'] == req['student_id']), None)
-                    
-                    if book and student:
-                        request_data.append({
-                            "Request ID": req['id'],
-                            "Student": student['name'],
-                            "Book": book['title'],
-                            "Issue ID": req['issue_id'],
-                            "Requested At": req['requested_at']
-                        })
+                if not return_requests:
+                    st.info("No pending return requests")
+                else:
+                    request_data = page_data.request_rows(return_requests, books, students, "return")
                 
-                if request_data:
-                    st.dataframe(pd.DataFrame(request_data), use_container_width=True)
+                    if request_data:
+                        st.dataframe(pd.DataFrame(request_data), use_container_width=True)
                     
-                    # Request approval
-                    request_options = {
-                        f"{req['id']} - {next((b['title'] for b in books if b['id'] == req['book_id']), 'Unknown')} by {next((s['name'] for s in students if s['id'] == req['student_id']), 'Unknown')}": req['id'] 
-                        for req in return_requests
-                    }
+                        # Request approval
+                        request_options = {
+                            f"{req['id']} - {next((b['title'] for b in books if b['id'] == req['book_id']), 'Unknown')} by {next((s['name'] for s in students if s['id'] == req['student_id']), 'Unknown')}": req['id'] 
+                            for req in return_requests
+                        }
                     
-                    selected_request_name = st.selectbox("Select return request to approve", list(request_options.keys()))
-                    selected_request_id = request_options[selected_request_name]
+                        selected_request_name = st.selectbox("Select return request to approve", list(request_options.keys()))
+                        selected_request_id = request_options[selected_request_name]
                     
-                    if st.button("Approve Return Request"):
-                        success, message = self.file_handler.approve_book_request(selected_request_id)
+                        if st.button("Approve Return Request"):
+                            success, message = self.file_handler.approve_book_request(selected_request_id)
                         
-                        if success:
-                            # Log the action
-                            self.file_handler.log_action(
-                                st.session_state.user_id,
-                                st.session_state.user_role,
-                                "approve_return_request",
-                                f"Approved return request: {selected_request_name}"
-                            )
+                            if success:
+                                # Log the action
+                                self.file_handler.log_action(
+                                    st.session_state.user_id,
+                                    st.session_state.user_role,
+                                    "approve_return_request",
+                                    f"Approved return request: {selected_request_name}"
+                                )
                             
-                            st.success(message)
-                            st.rerun()
-                        else:
-                            st.error(message)
+                                st.success(message)
+                                st.rerun()
+                            else:
+                                st.error(message)
 
 
 
@@ -656,7 +670,7 @@ class AdminDashboard:
                 "ID": student['id'],
                 "Name": student['name'],
                 "Email": student['email'],
-                "Registered On": student['created_at']
+                "Registered On": to_display(student['created_at'])
             })
         
         students_df = pd.DataFrame(students_data)
@@ -744,61 +758,41 @@ class AdminDashboard:
         st.markdown("<h3>Issue and Return Books</h3>", unsafe_allow_html=True)
         
         # Tabs for issue and return
-        issue_return_tabs = st.tabs(["Issue Book", "Return Book", "Currently Issued"])
-        
-        # Issue Book Tab
-        with issue_return_tabs[0]:
-            self._show_issue_book()
-        
-        # Return Book Tab
-        with issue_return_tabs[1]:
-            self._show_return_book()
-        
-        # Currently Issued Tab
-        with issue_return_tabs[2]:
-            self._show_currently_issued()
+        self._show_sections({
+            "Issue Book": self._show_issue_book,
+            "Return Book": self._show_return_book,
+            "Desk Mode": self._show_desk_mode,
+            "Currently Issued": self._show_currently_issued
+        }, key="admin_issue_return_section")
     
     def _show_issue_book(self):
         st.markdown("<h4>Issue Book to Student</h4>", unsafe_allow_html=True)
         
-        books = self.file_handler.read_json_file('books.json')
-        students = self.file_handler.read_json_file('students.json')
-        
-        # Filter for available books and approved students
-        available_books = [book for book in books if book['available']]
-        approved_students = [student for student in students if student.get('approved', False)]
-        
-        if not available_books:
-            st.warning("No books available for issue")
-            return
-        
-        if not approved_students:
-            st.warning("No approved students found")
-            return
-        
-        # Book and student selection
+        # Book and student selection among available books and approved students
         col1, col2 = st.columns(2)
         
         with col1:
-            book_options = {f"{book['title']} ({book['id']})": book['id'] for book in available_books}
-            selected_book_name = st.selectbox("Select Book", list(book_options.keys()))
-            selected_book_id = book_options[selected_book_name]
+            selected_book = search_picker(
+                "Select Book",
+                lambda prefix, limit: self.file_handler.search_books(prefix, limit, available_only=True),
+                self._book_label,
+                key="issue_book",
+                empty_message="No available books match"
+            )
         
         with col2:
-            student_options = {f"{student['name']} ({student['id']})": student['id'] for student in approved_students}
-            selected_student_name = st.selectbox(
+            selected_student = search_picker(
                 "Select Student",
-                list(student_options.keys()),
-                key="selectbox_issue_student"
+                lambda prefix, limit: self.file_handler.search_students(prefix, limit, approved_only=True),
+                lambda student: f"{student['name']} ({student['id']})",
+                key="issue_student",
+                placeholder="Type the start of a name or ID",
+                empty_message="No approved students match"
             )
-            selected_student_id = student_options[selected_student_name]
-
-        
-        # Get selected book and student details
-        selected_book = next((book for book in books if book['id'] == selected_book_id), None)
-        selected_student = next((student for student in students if student['id'] == selected_student_id), None)
         
         if selected_book and selected_student:
+            selected_book_id = selected_book['id']
+            selected_student_id = selected_student['id']
             col1, col2 = st.columns(2)
             
             with col1:
@@ -842,6 +836,81 @@ class AdminDashboard:
                 else:
                     st.error(message)
     
+    def _show_desk_mode(self):
+        st.markdown("<h4>Desk Check-out / Check-in</h4>", unsafe_allow_html=True)
+        st.caption("Scan or type book IDs, copy IDs, barcodes or ISBNs, one per line. Each stack is checked and saved in one go.")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("<h5>Check Out</h5>", unsafe_allow_html=True)
+            student = search_picker(
+                "Student",
+                lambda prefix, limit: self.file_handler.search_students(prefix, limit, approved_only=True),
+                lambda student: f"{student['name']} ({student['id']})",
+                key="desk_student",
+                placeholder="Type the start of a name or ID",
+                empty_message="No approved students match"
+            )
+            
+            with st.form("desk_checkout_form"):
+                codes = st.text_area("Books to issue")
+                days = st.slider("Issue Duration (Days)", min_value=1, max_value=30, value=7)
+                submit_button = st.form_submit_button("Check Out")
+            
+            if submit_button:
+                codes = page_data.parse_codes(codes)
+                if not student:
+                    st.error("Select a student")
+                elif not codes:
+                    st.error("Enter at least one book")
+                else:
+                    results = self.file_handler.issue_books(student['id'], codes, days)
+                    issued = sum(1 for _, success, _ in results if success)
+                    if issued:
+                        # Log the action
+                        self.file_handler.log_action(
+                            st.session_state.user_id,
+                            st.session_state.user_role,
+                            "issue_book",
+                            f"Desk check-out: {issued} of {len(codes)} books to {student['name']} for {days} days"
+                        )
+                    self._show_item_results(results, f"Issued {issued} of {len(codes)} books")
+        
+        with col2:
+            st.markdown("<h5>Check In</h5>", unsafe_allow_html=True)
+            
+            with st.form("desk_checkin_form"):
+                codes = st.text_area("Books returned (issue IDs, copy IDs or barcodes)")
+                submit_button = st.form_submit_button("Check In")
+            
+            if submit_button:
+                codes = page_data.parse_codes(codes)
+                if not codes:
+                    st.error("Enter at least one book")
+                else:
+                    results = self.file_handler.return_books(codes)
+                    returned = sum(1 for _, success, _ in results if success)
+                    if returned:
+                        # Log the action
+                        self.file_handler.log_action(
+                            st.session_state.user_id,
+                            st.session_state.user_role,
+                            "return_book",
+                            f"Desk check-in: {returned} of {len(codes)} books returned"
+                        )
+                    self._show_item_results(results, f"Returned {returned} of {len(codes)} books")
+    
+    def _show_item_results(self, results, summary):
+        if all(success for _, success, _ in results):
+            st.success(summary)
+        else:
+            st.warning(summary)
+        st.dataframe(pd.DataFrame([
+            {"Item": code, "Result": "OK" if success else "Failed", "Details": message}
+            for code, success, message in results
+        ]), use_container_width=True)
+    
     def _show_return_book(self):
         st.markdown("<h4>Return Book</h4>", unsafe_allow_html=True)
         
@@ -894,14 +963,14 @@ class AdminDashboard:
                     <div class='card'>
                         <h4>{student['name']}</h4>
                         <p><strong>Email:</strong> {student['email']}</p>
-                        <p><strong>Issue Date:</strong> {selected_issue['issue_date']}</p>
-                        <p><strong>Due Date:</strong> {selected_issue['due_date']}</p>
+                        <p><strong>Issue Date:</strong> {to_display(selected_issue['issue_date'])}</p>
+                        <p><strong>Due Date:</strong> {to_display(selected_issue['due_date'])}</p>
                     </div>
                     """, unsafe_allow_html=True)
                 
                 # Check if return is late
                 current_date = datetime.now()
-                due_date = datetime.strptime(selected_issue['due_date'], "%Y-%m-%d %H:%M:%S")
+                due_date = to_datetime(selected_issue['due_date'])
                 
                 if current_date > due_date:
                     st.warning("This book is being returned late. The student will be flagged.")
@@ -938,27 +1007,7 @@ class AdminDashboard:
             return
         
         # Display currently issued books
-        issued_data = []
-        
-        for issue in current_issues:
-            book = next((b for b in books if b['id'] == issue['book_id']), None)
-            student = next((s for s in students if s['id'] == issue['student_id']), None)
-            
-            if book and student:
-                # Calculate days left
-                current_date = datetime.now()
-                due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                days_left = (due_date - current_date).days
-                
-                issued_data.append({
-                    "Issue ID": issue['id'],
-                    "Book": book['title'],
-                    "Student": student['name'],
-                    "Issue Date": issue['issue_date'],
-                    "Due Date": issue['due_date'],
-                    "Days Left": days_left,
-                    "Status": "Overdue" if days_left < 0 else "Active"
-                })
+        issued_data = page_data.currently_issued_rows(current_issues, books, students)
         
         if issued_data:
             issued_df = pd.DataFrame(issued_data)
@@ -980,13 +1029,13 @@ class AdminDashboard:
         with col1:
             action_filter = st.selectbox(
                 "Filter by action",
-                ["All"] + sorted(list(set(logs['action'])))
+                ["All"] + sorted(logs['action'].cat.categories)
             )
         
         with col2:
             role_filter = st.selectbox(
                 "Filter by role",
-                ["All"] + sorted(list(set(logs['user_role'])))
+                ["All"] + sorted(logs['user_role'].cat.categories)
             )
         
         # Apply filters
@@ -1002,4 +1051,459 @@ class AdminDashboard:
         if not filtered_logs.empty:
             st.dataframe(filtered_logs, use_container_width=True)
         else:
-            st.info("No logs match your filter criteria")
\ No newline at end of file
+            st.info("No logs match your filter criteria")
+        
+        self._show_export()
+    
+    def _show_export(self):
+        st.markdown("<h4>Export Data</h4>", unsafe_allow_html=True)
+        
+        with st.form("export_form"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                collection = st.selectbox("Collection", sorted(export.COLLECTIONS))
+                fmt = st.selectbox("Format", export.FORMATS)
+                columns = st.text_input("Columns (comma-separated, blank for all)")
+            
+            with col2:
+                since = st.text_input("From date (YYYY-MM-DD, optional)")
+                until = st.text_input("To date (YYYY-MM-DD, optional)")
+                where = st.text_input("Filters (field=value, comma-separated)")
+            
+            include_archive = st.checkbox("Include archived history (issued books and requests)")
+            submit = st.form_submit_button("Prepare Export")
+        
+        if submit:
+            # The export streams to a temporary file rather than building it in memory
+            self._discard_export()
+            
+            path = None
+            try:
+                filters = {
+                    field.strip(): value.strip()
+                    for field, _, value in (item.partition('=') for item in where.split(',') if '=' in item)
+                }
+                handle, path = tempfile.mkstemp(prefix=f"{collection}-", suffix=f".{fmt}")
+                os.close(handle)
+                rows = export.export_collection(
+                    self.file_handler.data_dir, collection, path, fmt,
+                    columns=[column.strip() for column in columns.split(',') if column.strip()] or None,
+                    filters=filters,
+                    since=since.strip() or None,
+                    until=until.strip() or None,
+                    include_archive=include_archive
+                )
+                st.session_state.export_file = {"path": path, "name": f"{collection}.{fmt}", "format": fmt, "rows": rows}
+                
+                self.file_handler.log_action(
+                    st.session_state.user_id,
+                    st.session_state.user_role,
+                    "export_data",
+                    f"Exported {rows} {collection} rows as {fmt}"
+                )
+            except Exception as e:
+                if path and os.path.exists(path):
+                    os.remove(path)
+                st.error(f"Error exporting {collection}: {str(e)}")
+        
+        export_file = st.session_state.get('export_file')
+        if export_file and os.path.exists(export_file['path']):
+            st.caption(f"{export_file['rows']} rows ready")
+            with open(export_file['path'], 'rb') as f:
+                st.download_button(
+                    f"Download {export_file['name']}",
+                    f,
+                    file_name=export_file['name'],
+                    mime=export.MIME_TYPES[export_file['format']],
+                    on_click=self._discard_export
+                )
+    
+    @staticmethod
+    def _discard_export():
+        # The download button holds its own copy of the bytes once rendered
+        export_file = st.session_state.pop('export_file', None)
+        if export_file and os.path.exists(export_file['path']):
+            os.remove(export_file['path'])
+    
+    def _show_fines(self):
+        st.markdown("<h3>Fines</h3>", unsafe_allow_html=True)
+        
+        fines_tabs = self._open_tabs(["Balances", "Record Payment", "Policy"], key="admin_fines_section")
+        
+        # Balances Tab
+        if fines_tabs[0].open:
+            with fines_tabs[0]:
+                if st.button("Recompute Fines Now"):
+                    start = time.perf_counter()
+                    posted = self.file_handler.recompute_fines()
+                
+                    self.file_handler.log_action(
+                        st.session_state.user_id,
+                        st.session_state.user_role,
+                        "recompute_fines",
+                        f"Recomputed fines: {posted} ledger entries posted"
+                    )
+                
+                    st.success(f"Posted {posted} ledger entries in {time.perf_counter() - start:.2f}s")
+            
+                ledger = self.file_handler.read_json_file('fines_ledger.json') or {}
+                balances = {student_id: balance for student_id, balance in ledger.get('balances', {}).items() if balance}
+            
+                if ledger.get('computed_at'):
+                    st.caption(f"Last computed: {to_display(ledger['computed_at'])}")
+            
+                if not balances:
+                    st.info("No outstanding fines")
+                else:
+                    students = self.file_handler.read_json_file('students.json')
+                    names = {student['id']: student['name'] for student in students}
+                    balances_df = pd.DataFrame([
+                        {"Student ID": student_id, "Name": names.get(student_id, "Unknown"), "Balance": balance}
+                        for student_id, balance in balances.items()
+                    ]).sort_values("Balance", ascending=False)
+                    st.dataframe(balances_df, use_container_width=True)
+        
+        # Record Payment Tab
+        if fines_tabs[1].open:
+            with fines_tabs[1]:
+                students = self.file_handler.read_json_file('students.json')
+                if not students:
+                    st.info("No students found")
+                else:
+                    with st.form("fine_payment_form"):
+                        student_options = {f"{student['name']} ({student['id']})": student['id'] for student in students}
+                        selected_student_name = st.selectbox("Student", list(student_options.keys()))
+                        entry_type = st.radio("Type", ["payment", "waiver"], horizontal=True)
+                        amount = st.number_input("Amount", min_value=0.0, value=0.0, step=0.5)
+                        note = st.text_input("Note")
+                    
+                        submit_button = st.form_submit_button("Record")
+                    
+                        if submit_button:
+                            student_id = student_options[selected_student_name]
+                            success, message = self.file_handler.record_fine_payment(student_id, amount, entry_type, note)
+                        
+                            if success:
+                                self.file_handler.log_action(
+                                    st.session_state.user_id,
+                                    st.session_state.user_role,
+                                    f"fine_{entry_type}",
+                                    f"Recorded {entry_type} of {amount:.2f} for {selected_student_name}"
+                                )
+                            
+                                st.success(message)
+                            else:
+                                st.error(message)
+        
+        # Policy Tab
+        if fines_tabs[2].open:
+            with fines_tabs[2]:
+                books = self.file_handler.read_json_file('books.json')
+                policy = self.file_handler.get_fine_policy()
+                
+                with st.form("fine_policy_form"):
+                    daily_rate = st.number_input("Fine per day overdue", min_value=0.0, value=float(policy['daily_rate']), step=0.05)
+                    grace_days = st.number_input("Grace period (days)", min_value=0, value=int(policy['grace_days']))
+                    max_fine = st.number_input("Maximum fine per loan", min_value=0.0, value=float(policy['max_fine']), step=1.0)
+                
+                    st.markdown("Genre overrides (leave a genre's rate empty to use the defaults)")
+                    genres = sorted({book['genre'] for book in books})
+                    overrides_df = pd.DataFrame([
+                        {
+                            "Genre": genre,
+                            "Daily Rate": policy['genre_overrides'].get(genre, {}).get('daily_rate'),
+                            "Max Fine": policy['genre_overrides'].get(genre, {}).get('max_fine')
+                        }
+                        for genre in genres
+                    ])
+                    edited = st.data_editor(overrides_df, disabled=["Genre"], use_container_width=True, key="genre_overrides")
+                
+                    submit_button = st.form_submit_button("Save Policy")
+                
+                    if submit_button:
+                        genre_overrides = {}
+                        for row in edited.to_dict('records'):
+                            override = {}
+                            if pd.notna(row["Daily Rate"]):
+                                override['daily_rate'] = float(row["Daily Rate"])
+                            if pd.notna(row["Max Fine"]):
+                                override['max_fine'] = float(row["Max Fine"])
+                            if override:
+                                genre_overrides[row["Genre"]] = override
+                    
+                        success, message = self.file_handler.update_fine_policy({
+                            "daily_rate": daily_rate,
+                            "grace_days": grace_days,
+                            "max_fine": max_fine,
+                            "genre_overrides": genre_overrides
+                        })
+                    
+                        if success:
+                            self.file_handler.log_action(
+                                st.session_state.user_id,
+                                st.session_state.user_role,
+                                "update_fine_policy",
+                                f"Fine policy: {daily_rate:.2f}/day after {grace_days} days, max {max_fine:.2f}, "
+                                f"{len(genre_overrides)} genre overrides"
+                            )
+                        
+                            st.success(message)
+                        else:
+                            st.error(message)
+    
+    def _show_maintenance(self):
+        st.markdown("<h3>Maintenance</h3>", unsafe_allow_html=True)
+        
+        self._show_sections({
+            "Storage": self._show_storage,
+            "Change Feed": self._show_change_feed,
+            "Data Audit": self._show_audit,
+            "Recommendations": self._show_recommendations_refresh
+        }, key="admin_maintenance_section")
+    
+    def _show_storage(self):
+        st.markdown("<h4>Storage</h4>", unsafe_allow_html=True)
+        
+        # Hot file sizes; archival keeps these proportional to active circulation
+        storage_rows = []
+        for file_name in ('books.json', 'students.json', 'issued_books.json', 'requests.json', 'logs.csv', 'events.jsonl'):
+            file_path = os.path.join(self.file_handler.data_dir, file_name)
+            if os.path.exists(file_path):
+                storage_rows.append({"File": file_name, "Size (KB)": round(os.path.getsize(file_path) / 1024, 1)})
+        
+        manifest = self.file_handler.get_archive_manifest()
+        for file_name, entry in manifest.items():
+            storage_rows.append({
+                "File": f"archive/{file_name}",
+                "Size (KB)": None,
+                "Archived Records": sum(entry.get('partitions', {}).values()),
+                "Partitions": len(entry.get('partitions', {})),
+                "Last Archived": entry.get('archived_at')
+            })
+        
+        if storage_rows:
+            st.dataframe(pd.DataFrame(storage_rows), use_container_width=True)
+        
+        archive_col, button_col = st.columns(2)
+        
+        with archive_col:
+            max_age_days = st.number_input("Archive history older than (days)", min_value=1, value=90)
+        
+        with button_col:
+            if st.button("Archive Old History"):
+                moved = self.file_handler.archive_history(max_age_days)
+                
+                self.file_handler.log_action(
+                    st.session_state.user_id,
+                    st.session_state.user_role,
+                    "archive_history",
+                    f"Archived history older than {max_age_days} days: "
+                    + ", ".join(f"{file_name} {count}" for file_name, count in moved.items())
+                )
+                
+                st.success("Archived " + ", ".join(f"{count} from {file_name}" for file_name, count in moved.items()))
+    
+    def _show_recommendations_refresh(self):
+        st.markdown("<h4>Recommendations</h4>", unsafe_allow_html=True)
+        st.caption("New issues are folded into the \"also borrowed\" table from the change feed every few minutes. "
+                   "Refresh to pick them up now, or rebuild from the full history.")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            rebuild = st.checkbox("Rebuild from full history")
+        
+        with col2:
+            if st.button("Refresh Recommendations"):
+                start = time.perf_counter()
+                processed = self.file_handler.refresh_recommendations(rebuild=rebuild)
+                
+                self.file_handler.log_action(
+                    st.session_state.user_id,
+                    st.session_state.user_role,
+                    "refresh_recommendations",
+                    f"{'Rebuilt' if rebuild else 'Refreshed'} recommendations: {processed} issues processed"
+                )
+                
+                st.success(f"Processed {processed} issues in {time.perf_counter() - start:.2f}s")
+    
+    def _show_change_feed(self):
+        st.markdown("<h4>Change Feed</h4>", unsafe_allow_html=True)
+        
+        last_seq = self.file_handler.last_event_seq()
+        if not last_seq:
+            st.info("No changes recorded yet")
+            return
+        
+        st.caption(f"{last_seq} changes recorded. Consumers read deltas with events_since(seq).")
+        
+        events = self.file_handler.events_since(max(0, last_seq - 20))
+        st.dataframe(pd.DataFrame([
+            {"Seq": event['seq'], "Type": event['type'], "At": event['at'], "Data": str(event['data'])}
+            for event in reversed(events)
+        ]), use_container_width=True)
+    
+    def _show_audit(self):
+        st.markdown("<h4>Data Audit</h4>", unsafe_allow_html=True)
+        
+        col1, col2, col3 = st.columns(3)
+        result = None
+        
+        with col1:
+            if st.button("Audit Recent Changes"):
+                result = self.file_handler.audit_data(incremental=True)
+        
+        with col2:
+            if st.button("Full Audit"):
+                result = self.file_handler.audit_data()
+        
+        with col3:
+            if st.button("Apply Repairs"):
+                result = self.file_handler.repair_data(incremental=True)
+                
+                self.file_handler.log_action(
+                    st.session_state.user_id,
+                    st.session_state.user_role,
+                    "repair_data",
+                    f"Applied {result['repaired']} repairs, {len(result['findings'])} findings remain"
+                )
+                
+                if result['repaired']:
+                    st.success(f"Applied {result['repaired']} repairs")
+        
+        # Otherwise show the last saved audit
+        result = result or self.file_handler.read_json_file('audit.json')
+        if not result:
+            st.info("No audit has been run yet")
+            return
+        
+        st.caption(f"Last {result['mode']} audit at {result.get('audited_at', '-')}, through change {result['seq']}")
+        
+        if result['findings']:
+            st.dataframe(pd.DataFrame([
+                {
+                    "Check": finding['check'],
+                    "Collection": finding['collection'],
+                    "Record": finding['id'],
+                    "Problem": finding['message'],
+                    "Repair": finding['repair']['action'] if finding.get('repair') else "Manual"
+                }
+                for finding in result['findings']
+            ]), use_container_width=True)
+        else:
+            st.success("No problems found")
+    
+    def _show_circulation_analytics(self):
+        st.markdown("<h3>Circulation Analytics</h3>", unsafe_allow_html=True)
+        
+        today = datetime.now().date()
+        
+        range_col, granularity_col = st.columns(2)
+        
+        with range_col:
+            date_range = st.date_input("Date range", (today - timedelta(days=90), today), max_value=today)
+        
+        with granularity_col:
+            granularity = st.radio("Granularity", ["Daily", "Weekly"], horizontal=True)
+        
+        if not isinstance(date_range, (list, tuple)) or len(date_range) != 2:
+            st.info("Select a start and end date")
+            return
+        
+        start, end = date_range
+        
+        rollups = self.file_handler.get_circulation_rollups()
+        # Parsed once for all the charts below
+        issues = circulation.issues_frame(self.file_handler.read_history('issued_books.json', since=start))
+        books = self.file_handler.read_json_file('books.json')
+        students = self.file_handler.read_json_file('students.json')
+        
+        # Issues, returns and late returns over time
+        series = circulation.daily_series(rollups, issues, start, end, today)
+        if granularity == "Weekly":
+            series = circulation.weekly_series(series)
+        series.columns = ["Issues", "Returns", "Late Returns"]
+        
+        total_col1, total_col2, total_col3 = st.columns(3)
+        total_col1.metric("Issues", int(series["Issues"].sum()))
+        total_col2.metric("Returns", int(series["Returns"].sum()))
+        total_col3.metric("Late Returns", int(series["Late Returns"].sum()))
+        
+        st.markdown("<h4>Circulation</h4>", unsafe_allow_html=True)
+        st.line_chart(series)
+        
+        # Utilization: share of copy-days on loan
+        st.markdown("<h4>Utilization</h4>", unsafe_allow_html=True)
+        genre_col, title_col = st.columns(2)
+        
+        with genre_col:
+            by_genre = circulation.utilization(issues, books, start, end, by="genre")
+            st.bar_chart(by_genre["Utilization"])
+        
+        with title_col:
+            by_title = circulation.utilization(issues, books, start, end, by="title")
+            st.dataframe(by_title.head(20), use_container_width=True)
+        
+        # Top borrowers
+        st.markdown("<h4>Top Borrowers</h4>", unsafe_allow_html=True)
+        borrowers = circulation.top_borrowers(issues, students, start, end)
+        if borrowers.empty:
+            st.info("No books were issued in this period")
+        else:
+            st.dataframe(borrowers, use_container_width=True)
+    
+    def _show_performance(self):
+        st.markdown("<h3>Performance</h3>", unsafe_allow_html=True)
+        
+        if not METRICS.enabled:
+            st.info("Instrumentation is disabled. Start the app with LIBRARY_METRICS=1 to collect per-operation metrics.")
+            return
+        
+        uptime = datetime.now() - datetime.fromtimestamp(METRICS.started_at)
+        st.caption(f"Collecting since {datetime.fromtimestamp(METRICS.started_at).strftime('%Y-%m-%d %H:%M:%S')} ({str(uptime).split('.')[0]})")
+        
+        # Per-operation latency
+        st.markdown("<h4>Operations</h4>", unsafe_allow_html=True)
+        method_rows = METRICS.method_rows()
+        
+        if method_rows:
+            st.dataframe(pd.DataFrame(method_rows), use_container_width=True)
+        else:
+            st.info("No calls recorded yet")
+        
+        col1, col2 = st.columns(2)
+        
+        # File I/O
+        with col1:
+            st.markdown("<h4>File I/O</h4>", unsafe_allow_html=True)
+            io_rows = METRICS.io_rows()
+            
+            if io_rows:
+                st.dataframe(pd.DataFrame(io_rows), use_container_width=True)
+            else:
+                st.info("No file I/O recorded yet")
+        
+        # Caches
+        with col2:
+            st.markdown("<h4>Caches</h4>", unsafe_allow_html=True)
+            cache_rows = METRICS.cache_rows()
+            
+            if cache_rows:
+                st.dataframe(pd.DataFrame(cache_rows), use_container_width=True)
+            else:
+                st.info("No cache lookups recorded yet")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("Export Prometheus File"):
+                if METRICS.export(self.file_handler.metrics_file):
+                    st.success(f"Metrics written to {self.file_handler.metrics_file}")
+                else:
+                    st.error("Could not write metrics file")
+        
+        with col2:
+            if st.button("Reset Metrics"):
+                METRICS.reset()
+                st.rerun()
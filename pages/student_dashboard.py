@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from components.pickers import search_picker
+from components.submissions import submission_done, submission_key
+from services import page_data
+from services.fines import FinePolicy, compute_fines
+from services.holds import HoldQueues
+from services.snapshot import RenderSnapshot
+from services.timestamps import to_display
 
 class StudentDashboard:
     def __init__(self, file_handler):
@@ -9,8 +16,11 @@ class StudentDashboard:
     def show(self):
         st.markdown("<h2 class='sub-header'>Student Dashboard</h2>", unsafe_allow_html=True)
         
+        # Every section reads from one snapshot: each collection is loaded once per rerun
+        self.data = RenderSnapshot(self.file_handler)
+        
         # Check if student is flagged
-        students = self.file_handler.read_json_file('students.json')
+        students = self.data.read_json_file('students.json')
         current_student = next((s for s in students if s['id'] == st.session_state.user_id), None)
         
         if current_student and current_student.get('flagged', False):
@@ -47,18 +57,12 @@ class StudentDashboard:
     def _show_dashboard(self):
         st.markdown("<h3>My Library Overview</h3>", unsafe_allow_html=True)
         
-        # Get student's issued books
-        issued_books = self.file_handler.read_json_file('issued_books.json')
-        books = self.file_handler.read_json_file('books.json')
+        # Get student's issued books, including archived history
+        issued_books = self.data.read_history('issued_books.json', student_id=st.session_state.user_id)
+        books = self.data.read_json_file('books.json')
         
         # Filter for books issued to the current student
-        my_issues = [
-            issue for issue in issued_books 
-            if issue['student_id'] == st.session_state.user_id
-        ]
-        
-        current_issues = [issue for issue in my_issues if not issue.get('returned', False)]
-        past_issues = [issue for issue in my_issues if issue.get('returned', False)]
+        my_issues, current_issues, past_issues = page_data.student_issues(issued_books, st.session_state.user_id)
         
         # Display stats
         col1, col2, col3 = st.columns(3)
@@ -91,23 +95,7 @@ class StudentDashboard:
         st.markdown("<h3>Books Due Soon</h3>", unsafe_allow_html=True)
         
         if current_issues:
-            due_soon = []
-            current_date = datetime.now()
-            
-            for issue in current_issues:
-                book = next((b for b in books if b['id'] == issue['book_id']), None)
-                
-                if book:
-                    due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                    days_left = (due_date - current_date).days
-                    
-                    due_soon.append({
-                        "Book": book['title'],
-                        "Author": book['author'],
-                        "Due Date": issue['due_date'],
-                        "Days Left": days_left,
-                        "Status": "Overdue" if days_left < 0 else "Due Soon" if days_left <= 3 else "Active"
-                    })
+            due_soon = page_data.student_due_rows(current_issues, books)
             
             if due_soon:
                 due_soon_df = pd.DataFrame(due_soon)
@@ -120,7 +108,7 @@ class StudentDashboard:
         # Recent activity
         st.markdown("<h3>Recent Activity</h3>", unsafe_allow_html=True)
         
-        logs = self.file_handler.get_logs()
+        logs = self.data.get_logs()
         
         # Filter logs for current student
         my_logs = logs[logs['user_id'] == st.session_state.user_id].tail(10)
@@ -133,22 +121,22 @@ class StudentDashboard:
     def _show_browse_books(self):
         st.markdown("<h3>Browse Books</h3>", unsafe_allow_html=True)
         
-        books = self.file_handler.read_json_file('books.json')
+        catalog = self.data.get_catalog()
         
-        if not books:
+        if not len(catalog):
             st.info("No books found in the library")
             return
         
         # Search and filter
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            search_term = st.text_input("Search by title or author")
+            search_term = st.text_input("Search by title, author or ISBN")
         
         with col2:
             genre_filter = st.selectbox(
                 "Filter by genre",
-                ["All"] + sorted(list(set(book['genre'] for book in books)))
+                ["All"] + catalog.genres
             )
         
         with col3:
@@ -157,22 +145,13 @@ class StudentDashboard:
                 ["All", "Available", "Not Available"]
             )
         
-        # Apply filters
-        filtered_books = books
-        
-        if search_term:
-            filtered_books = [
-                book for book in filtered_books
-                if search_term.lower() in book['title'].lower() or search_term.lower() in book['author'].lower()
-            ]
-        
-        if genre_filter != "All":
-            filtered_books = [book for book in filtered_books if book['genre'] == genre_filter]
+        with col4:
+            sort_label = st.selectbox("Sort by", list(page_data.BOOK_SORT_OPTIONS))
         
-        if availability_filter == "Available":
-            filtered_books = [book for book in filtered_books if book['available']]
-        elif availability_filter == "Not Available":
-            filtered_books = [book for book in filtered_books if not book['available']]
+        # Apply filters
+        sort_by, descending = page_data.BOOK_SORT_OPTIONS[sort_label]
+        positions = catalog.filter_books(search_term, genre_filter, availability_filter, sort_by, descending)
+        filtered_books = catalog.records(positions)
         
         # Display books
         if filtered_books:
@@ -189,6 +168,7 @@ class StudentDashboard:
                         <p><strong>Total Copies:</strong> {book.get('total_copies', 1)}</p>
                         <p><strong>Available Copies:</strong> {book.get('available_copies', 1 if book['available'] else 0)}</p>
                         <p><strong>Status:</strong> {'Available' if book['available'] else 'Not Available'}</p>
+                        {f"<p><strong>ISBN:</strong> {book['isbn']}</p>" if book.get('isbn') else ""}
                     </div>
                     """, unsafe_allow_html=True)
         else:
@@ -197,49 +177,24 @@ class StudentDashboard:
     def _show_my_books(self):
         st.markdown("<h3>My Books</h3>", unsafe_allow_html=True)
         
-        # Get student's issued books
-        issued_books = self.file_handler.read_json_file('issued_books.json')
-        books = self.file_handler.read_json_file('books.json')
+        # Get student's issued books, including archived history
+        issued_books = self.data.read_history('issued_books.json', student_id=st.session_state.user_id)
+        books = self.data.read_json_file('books.json')
         
         # Filter for books issued to the current student
-        my_issues = [
-            issue for issue in issued_books 
-            if issue['student_id'] == st.session_state.user_id
-        ]
+        my_issues, current_issues, past_issues = page_data.student_issues(issued_books, st.session_state.user_id)
         
         if not my_issues:
             st.info("You haven't borrowed any books yet")
             return
         
         # Tabs for current and past books
-        my_books_tabs = st.tabs(["Currently Borrowed", "Return History"])
+        my_books_tabs = st.tabs(["Currently Borrowed", "Return History", "Fines"])
         
         # Currently Borrowed Tab
         with my_books_tabs[0]:
-            current_issues = [issue for issue in my_issues if not issue.get('returned', False)]
-            
             if current_issues:
-                current_data = []
-                current_date = datetime.now()
-                
-                for issue in current_issues:
-                    book = next((b for b in books if b['id'] == issue['book_id']), None)
-                    
-                    if book:
-                        due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                        days_left = (due_date - current_date).days
-                        
-                        current_data.append({
-                            "Issue ID": issue['id'],
-                            "Book": book['title'],
-                            "Author": book['author'],
-                            "Genre": book['genre'],
-                            "Issue Date": issue['issue_date'],
-                            "Due Date": issue['due_date'],
-                            "Days Left": days_left,
-                            "Status": "Overdue" if days_left < 0 else "Due Soon" if days_left <= 3 else "Active",
-                            "Return Requested": "Yes" if issue.get('return_requested', False) else "No"
-                        })
+                current_data = page_data.student_current_rows(current_issues, books)
                 
                 if current_data:
                     current_df = pd.DataFrame(current_data)
@@ -261,11 +216,14 @@ class StudentDashboard:
                         selected_issue_id = issue_options[selected_issue_name]
                         
                         if st.button("Request Return"):
-                            success, message = self.file_handler.request_book_return(st.session_state.user_id, selected_issue_id)
+                            success, message = self.data.request_book_return(
+                                st.session_state.user_id, selected_issue_id, idempotency_key=submission_key(f"request_return:{selected_issue_id}")
+                            )
                             
                             if success:
+                                submission_done(f"request_return:{selected_issue_id}")
                                 # Log the action
-                                self.file_handler.log_action(
+                                self.data.log_action(
                                     st.session_state.user_id,
                                     st.session_state.user_role,
                                     "request_return",
@@ -283,84 +241,101 @@ class StudentDashboard:
         
         # Return History Tab
         with my_books_tabs[1]:
-            past_issues = [issue for issue in my_issues if issue.get('returned', False)]
-            
             if past_issues:
-                past_data = []
-                
-                for issue in past_issues:
-                    book = next((b for b in books if b['id'] == issue['book_id']), None)
-                    
-                    if book:
-                        issue_date = datetime.strptime(issue['issue_date'], "%Y-%m-%d %H:%M:%S")
-                        due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                        return_date = datetime.strptime(issue['return_date'], "%Y-%m-%d %H:%M:%S")
-                        
-                        # Check if return was late
-                        was_late = return_date > due_date
-                        
-                        past_data.append({
-                            "Book": book['title'],
-                            "Author": book['author'],
-                            "Genre": book['genre'],
-                            "Issue Date": issue['issue_date'],
-                            "Due Date": issue['due_date'],
-                            "Return Date": issue['return_date'],
-                            "Status": "Late Return" if was_late else "On Time"
-                        })
+                past_data = page_data.student_history_rows(past_issues, books)
                 
                 if past_data:
                     past_df = pd.DataFrame(past_data)
                     st.dataframe(past_df, use_container_width=True)
             else:
                 st.info("You don't have any return history")
+        
+        # Fines Tab
+        with my_books_tabs[2]:
+            self._show_my_fines(current_issues, books)
+    
+    def _show_my_fines(self, current_issues, books):
+        fines = self.data.get_student_fines(st.session_state.user_id)
+        
+        st.metric("Outstanding Balance", f"{fines['balance']:.2f}")
+        if fines['computed_at']:
+            st.caption(f"Fines last assessed: {to_display(fines['computed_at'])}")
+        
+        # Overdue books keep accruing until they are returned
+        policy = FinePolicy.from_dict(self.data.get_fine_policy())
+        accruing = compute_fines(current_issues, books, policy)
+        
+        if not accruing.empty:
+            titles = {book['id']: book['title'] for book in books}
+            st.warning("These books are overdue and accruing fines:")
+            st.dataframe(pd.DataFrame({
+                "Book": accruing["book_id"].map(titles),
+                "Days Overdue": accruing["days_overdue"],
+                "Fine So Far": accruing["amount"]
+            }), use_container_width=True)
+        
+        if fines['entries']:
+            st.markdown("<h4>Fines Ledger</h4>", unsafe_allow_html=True)
+            ledger_df = pd.DataFrame(fines['entries'])[["created_at", "type", "issue_id", "amount", "balance", "note"]]
+            ledger_df.columns = ["Date", "Type", "Issue ID", "Amount", "Balance", "Note"]
+            ledger_df["Date"] = ledger_df["Date"].map(to_display)
+            st.dataframe(ledger_df, use_container_width=True)
+        else:
+            st.info("No fines on record")
     
     def _show_book_requests(self):
         st.markdown("<h3>Book Requests</h3>", unsafe_allow_html=True)
         
         # Check if student is approved
-        students = self.file_handler.read_json_file('students.json')
+        students = self.data.read_json_file('students.json')
         current_student = next((s for s in students if s['id'] == st.session_state.user_id), None)
         
         if not current_student or not current_student.get('approved', False):
             st.warning("Your account needs to be approved by the admin before you can request books")
             return
         
-        # Get available books
-        books = self.file_handler.read_json_file('books.json')
-        available_books = [book for book in books if book.get('available_copies', 0) > 0]
-
+        books = self.data.read_json_file('books.json')
         
-        if not available_books:
+        if not books:
             st.warning("No books are currently available for request")
             return
         
-        # Book request form
+        # Book request form; titles with no free copies can be put on hold
         st.markdown("<h4>Request a Book</h4>", unsafe_allow_html=True)
         
-        book_options = {f"{book['title']} by {book['author']}": book['id'] for book in available_books}
-        selected_book_name = st.selectbox("Select Book", list(book_options.keys()))
-        selected_book_id = book_options[selected_book_name]
+        holds = HoldQueues(self.data.read_json_file('requests.json'))
         
-        # Get selected book details
-        selected_book = next((book for book in books if book['id'] == selected_book_id), None)
+        # Only the top matches for the typed prefix are loaded
+        selected_book = search_picker(
+            "Select Book",
+            self.data.search_books,
+            lambda book: f"{book['title']} by {book['author']} ({book['id']})" + ("" if book.get('available_copies', 0) > 0 else " (waitlist)"),
+            key="request_book"
+        )
         
         if selected_book:
+            selected_book_id = selected_book['id']
             st.markdown(f"""
             <div class='card'>
                 <h4>{selected_book['title']}</h4>
                 <p><strong>Author:</strong> {selected_book['author']}</p>
                 <p><strong>Genre:</strong> {selected_book['genre']}</p>
                 <p><strong>Available Copies:</strong> {selected_book.get('available_copies', 1)}</p>
+                <p><strong>Waiting in hold queue:</strong> {holds.waiting(selected_book_id)}</p>
             </div>
             """, unsafe_allow_html=True)
             
-            if st.button("Request Book"):
-                success, message = self.file_handler.request_book_issue(st.session_state.user_id, selected_book_id)
+            button_label = "Request Book" if selected_book.get('available_copies', 0) > 0 else "Join Waitlist"
+            
+            if st.button(button_label):
+                success, message = self.data.request_book_issue(
+                    st.session_state.user_id, selected_book_id, idempotency_key=submission_key(f"request_book:{selected_book_id}")
+                )
                 
                 if success:
+                    submission_done(f"request_book:{selected_book_id}")
                     # Log the action
-                    self.file_handler.log_action(
+                    self.data.log_action(
                         st.session_state.user_id,
                         st.session_state.user_role,
                         "request_book",
@@ -371,38 +346,35 @@ class StudentDashboard:
                     st.rerun()
                 else:
                     st.error(message)
+            
+            # Recommendations from the precomputed co-borrow table; the refresh
+            # writes, so it goes to the file handler rather than the snapshot
+            self.file_handler.refresh_recommendations_if_due()
+            recommendations = self.data.get_recommendations(selected_book_id)
+            if recommendations:
+                books_by_id = page_data.index_by_id(books)
+                st.markdown("<h4>Students who borrowed this also borrowed</h4>", unsafe_allow_html=True)
+                for book_id, score in recommendations:
+                    book = books_by_id.get(book_id)
+                    if book:
+                        status = "Available" if book.get('available_copies', 0) > 0 else "On waitlist"
+                        st.markdown(f"- **{book['title']}** by {book['author']} ({status})")
     
     def _show_my_requests(self):
         st.markdown("<h3>My Pending Requests</h3>", unsafe_allow_html=True)
         
-        requests = self.file_handler.read_json_file('requests.json')
-        books = self.file_handler.read_json_file('books.json')
+        requests = self.data.read_json_file('requests.json')
+        books = self.data.read_json_file('books.json')
         
-        # Filter for this student's pending requests
-        my_requests = [
-            req for req in requests 
-            if req['student_id'] == st.session_state.user_id and req['status'] == "pending"
-        ]
+        # This student's pending requests and holds, with queue positions
+        request_data = page_data.student_request_rows(
+            requests, books, st.session_state.user_id, HoldQueues(requests).positions()
+        )
         
-        if not my_requests:
+        if not request_data:
             st.info("You don't have any pending requests")
             return
         
-        # Display pending requests
-        request_data = []
-        
-        for req in my_requests:
-            book = next((b for b in books if b['id'] == req['book_id']), None)
-            
-            if book:
-                request_data.append({
-                    "Request ID": req['id'],
-                    "Type": req['type'].capitalize(),
-                    "Book": book['title'],
-                    "Requested At": req['requested_at']
-                })
-        
-        if request_data:
-            request_df = pd.DataFrame(request_data)
-            st.dataframe(request_df, use_container_width=True)
-            st.info("Your requests are pending admin approval. Please check back later.")
\ No newline at end of file
+        request_df = pd.DataFrame(request_data)
+        st.dataframe(request_df, use_container_width=True)
+        st.info("Your requests are pending admin approval. Books on hold are reserved for you in queue order as copies are returned.")
\ No newline at end of file
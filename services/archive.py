@@ -0,0 +1,187 @@
+"""Cold storage for circulation history.
+
+Returned issues and resolved requests older than a configurable age are
+moved out of the hot JSON files into gzip-compressed, month-partitioned
+archive files:
+
+    data/archive/issued_books/2024-03.json.gz   (by return month)
+    data/archive/requests/2024-03.json.gz       (by request month)
+
+data/archive/manifest.json records, per collection, the highest id ever
+archived so new ids never reuse an archived one, plus record counts per
+partition.
+
+    python -m services.archive --data-dir data --older-than 90
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from services.file_lock import atomic_write_bytes, atomic_write_text
+from services.records import as_dict, load_records
+from services.timestamps import day, to_epoch
+
+DEFAULT_MAX_AGE_DAYS = 90
+
+# Collection -> field whose month names the partition
+PARTITION_FIELDS = {
+    'issued_books.json': 'return_date',
+    'requests.json': 'requested_at',
+}
+
+# Request statuses that are still in play and never archived
+ACTIVE_REQUEST_STATUSES = ("pending", "on_hold")
+
+# Decompressed partitions kept per process
+PARTITION_CACHE_SIZE = 64
+
+_partition_cache = OrderedDict()
+_partition_cache_lock = threading.Lock()
+
+
+def record_seq(record_id):
+    """Numeric part of a record id (ISS-42 -> 42)"""
+    try:
+        return int(str(record_id).rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def split_archivable(file_name, records, cutoff):
+    """Split a collection into (keep, archive) for records settled before cutoff"""
+    cutoff = to_epoch(cutoff)
+    keep, archive = [], []
+
+    for record in records:
+        # Timestamps may be strings or epoch seconds (services.timestamps); compare as epochs
+        if file_name == 'issued_books.json':
+            settled = record.get('returned', False) and (to_epoch(record.get('return_date')) or cutoff) < cutoff
+        else:
+            settled_at = record.get('approved_at') or record.get('expired_at') or record.get('requested_at')
+            settled = record.get('status') not in ACTIVE_REQUEST_STATUSES and (to_epoch(settled_at) or cutoff) < cutoff
+        (archive if settled else keep).append(record)
+
+    return keep, archive
+
+
+class ArchiveStore:
+    """Month-partitioned gzip JSON archive under <data_dir>/archive"""
+
+    def __init__(self, data_dir):
+        self.root = os.path.join(data_dir, 'archive')
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+
+    def _collection_dir(self, file_name):
+        return os.path.join(self.root, os.path.splitext(file_name)[0])
+
+    def _partition_path(self, file_name, partition):
+        return os.path.join(self._collection_dir(file_name), f"{partition}.json.gz")
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def high_water(self, file_name):
+        """Highest id number ever archived for a collection"""
+        return self.manifest().get(file_name, {}).get('high_water', 0)
+
+    def partitions(self, file_name):
+        directory = self._collection_dir(file_name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.json.gz')] for name in os.listdir(directory) if name.endswith('.json.gz'))
+
+    def read_partition(self, file_name, partition):
+        """Records of one partition, decompressed once per process while unchanged.
+
+        Cached partitions hold compact record objects (services.records)
+        rather than dicts, since a process may keep years of history.
+        """
+        path = self._partition_path(file_name, partition)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return []
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with _partition_cache_lock:
+            entry = _partition_cache.get(path)
+            if entry is not None and entry[0] == signature:
+                _partition_cache.move_to_end(path)
+                return entry[1]
+
+        with gzip.open(path, 'rt') as f:
+            records = load_records(file_name, json.load(f))
+
+        with _partition_cache_lock:
+            _partition_cache[path] = (signature, records)
+            while len(_partition_cache) > PARTITION_CACHE_SIZE:
+                _partition_cache.popitem(last=False)
+        return records
+
+    def read(self, file_name, since=None):
+        """Archived records, optionally only partitions from since's month onwards"""
+        first = str(since)[:7] if since else ""
+        records = []
+        for partition in self.partitions(file_name):
+            if partition >= first:
+                records.extend(self.read_partition(file_name, partition))
+        return records
+
+    def write_partition(self, file_name, partition, records):
+        """Replace the records of one partition"""
+        content = json.dumps([as_dict(record) for record in records], separators=(',', ':')).encode('utf-8')
+        atomic_write_bytes(self._partition_path(file_name, partition), gzip.compress(content))
+
+    def append(self, file_name, records):
+        """Add records to their partitions (merging by id, so re-running is harmless)"""
+        if not records:
+            return 0
+
+        field = PARTITION_FIELDS[file_name]
+        by_partition = {}
+        for record in records:
+            by_partition.setdefault(day(record.get(field))[:7] or "unknown", []).append(record)
+
+        os.makedirs(self._collection_dir(file_name), exist_ok=True)
+        manifest = self.manifest()
+        entry = manifest.setdefault(file_name, {"high_water": 0, "partitions": {}})
+
+        for partition, new_records in by_partition.items():
+            merged = {record['id']: record for record in self.read_partition(file_name, partition)}
+            merged.update((record['id'], record) for record in new_records)
+            self.write_partition(file_name, partition, merged.values())
+            entry["partitions"][partition] = len(merged)
+
+        entry["high_water"] = max(entry["high_water"], max(record_seq(record['id']) for record in records))
+        entry["archived_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        atomic_write_text(self.manifest_path, json.dumps(manifest, indent=4))
+        return len(records)
+
+
+def archive_cutoff(max_age_days=DEFAULT_MAX_AGE_DAYS, now=None):
+    return (now or datetime.now()) - timedelta(days=max_age_days)
+
+
+def main(argv=None):
+    from services.file_handler import FileHandler
+
+    parser = argparse.ArgumentParser(description="Move old circulation history into the compressed archive")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--older-than", type=int, default=DEFAULT_MAX_AGE_DAYS, help="minimum age in days")
+    args = parser.parse_args(argv)
+
+    moved = FileHandler(data_dir=args.data_dir).archive_history(args.older_than)
+    for file_name, count in moved.items():
+        print(f"{file_name}: archived {count} records")
+
+
+if __name__ == "__main__":
+    main()
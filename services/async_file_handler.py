@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from services.file_handler import FileHandler
+
+# Shared pool for blocking file I/O; JSON parsing holds the GIL but the
+# file reads, lock waits and socket round trips overlap
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='library-io')
+
+
+class AsyncFileHandler:
+    """Asyncio front end for a FileHandler (or anything with its API).
+
+    Every public FileHandler method is available as a coroutine that runs
+    the blocking call in a thread pool, so independent loads can be
+    awaited together:
+
+        books, students = await async_handler.read_collections('books.json', 'students.json')
+    """
+
+    def __init__(self, file_handler, executor=None):
+        self.file_handler = file_handler
+        self.executor = executor or _IO_EXECUTOR
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable in the executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def read_collections(self, *file_names):
+        """Read several JSON collections concurrently, in the order given"""
+        return await asyncio.gather(*(self.read_json_file(file_name) for file_name in file_names))
+
+
+def _async_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.file_handler, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(FileHandler, name).__doc__
+    return method
+
+
+for _name in dir(FileHandler):
+    if not _name.startswith('_') and callable(getattr(FileHandler, _name)):
+        setattr(AsyncFileHandler, _name, _async_method(_name))
+
+
+def run_async(coroutine):
+    """Run a coroutine to completion from synchronous code.
+
+    Streamlit scripts normally have no running event loop; if one is
+    running (e.g. inside a notebook) the coroutine runs on a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
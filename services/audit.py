@@ -0,0 +1,374 @@
+"""Cross-collection consistency auditor.
+
+Checks the invariants that tie books, copies, issues and requests
+together, using indexes built once per audit so each check is a lookup:
+
+- a book's counters match its open issues, hold reservations and copy records
+- free copies aren't left on the shelf while holds are waiting
+- issues and requests reference books and students that exist
+- return requests agree with the state of their issue
+
+An incremental audit only re-checks records touched since the last audit,
+found from the change feed (services.events) after the checkpoint seq
+saved in audit.json; findings for untouched records carry over.
+
+Every check group needs the issue collection and parsing it dominates
+an audit, so the groups share one snapshot in one process rather than
+running in parallel processes that would each parse it again.
+
+Each finding may carry a repair; FileHandler.repair_data applies them.
+
+    python -m services.audit --data-dir data
+    python -m services.audit --data-dir data --incremental --repair
+"""
+import argparse
+import json
+import re
+from collections import Counter
+from functools import cached_property
+
+from services.inventory import WITHDRAWN, CopyInventory, copy_index, sync_book_counts
+
+CHECK_GROUPS = ('books', 'issued_books', 'requests')
+
+# Entity kind of an id found anywhere in an event, by id shape
+ID_PATTERNS = (
+    ('books', re.compile(r'^BK-\d+$')),
+    ('students', re.compile(r'^STU-\w+$')),
+    ('issues', re.compile(r'^ISS-\d+$')),
+    ('requests', re.compile(r'^REQ-\d+$')),
+)
+
+SCOPE_KINDS = ('books', 'students', 'issues', 'requests')
+
+
+class AuditSnapshot:
+    """Collections and indexes for one audit, loaded on first use.
+
+    load(file_name) returns a parsed collection, e.g. FileHandler.read_json_file.
+    """
+
+    def __init__(self, load):
+        self.load = load
+
+    @cached_property
+    def books(self):
+        return self.load('books.json')
+
+    @cached_property
+    def students(self):
+        return self.load('students.json')
+
+    @cached_property
+    def issues(self):
+        return self.load('issued_books.json')
+
+    @cached_property
+    def requests(self):
+        return self.load('requests.json')
+
+    @cached_property
+    def inventory(self):
+        return CopyInventory(self.load('copies.json') or {})
+
+    @cached_property
+    def books_by_id(self):
+        return {book['id']: book for book in self.books}
+
+    @cached_property
+    def student_ids(self):
+        return {student['id'] for student in self.students}
+
+    @cached_property
+    def issues_by_id(self):
+        return {issue['id']: issue for issue in self.issues}
+
+    @cached_property
+    def open_issues_by_book(self):
+        open_issues = {}
+        for issue in self.issues:
+            if not issue.get('returned', False):
+                open_issues.setdefault(issue['book_id'], []).append(issue)
+        return open_issues
+
+    @cached_property
+    def reservations_by_book(self):
+        """Pending requests holding a reserved copy, per book"""
+        reservations = {}
+        for request in self.requests:
+            if request['status'] == "pending" and request.get('reserved_copy_id'):
+                reservations.setdefault(request['book_id'], []).append(request)
+        return reservations
+
+    @cached_property
+    def waiting_by_book(self):
+        return Counter(request['book_id'] for request in self.requests if request['status'] == "on_hold")
+
+    @cached_property
+    def pending_returns_by_issue(self):
+        return {
+            request.get('issue_id'): request for request in self.requests
+            if request['type'] == "return" and request['status'] == "pending"
+        }
+
+
+def _finding(check, collection, record_id, message, repair=None):
+    return {"check": check, "collection": collection, "id": record_id, "message": message, "repair": repair}
+
+
+def _duplicates(collection, records):
+    return [
+        _finding("duplicate_id", collection, record_id, f"{count} records share this id")
+        for record_id, count in Counter(record['id'] for record in records).items() if count > 1
+    ]
+
+
+def check_books(snapshot, scope=None):
+    """Copy counters, copy records and hold queues of each book"""
+    findings = [] if scope else _duplicates('books', snapshot.books)
+    for book in snapshot.books:
+        book_id = book['id']
+        if scope and book_id not in scope['books']:
+            continue
+        recount = {"action": "recount_copies", "book_id": book_id}
+
+        on_loan = len(snapshot.open_issues_by_book.get(book_id, ()))
+        reserved = len(snapshot.reservations_by_book.get(book_id, ()))
+        total = book.get('total_copies', 1)
+        available = book.get('available_copies', 0)
+        expected = total - on_loan - reserved
+
+        if expected < 0:
+            findings.append(_finding("over_issued", 'books', book_id,
+                                     f"{on_loan} open issues and {reserved} reservations for {total} copies"))
+        elif available != expected:
+            findings.append(_finding("copy_count", 'books', book_id,
+                                     f"available_copies is {available}, expected {expected} "
+                                     f"({total} copies, {on_loan} on loan, {reserved} reserved)", recount))
+        elif book.get('available') != (available > 0):
+            findings.append(_finding("available_flag", 'books', book_id,
+                                     f"available is {book.get('available')} with {available} copies free", recount))
+
+        title = snapshot.inventory.title(book_id)
+        if title is not None and (title.total, title.available) != (total, available):
+            findings.append(_finding("copy_records", 'books', book_id,
+                                     f"copy records show {title.available} of {title.total} free, "
+                                     f"book says {available} of {total}", recount))
+
+        if available > 0 and snapshot.waiting_by_book.get(book_id):
+            findings.append(_finding("holds_not_served", 'books', book_id,
+                                     f"{available} copies free while {snapshot.waiting_by_book[book_id]} holds wait",
+                                     {"action": "serve_holds", "book_id": book_id}))
+
+        if book.get('author') == "Unknown" and book.get('title') == f"Book {book_id}":
+            findings.append(_finding("placeholder_book", 'books', book_id,
+                                     "placeholder created by a return for a missing book"))
+    return findings
+
+
+def _in_scope(record, scope, own_kind):
+    return (record['id'] in scope[own_kind] or record.get('book_id') in scope['books']
+            or record.get('student_id') in scope['students'] or record.get('issue_id') in scope['issues'])
+
+
+def check_issues(snapshot, scope=None):
+    """References and loan state of each issue"""
+    findings = [] if scope else _duplicates('issued_books', snapshot.issues)
+    for issue in snapshot.issues:
+        if scope and not _in_scope(issue, scope, 'issues'):
+            continue
+        issue_id, book_id = issue['id'], issue['book_id']
+
+        if book_id not in snapshot.books_by_id:
+            findings.append(_finding("unknown_book", 'issued_books', issue_id, f"book {book_id} does not exist"))
+        if issue['student_id'] not in snapshot.student_ids:
+            findings.append(_finding("unknown_student", 'issued_books', issue_id,
+                                     f"student {issue['student_id']} does not exist"))
+        if issue.get('returned', False):
+            continue
+
+        title = snapshot.inventory.title(book_id)
+        if title is not None and issue.get('copy_id') and title.is_free(issue['copy_id']):
+            findings.append(_finding("copy_on_shelf", 'issued_books', issue_id,
+                                     f"copy {issue['copy_id']} is on loan but marked free",
+                                     {"action": "recount_copies", "book_id": book_id}))
+        if issue.get('return_requested') and issue_id not in snapshot.pending_returns_by_issue:
+            findings.append(_finding("orphan_return_flag", 'issued_books', issue_id,
+                                     "return_requested is set but no return request is pending",
+                                     {"action": "clear_return_requested", "issue_id": issue_id}))
+    return findings
+
+
+def check_requests(snapshot, scope=None):
+    """References and status of each request against its book, student and issue"""
+    findings = [] if scope else _duplicates('requests', snapshot.requests)
+    for request in snapshot.requests:
+        if scope and not _in_scope(request, scope, 'requests'):
+            continue
+        request_id, status = request['id'], request['status']
+        active = status in ("pending", "on_hold")
+
+        if active and request['book_id'] not in snapshot.books_by_id:
+            findings.append(_finding("unknown_book", 'requests', request_id, f"book {request['book_id']} does not exist"))
+        if active and request['student_id'] not in snapshot.student_ids:
+            findings.append(_finding("unknown_student", 'requests', request_id,
+                                     f"student {request['student_id']} does not exist"))
+
+        if request['type'] == "return":
+            issue = snapshot.issues_by_id.get(request.get('issue_id'))
+            if status == "pending" and issue is None:
+                findings.append(_finding("unknown_issue", 'requests', request_id,
+                                         f"issue {request.get('issue_id')} does not exist"))
+            elif status == "pending" and issue.get('returned', False):
+                findings.append(_finding("stale_return_request", 'requests', request_id,
+                                         f"issue {issue['id']} was already returned",
+                                         {"action": "cancel_request", "request_id": request_id}))
+            elif status == "approved" and issue is not None and not issue.get('returned', False):
+                findings.append(_finding("return_not_applied", 'requests', request_id,
+                                         f"return approved but issue {issue['id']} is still open"))
+        elif status == "pending" and request.get('reserved_copy_id'):
+            title = snapshot.inventory.title(request['book_id'])
+            if title is not None and title.is_free(request['reserved_copy_id']):
+                findings.append(_finding("reservation_on_shelf", 'requests', request_id,
+                                         f"reserved copy {request['reserved_copy_id']} is marked free",
+                                         {"action": "recount_copies", "book_id": request['book_id']}))
+    return findings
+
+
+CHECKS = {'books': check_books, 'issued_books': check_issues, 'requests': check_requests}
+
+
+def run_checks(snapshot, scope=None):
+    """Findings of every check group over one snapshot"""
+    return [finding for group in CHECK_GROUPS for finding in CHECKS[group](snapshot, scope)]
+
+
+def scope_from_events(events):
+    """{kind: ids} of every book, student, issue and request mentioned in events"""
+    scope = {kind: set() for kind in SCOPE_KINDS}
+
+    def visit(value):
+        if isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item)
+        elif isinstance(value, str):
+            for kind, pattern in ID_PATTERNS:
+                if pattern.match(value):
+                    scope[kind].add(value)
+                    break
+
+    for event in events:
+        visit(event['data'])
+    return scope
+
+
+def _finding_refs(finding):
+    """Scope ids a finding is about, so incremental audits know which old findings to replace"""
+    refs = {finding['id']}
+    if finding.get('repair'):
+        refs.update(value for key, value in finding['repair'].items() if key != 'action')
+    return refs
+
+
+def merge_findings(previous, fresh, scope):
+    """Previous findings about records outside scope, plus the fresh ones"""
+    touched = set().union(*scope.values())
+    return [finding for finding in previous if not _finding_refs(finding) & touched] + fresh
+
+
+def recount_copies(snapshot, book):
+    """Rebuild a book's free copies from its open issues and reservations"""
+    book_id = book['id']
+    open_issues = snapshot.open_issues_by_book.get(book_id, [])
+    held = {issue['copy_id'] for issue in open_issues if issue.get('copy_id')}
+    held.update(request['reserved_copy_id'] for request in snapshot.reservations_by_book.get(book_id, []))
+    # Loans from before copies were tracked hold the lowest copies not otherwise accounted for
+    untracked = sum(1 for issue in open_issues if not issue.get('copy_id'))
+
+    title = snapshot.inventory.title(book_id)
+    if title is None:
+        title = snapshot.inventory.create_title(book_id, book.get('total_copies', 1))
+
+    held_indexes = {copy_index(copy_id) for copy_id in held}
+    free = 0
+    for index, copy in enumerate(title.copies):
+        if copy.get('condition') == WITHDRAWN or index in held_indexes:
+            continue
+        if untracked:
+            untracked -= 1
+            continue
+        free |= 1 << index
+    title.free = free
+    sync_book_counts(book, title)
+    return title
+
+
+def apply_repairs(snapshot, findings):
+    """Apply the repairs of findings to the snapshot's collections in place.
+
+    Returns (repaired findings, set of changed file names). Holds are
+    served by the caller, which owns the hold queue logic.
+    """
+    repaired = []
+    changed = set()
+    recounted = set()
+
+    for finding in findings:
+        repair = finding.get('repair')
+        if not repair:
+            continue
+        action = repair['action']
+
+        if action == "recount_copies":
+            book = snapshot.books_by_id.get(repair['book_id'])
+            if book is None:
+                continue
+            if book['id'] not in recounted:
+                recount_copies(snapshot, book)
+                recounted.add(book['id'])
+            changed.update(('books.json', 'copies.json'))
+        elif action == "clear_return_requested":
+            snapshot.issues_by_id[repair['issue_id']]['return_requested'] = False
+            changed.add('issued_books.json')
+        elif action == "cancel_request":
+            request = next(request for request in snapshot.requests if request['id'] == repair['request_id'])
+            request['status'] = "cancelled"
+            changed.add('requests.json')
+        elif action != "serve_holds":
+            continue
+        repaired.append(finding)
+
+    return repaired, changed
+
+
+def main(argv=None):
+    from services.file_handler import FileHandler
+
+    parser = argparse.ArgumentParser(description="Check cross-collection consistency of the library data")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--incremental", action="store_true", help="only re-check records changed since the last audit")
+    parser.add_argument("--repair", action="store_true", help="apply the available repairs")
+    parser.add_argument("--json", action="store_true", help="print findings as JSON lines")
+    args = parser.parse_args(argv)
+
+    file_handler = FileHandler(data_dir=args.data_dir)
+    if args.repair:
+        result = file_handler.repair_data(incremental=args.incremental)
+    else:
+        result = file_handler.audit_data(incremental=args.incremental)
+
+    for finding in result['findings']:
+        if args.json:
+            print(json.dumps(finding))
+        else:
+            fix = f" [repair: {finding['repair']['action']}]" if finding.get('repair') else ""
+            print(f"{finding['collection']}/{finding['id']}: {finding['check']}: {finding['message']}{fix}")
+    print(f"{result['mode']} audit: {len(result['findings'])} findings, {result.get('repaired', 0)} repaired, "
+          f"checked through event {result['seq']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Column-oriented view of books.json for vectorized filtering and sorting.
+
+The Books and Browse Books pages filter the whole catalog on every
+render. BookCatalog keeps one array per field instead of a list of
+dicts: genre as a pandas Categorical (integer codes), availability as a
+boolean array, copy counts as integer arrays and a lower-cased
+"title\\nauthor" string column for search. A filter is a boolean mask
+built from a few array comparisons, and each sort order is computed
+once per catalog, so filter-and-sort is O(n) array work with no Python
+loop over books.
+
+The catalog is rebuilt only when books.json changes (see cached_catalog).
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from services.isbn import normalize_isbn
+from services.search import keyed_index
+from services.timestamps import to_display
+
+# Sortable fields -> catalog column
+SORT_FIELDS = {
+    'title': 'title_key',
+    'author': 'author_key',
+    'genre': 'genre',
+    'available_copies': 'available_copies',
+    'total_copies': 'total_copies',
+    'added_at': 'added_at',
+}
+
+_catalog_cache = {}
+_catalog_cache_lock = threading.Lock()
+
+
+class BookCatalog:
+    """books.json held as columns, with mask-based filtering"""
+
+    def __init__(self, books):
+        self.books = books
+
+        def column(field, default=""):
+            return [book.get(field, default) for book in books]
+
+        available = [bool(book.get('available', False)) for book in books]
+        self.ids = np.array(column('id'), dtype=object)
+        self.title = pd.Series(column('title'), dtype="string")
+        self.author = pd.Series(column('author'), dtype="string")
+        self.genre = pd.Categorical(column('genre'))
+        self.available = np.array(available, dtype=bool)
+        self.total_copies = np.array(column('total_copies', 1), dtype=np.int64)
+        self.available_copies = np.array(
+            [book.get('available_copies', 1 if flag else 0) for book, flag in zip(books, available)], dtype=np.int64
+        )
+        self.added_at = pd.Series([to_display(value) for value in column('added_at')], dtype="string")
+        self.isbn = np.array(column('isbn'), dtype=object)
+        # ISBN -> position; ISBNs are unique (see FileHandler.add_book)
+        self.isbn_index = {isbn: position for position, isbn in enumerate(self.isbn) if isbn}
+        # Lower-cased search text and sort keys
+        self.search_text = (self.title + "\n" + self.author).str.lower()
+        self.title_key = self.title.str.lower()
+        self.author_key = self.author.str.lower()
+        self._orders = {}
+        self._prefix_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def genres(self):
+        """Distinct genres, sorted"""
+        return sorted(self.genre.categories)
+
+    def find_isbn(self, value):
+        """Position of the book with this ISBN (any ISBN-10/13 spelling), or None"""
+        isbn = normalize_isbn(value)
+        return self.isbn_index.get(isbn) if isbn else None
+
+    def mask(self, search_term="", genre_filter="All", availability_filter="All"):
+        """Boolean array of the books matching every filter; a search term that is an ISBN matches that book"""
+        mask = np.ones(len(self), dtype=bool)
+
+        if genre_filter != "All":
+            categories = self.genre.categories
+            if genre_filter not in categories:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.genre.codes == categories.get_loc(genre_filter)
+
+        if availability_filter == "Available":
+            mask &= self.available
+        elif availability_filter == "Not Available":
+            mask &= ~self.available
+
+        if search_term and normalize_isbn(search_term):
+            position = self.find_isbn(search_term)
+            found = np.zeros(len(self), dtype=bool)
+            if position is not None:
+                found[position] = True
+            mask &= found
+        elif search_term:
+            # Substring search is the costly step: only run it over the books still in play
+            candidates = np.flatnonzero(mask)
+            found = self.search_text.iloc[candidates].str.contains(search_term.lower(), regex=False)
+            mask[candidates] = found.to_numpy(dtype=bool)
+
+        return mask
+
+    def _order(self, sort_by):
+        """Positions of all books in sort_by order (stable), computed once per catalog"""
+        order = self._orders.get(sort_by)
+        if order is None:
+            values = getattr(self, SORT_FIELDS[sort_by])
+            if isinstance(values, pd.Categorical):
+                # Categories are sorted, so codes order like the genre names
+                values = values.codes
+            order = np.asarray(pd.Series(values).argsort(kind='stable'))
+            self._orders[sort_by] = order
+        return order
+
+    def filter_books(self, search_term="", genre_filter="All", availability_filter="All", sort_by=None,
+                     descending=False):
+        """Positions of the matching books, in catalog order or sorted by one of SORT_FIELDS"""
+        mask = self.mask(search_term, genre_filter, availability_filter)
+        if sort_by is None:
+            positions = np.flatnonzero(mask)
+        else:
+            order = self._order(sort_by)
+            positions = order[mask[order]]
+        return positions[::-1] if descending else positions
+
+    def search(self, prefix="", limit=10, available_only=False):
+        """Positions of up to limit books whose title or id starts with prefix (see services.search).
+
+        A complete ISBN finds its book directly.
+        """
+        position = self.find_isbn(prefix)
+        if position is not None:
+            return [] if available_only and not self.available[position] else [position]
+        if self._prefix_index is None:
+            self._prefix_index = keyed_index(self.title_key, self.ids)
+        return self._prefix_index.search(prefix, limit, self.available if available_only else None)
+
+    def records(self, positions):
+        """The book dicts at positions"""
+        return [self.books[i] for i in positions]
+
+    def frame(self, positions):
+        """Admin table of the books at positions, built from the columns"""
+        available = self.available[positions]
+        return pd.DataFrame({
+            "ID": self.ids[positions],
+            "Title": self.title.iloc[positions].to_numpy(),
+            "Author": self.author.iloc[positions].to_numpy(),
+            "Genre": np.asarray(self.genre[positions]),
+            "Total Copies": self.total_copies[positions],
+            "Available Copies": self.available_copies[positions],
+            "Status": np.where(available, "Available", "Not Available"),
+            "ISBN": self.isbn[positions],
+            "Added On": self.added_at.iloc[positions].to_numpy(),
+        })
+
+
+def cached_catalog(path, load):
+    """The catalog of the books file at path, built once per process and rebuilt when the file changes.
+
+    Returns (catalog, cache_hit); load() reads the books on a miss.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return BookCatalog([]), False
+
+    entry = _catalog_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1], True
+
+    catalog = BookCatalog(load() or [])
+    with _catalog_cache_lock:
+        _catalog_cache[path] = (signature, catalog)
+    return catalog, False
@@ -0,0 +1,175 @@
+"""Circulation analytics over the issue history.
+
+Issue, return and late-return counts are rolled up per day. Closed days
+(before today) never change, so their rollups are stored in
+circulation.json and only days after the last rollup are aggregated;
+today is always computed live. Utilization and top borrowers are
+computed for an arbitrary date range with vectorized pandas group-bys
+over the issues that overlap it.
+
+Every function takes the issues as a frame from issues_frame (or as a
+list of records, framed on the way in): timestamps are parsed once, and
+the date-range filters are comparisons on the parsed columns.
+"""
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from services.timestamps import datetime_series
+
+ROLLUP_COLUMNS = ["issues", "returns", "late_returns"]
+
+
+def _day_key(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value)[:10]
+
+
+def _day_end(day_key):
+    """Start of the day after a 'YYYY-MM-DD' day: the exclusive upper bound for that day"""
+    return pd.Timestamp(day_key) + pd.Timedelta(days=1)
+
+
+def issues_frame(issued_books):
+    """Issue records (dicts or Issue records) as a DataFrame with parsed issue, due and return timestamps"""
+    def column(field):
+        return pd.Series([issue.get(field) for issue in issued_books], dtype=object)
+
+    return pd.DataFrame({
+        "student_id": column("student_id"),
+        "book_id": column("book_id"),
+        "issue_ts": datetime_series(column("issue_date")),
+        "due_ts": datetime_series(column("due_date")),
+        "return_ts": datetime_series(column("return_date")),
+    })
+
+
+def _frame(issues):
+    return issues if isinstance(issues, pd.DataFrame) else issues_frame(issues)
+
+
+def daily_counts(frame):
+    """Issues, returns and late returns per day (index of 'YYYY-MM-DD' strings)"""
+    issues = frame["issue_ts"].dt.strftime("%Y-%m-%d").value_counts()
+    returned = frame[frame["return_ts"].notna()]
+    returns = returned["return_ts"].dt.strftime("%Y-%m-%d").value_counts()
+    late = returned[returned["return_ts"] > returned["due_ts"]]
+    late_returns = late["return_ts"].dt.strftime("%Y-%m-%d").value_counts()
+
+    counts = pd.DataFrame({"issues": issues, "returns": returns, "late_returns": late_returns})
+    return counts.reindex(columns=ROLLUP_COLUMNS).fillna(0).astype(int).sort_index()
+
+
+def _events_after(frame, after, until=None):
+    """Issues with an issue or return on a day after `after` ('' for all days) and up to `until`"""
+    def in_range(column):
+        mask = column.notna()
+        if after:
+            mask &= column >= _day_end(after)
+        if until:
+            mask &= column < _day_end(until)
+        return mask
+
+    return frame[in_range(frame["issue_ts"]) | in_range(frame["return_ts"])]
+
+
+def rollups_current(rollups, today=None):
+    """True when every closed day is already rolled up"""
+    today = today or date.today()
+    return rollups.get("through", "") >= (today - timedelta(days=1)).isoformat()
+
+
+def update_rollups(rollups, issued_books, today=None):
+    """Aggregate closed days not yet in the rollups.
+
+    rollups is {"through": last rolled-up day, "days": {day: [issues, returns, late_returns]}}.
+    Returns True if any days were added.
+    """
+    today = today or date.today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    through = rollups.setdefault("through", "")
+    days = rollups.setdefault("days", {})
+
+    if rollups_current(rollups, today):
+        return False
+
+    counts = daily_counts(_events_after(_frame(issued_books), through, yesterday))
+    counts = counts[(counts.index > through) & (counts.index <= yesterday)]
+    for day, row in zip(counts.index, counts.itertuples(index=False)):
+        days[day] = [int(value) for value in row]
+
+    rollups["through"] = yesterday
+    return True
+
+
+def daily_series(rollups, issues, start, end, today=None):
+    """Daily counts between start and end (inclusive): rollups for closed days, live counts after"""
+    today = today or date.today()
+    start, end = _day_key(start), _day_key(end)
+
+    stored = {day: values for day, values in rollups.get("days", {}).items() if start <= day <= end}
+    series = pd.DataFrame.from_dict(stored, orient='index', columns=ROLLUP_COLUMNS)
+
+    # Days not covered by the rollups yet (normally just today)
+    live = daily_counts(_events_after(_frame(issues), rollups.get("through", "")))
+    live = live[(live.index >= start) & (live.index <= end)]
+    series = pd.concat([series, live]) if not series.empty else live
+
+    index = pd.date_range(start, min(end, today.isoformat()))
+    series.index = pd.to_datetime(series.index)
+    return series.groupby(level=0).sum().reindex(index, fill_value=0).astype(int)
+
+
+def weekly_series(daily):
+    """Roll daily counts up to weeks starting on Monday"""
+    return daily.resample('W-MON', label='left', closed='left').sum()
+
+
+def _overlapping(frame, start, end):
+    """Issues that were out at some point between start and end"""
+    return frame[(frame["issue_ts"] < _day_end(end))
+                 & (frame["return_ts"].isna() | (frame["return_ts"] >= pd.Timestamp(start)))]
+
+
+def utilization(issues, books, start, end, by="title", now=None):
+    """Share of copy-days on loan between start and end, per title or per genre"""
+    start, end = _day_key(start), _day_key(end)
+    now = pd.Timestamp(now or datetime.now())
+    start_ts = pd.Timestamp(start)
+    end_ts = min(pd.Timestamp(end) + pd.Timedelta(days=1), now)
+    range_days = max((end_ts - start_ts).total_seconds() / 86400, 0)
+
+    catalog = pd.DataFrame.from_records(books, columns=["id", "title", "genre", "total_copies"])
+    catalog["total_copies"] = catalog["total_copies"].fillna(1)
+    catalog["capacity"] = catalog["total_copies"] * range_days
+
+    frame = _overlapping(_frame(issues), start, end)
+    loan_start = frame["issue_ts"].clip(lower=start_ts)
+    loan_end = frame["return_ts"].fillna(now).clip(upper=end_ts)
+    loan_days = ((loan_end - loan_start).dt.total_seconds() / 86400).clip(lower=0)
+    catalog["loan_days"] = catalog["id"].map(loan_days.groupby(frame["book_id"]).sum()).fillna(0.0)
+
+    if by == "genre":
+        grouped = catalog.groupby("genre")[["loan_days", "capacity"]].sum()
+    else:
+        grouped = catalog.set_index("title")[["loan_days", "capacity"]]
+
+    grouped = grouped[grouped["capacity"] > 0]
+    result = pd.DataFrame({
+        "Loan Days": grouped["loan_days"].round(1),
+        "Utilization": (grouped["loan_days"] / grouped["capacity"]).round(4),
+    })
+    return result.sort_values("Utilization", ascending=False)
+
+
+def top_borrowers(issues, students, start, end, limit=10):
+    """Students with the most issues between start and end"""
+    frame = _frame(issues)
+    start, end = _day_key(start), _day_key(end)
+    issued = frame["issue_ts"]
+    counts = frame.loc[(issued >= pd.Timestamp(start)) & (issued < _day_end(end)), "student_id"].value_counts().head(limit)
+    names = {student['id']: student['name'] for student in students}
+    return pd.DataFrame({
+        "Student ID": counts.index,
+        "Name": [names.get(student_id, "Unknown") for student_id in counts.index],
+        "Books Borrowed": counts.values,
+    })
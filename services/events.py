@@ -0,0 +1,155 @@
+"""Change-data-capture feed of every mutation to the library data.
+
+Each successful FileHandler write appends one typed event to the
+append-only data/events.jsonl, one JSON object per line:
+
+    {"seq": 42, "type": "issue_created", "at": "2024-03-01 10:00:00", "data": {...}}
+
+seq increases by one per event across all collections, so a consumer
+remembers the last seq it processed and asks for the delta with
+events_since(seq) instead of re-reading the collections. Lines are
+sorted by seq, so finding the start of a delta is a binary search over
+byte offsets rather than a scan of the whole feed.
+
+    python -m services.events --data-dir data --since 0
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+from services.file_lock import CollectionLocks
+
+EVENTS_FILE = 'events.jsonl'
+
+EVENT_TYPES = frozenset({
+    'book_added', 'book_updated', 'book_deleted', 'copy_updated',
+    'student_registered', 'student_approved', 'student_blocked', 'student_flagged', 'student_unflagged',
+    'request_created', 'hold_placed', 'hold_promoted', 'hold_expired', 'return_requested', 'request_approved',
+    'issue_created', 'issue_returned',
+    'fine_policy_updated', 'fines_assessed', 'fine_payment_recorded',
+    'history_archived', 'data_repaired',
+})
+
+# Below this many bytes the remaining range is scanned line by line
+SCAN_BLOCK = 8192
+
+
+def _line_seq(line):
+    return json.loads(line)['seq']
+
+
+class EventFeed:
+    """Append-only, sequence-numbered event log in <data_dir>/events.jsonl"""
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, EVENTS_FILE)
+        self.locks = CollectionLocks(data_dir)
+
+    def _tail(self, f):
+        """(seq of the last complete line, offset just past it); (0, 0) for an empty feed"""
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            position = max(0, position - SCAN_BLOCK)
+            f.seek(position)
+            block = f.read(end - position)
+            last_newline = block.rfind(b'\n')
+            # Need the newline ending the last line and the one before it (or the file start)
+            previous_newline = block.rfind(b'\n', 0, last_newline) if last_newline >= 0 else -1
+            if last_newline >= 0 and (previous_newline >= 0 or position == 0):
+                return _line_seq(block[previous_newline + 1:last_newline]), position + last_newline + 1
+        return 0, 0
+
+    def last_seq(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return self._tail(f)[0]
+        except FileNotFoundError:
+            return 0
+
+    def append(self, event_type, data):
+        """Record one event; returns its seq (0 if it could not be written)"""
+        seqs = self.append_many([(event_type, data)])
+        return seqs[0] if seqs else 0
+
+    def append_many(self, events):
+        """Record (event_type, data) pairs with one write; returns their seqs ([] if they could not be written)"""
+        for event_type, _ in events:
+            if event_type not in EVENT_TYPES:
+                raise ValueError(f"Unknown event type: {event_type}")
+        if not events:
+            return []
+
+        try:
+            with self.locks.exclusive(EVENTS_FILE):
+                with open(self.path, 'ab+') as f:
+                    last, complete_end = self._tail(f)
+                    if complete_end < f.seek(0, os.SEEK_END):
+                        # Drop a line torn by a writer that died mid-append
+                        f.truncate(complete_end)
+                    at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    lines = [
+                        json.dumps({"seq": seq, "type": event_type, "at": at, "data": data}, separators=(',', ':'))
+                        for seq, (event_type, data) in enumerate(events, last + 1)
+                    ]
+                    f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            return list(range(last + 1, last + 1 + len(events)))
+        except Exception as e:
+            print(f"Error recording {events[0][0]} event: {str(e)}")
+            return []
+
+    def _offset_after(self, f, seq, size):
+        """Byte offset at or before the first line with a seq greater than seq"""
+        low, high = 0, size
+        while high - low > SCAN_BLOCK:
+            middle = (low + high) // 2
+            f.seek(middle)
+            f.readline()  # skip to the next line start
+            start = f.tell()
+            line = f.readline()
+            if line.endswith(b'\n') and _line_seq(line) <= seq:
+                low = start + len(line)
+            else:
+                high = middle
+        return low
+
+    def events_since(self, seq=0, limit=None, types=None):
+        """Events with a seq greater than seq, oldest first.
+
+        Appends never rewrite earlier lines, so readers take no lock; a
+        line still being written is left for the next call.
+        """
+        events = []
+        try:
+            with open(self.path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(self._offset_after(f, seq, size) if seq > 0 else 0)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    event = json.loads(line)
+                    if event['seq'] <= seq or (types and event['type'] not in types):
+                        continue
+                    events.append(event)
+                    if limit and len(events) >= limit:
+                        break
+        except FileNotFoundError:
+            pass
+        return events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print change events after a sequence number")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--since", type=int, default=0)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--type", action="append", dest="types", help="only events of this type (repeatable)")
+    args = parser.parse_args(argv)
+
+    for event in EventFeed(args.data_dir).events_since(args.since, args.limit, args.types):
+        print(json.dumps(event))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Streaming export of the library collections to CSV, JSONL or Parquet.
+
+Records are read and written in fixed-size chunks, so memory stays
+constant however large the collection is: JSON collections are decoded
+one record at a time from the file and logs.csv is read row by row.
+Exports read a snapshot without holding collection locks, because JSON
+files are replaced atomically and logs.csv is only appended to.
+
+    python -m services.export issued_books --format parquet --output loans.parquet \\
+        --columns id,student_id,book_id,issue_date --where returned=false --since 2024-01-01
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from services.archive import ArchiveStore
+from services.file_lock import CollectionLocks
+from services.records import as_dict
+from services.timestamps import TIMESTAMP_FIELDS, is_epoch, to_display
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet exports
+    pa = None
+    pq = None
+
+COLLECTIONS = {
+    'books': 'books.json',
+    'students': 'students.json',
+    'issued_books': 'issued_books.json',
+    'requests': 'requests.json',
+    'logs': 'logs.csv',
+}
+
+# Field that --since/--until compare against
+DATE_FIELDS = {
+    'books': 'added_at',
+    'students': 'created_at',
+    'issued_books': 'issue_date',
+    'requests': 'requested_at',
+    'logs': 'timestamp',
+}
+
+# Never exported
+EXCLUDED_FIELDS = {'students': {'password'}}
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+MIME_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+CHUNK_SIZE = 10000
+READ_BLOCK = 1 << 16
+
+
+def iter_json_array(path, block_size=READ_BLOCK):
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = f.read(block_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} is not a JSON array")
+        position = 1
+        eof = False
+
+        while True:
+            # Skip the separator before the next element
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Buffer exhausted", buffer, position)
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element continues past the buffer: drop what's consumed and read more
+                block = f.read(block_size)
+                eof = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            yield record
+
+
+def _iter_log_rows(data_dir):
+    """logs.csv rows as dicts, up to the size the file had when the export started"""
+    path = os.path.join(data_dir, 'logs.csv')
+    if not os.path.exists(path):
+        return
+    # Rows appended while the export runs are left out, as is a row being written now
+    with CollectionLocks(data_dir).shared('logs.csv'):
+        size = os.path.getsize(path)
+
+    def lines(f):
+        position = 0
+        for line in f:
+            position += len(line)
+            if position > size:
+                return
+            yield line.decode('utf-8')
+
+    with open(path, 'rb') as f:
+        rows = csv.reader(lines(f))
+        header = next(rows, None)
+        for row in rows:
+            yield dict(zip(header, row))
+
+
+def iter_records(data_dir, collection, include_archive=False):
+    """Every record of a collection, oldest archive partitions first when include_archive is set"""
+    file_name = COLLECTIONS[collection]
+    if collection == 'logs':
+        yield from _iter_log_rows(data_dir)
+        return
+
+    if include_archive and collection in ('issued_books', 'requests'):
+        archive = ArchiveStore(data_dir)
+        for partition in archive.partitions(file_name):
+            yield from archive.read_partition(file_name, partition)
+
+    path = os.path.join(data_dir, file_name)
+    if os.path.exists(path):
+        yield from iter_json_array(path)
+
+
+def _matches(record, filters, date_field, since, until):
+    for field, value in filters.items():
+        if str(record.get(field)).lower() != str(value).lower():
+            return False
+    if since or until:
+        stamp = to_display(record.get(date_field)) or ""
+        if since and stamp < since:
+            return False
+        if until and stamp[:len(until)] > until:
+            return False
+    return True
+
+
+def iter_chunks(data_dir, collection, columns=None, filters=None, since=None, until=None,
+                include_archive=False, chunk_size=CHUNK_SIZE):
+    """Filtered, projected records in lists of at most chunk_size"""
+    if collection not in COLLECTIONS:
+        raise ValueError(f"Unknown collection: {collection}")
+    filters = filters or {}
+    excluded = EXCLUDED_FIELDS.get(collection, set())
+    date_field = DATE_FIELDS[collection]
+
+    timestamp_fields = TIMESTAMP_FIELDS.get(COLLECTIONS[collection], ())
+
+    chunk = []
+    for record in iter_records(data_dir, collection, include_archive):
+        if not _matches(record, filters, date_field, since, until):
+            continue
+        if any(is_epoch(record.get(field)) for field in timestamp_fields):
+            # Exports always carry timestamps as text, however they are stored
+            record = as_dict(record).copy()
+            for field in timestamp_fields:
+                if field in record:
+                    record[field] = to_display(record[field])
+        if columns:
+            record = {column: record.get(column) for column in columns}
+        elif excluded:
+            record = {key: value for key, value in record.items() if key not in excluded}
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+NESTED_TYPES = (dict, list)
+
+
+def _rows(chunk, columns):
+    """Chunk records as lists of column values, nested values as JSON text"""
+    return [[json.dumps(value) if isinstance(value, NESTED_TYPES) else value for value in map(record.get, columns)]
+            for record in chunk]
+
+
+class _CsvWriter:
+    def __init__(self, out):
+        self.out = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+        self.writer = None
+
+    def write(self, chunk, columns):
+        if self.writer is None:
+            self.writer = csv.writer(self.out)
+            self.writer.writerow(columns)
+        self.writer.writerows(_rows(chunk, columns))
+
+    def close(self):
+        self.out.flush()
+        self.out.detach()
+
+
+class _JsonlWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, chunk, columns):
+        self.out.write(''.join(json.dumps(as_dict(record)) + '\n' for record in chunk).encode('utf-8'))
+
+    def close(self):
+        self.out.flush()
+
+
+class _ParquetWriter:
+    def __init__(self, out):
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.out = out
+        self.writer = None
+        self.schema = None
+
+    def write(self, chunk, columns):
+        values = list(zip(*_rows(chunk, columns))) if chunk else [[] for _ in columns]
+        if self.writer is None:
+            # Types come from the first chunk; columns that are all empty there are strings
+            inferred = pa.Table.from_arrays([pa.array(column) for column in values], names=columns).schema
+            self.schema = pa.schema([
+                pa.field(field.name, pa.string() if pa.types.is_null(field.type) else field.type)
+                for field in inferred
+            ])
+            self.writer = pq.ParquetWriter(self.out, self.schema)
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(values, self.schema)], schema=self.schema
+        ))
+
+    def close(self):
+        if self.writer is None:
+            # Nothing matched: still write a valid, empty file
+            self.write([], [])
+        self.writer.close()
+
+
+WRITERS = {'csv': _CsvWriter, 'jsonl': _JsonlWriter, 'parquet': _ParquetWriter}
+
+
+def export_collection(data_dir, collection, out, fmt='csv', columns=None, filters=None, since=None,
+                      until=None, include_archive=False, chunk_size=CHUNK_SIZE):
+    """Write a collection to out (a path or binary file object); returns the number of rows written.
+
+    columns selects and orders fields (default: the fields seen in the
+    first chunk), filters keeps records whose fields equal the given values,
+    and since/until bound the collection's date field (see DATE_FIELDS).
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format: {fmt}")
+    if columns:
+        columns = [column for column in columns if column not in EXCLUDED_FIELDS.get(collection, ())]
+
+    owns_file = isinstance(out, (str, os.PathLike))
+    if owns_file:
+        out = open(out, 'wb')
+
+    writer = WRITERS[fmt](out)
+    rows = 0
+    try:
+        for chunk in iter_chunks(data_dir, collection, columns, filters, since, until, include_archive, chunk_size):
+            if not columns:
+                # Optional fields may be missing from early records: use every field seen in the first chunk
+                columns = list({key: None for record in chunk for key in record})
+            writer.write(chunk, columns)
+            rows += len(chunk)
+        if rows == 0 and columns:
+            # Empty result: header (or schema) only
+            writer.write([], columns)
+        writer.close()
+    finally:
+        if owns_file:
+            out.close()
+    return rows
+
+
+def _parse_filters(values):
+    filters = {}
+    for value in values or []:
+        field, separator, expected = value.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError(f"Filter must be field=value: {value}")
+        filters[field.strip()] = expected.strip()
+    return filters
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a library collection in chunks")
+    parser.add_argument("collection", choices=sorted(COLLECTIONS))
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--columns", help="comma-separated fields to export")
+    parser.add_argument("--where", action="append", help="field=value filter (repeatable)")
+    parser.add_argument("--since", help="earliest date, e.g. 2024-01-01")
+    parser.add_argument("--until", help="latest date, inclusive")
+    parser.add_argument("--include-archive", action="store_true", help="also export archived issues/requests")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        rows = export_collection(
+            args.data_dir, args.collection, args.output or sys.stdout.buffer, args.format,
+            columns=args.columns.split(',') if args.columns else None,
+            filters=_parse_filters(args.where),
+            since=args.since, until=args.until,
+            include_archive=args.include_archive, chunk_size=args.chunk_size
+        )
+    except BrokenPipeError:
+        # Output piped into e.g. head, which stopped reading
+        sys.stderr.close()
+        return
+    print(f"Exported {rows} {args.collection} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
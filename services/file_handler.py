@@ -4,20 +4,68 @@ import csv
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
+from services.metrics import METRICS
+from services.archive import ArchiveStore, DEFAULT_MAX_AGE_DAYS, archive_cutoff, record_seq, split_archivable
+from services.audit import AuditSnapshot, apply_repairs, merge_findings, run_checks, scope_from_events
+from services.catalog import cached_catalog
+from services.circulation import rollups_current, update_rollups
+from services.events import EventFeed
+from services.fines import FinePolicy, FinesLedger, compute_fines
+from services.file_lock import CollectionLocks, atomic_write_text, locked
+from services.holds import EXPIRED, ON_HOLD, HoldQueues, allocate_to_holds, overdue_holds
+from services.inventory import WITHDRAWN, CopyInventory, parse_code, sync_book_counts
+from services.isbn import normalize_isbn
+from services.pending import PendingIndex
+from services.recommendations import CoBorrowRecommender, cached_neighbors, refresh_due
+from services.records import RECORD_TYPES, as_dict, load_records
+from services.search import cached_directory
+from services.timestamps import (TIMESTAMP_FIELDS, convert_records, read_timestamp_format, stamp, to_datetime,
+                                 to_display, write_timestamp_format)
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:  # optional: the C parser is several times slower on large logs
+    CSV_ENGINE = 'c'
+
+# Methods that don't change library data; callers may share or reorder them
+# (the storage server runs them outside its write lock, RenderSnapshot
+# passes them through without dropping what it has read)
+READ_METHODS = {'read_json_file', 'read_records', 'get_logs', 'get_analytics', 'get_recommendations',
+                'get_fine_policy', 'get_student_fines', 'read_history', 'read_archive',
+                'get_archive_manifest', 'events_since', 'last_event_seq', 'search_books', 'search_students',
+                'find_book_by_isbn'}
+
+LOG_COLUMNS = ['timestamp', 'user_id', 'user_role', 'action', 'details']
+LOG_DTYPES = {'user_id': 'category', 'user_role': 'category', 'action': 'category'}
+
+
+def empty_logs_frame(include_details=True):
+    """A logs DataFrame with no rows and the get_logs dtypes"""
+    columns = LOG_COLUMNS if include_details else LOG_COLUMNS[:-1]
+    frame = pd.DataFrame({column: pd.Series(dtype=LOG_DTYPES.get(column, 'str')) for column in columns})
+    frame['timestamp'] = pd.Series(dtype='datetime64[s]')
+    return frame
+
 
 class FileHandler:
-    def __init__(self):
-        self.data_dir = 'data'
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
         self.students_file = os.path.join(self.data_dir, 'students.json')
         self.books_file = os.path.join(self.data_dir, 'books.json')
         self.issued_books_file = os.path.join(self.data_dir, 'issued_books.json')
         self.logs_file = os.path.join(self.data_dir, 'logs.csv')
         self.requests_file = os.path.join(self.data_dir, 'requests.json')
         self.admin_file = os.path.join(self.data_dir, 'admin.json')
+        self.metrics_file = os.path.join(self.data_dir, 'metrics.prom')
+        self.locks = CollectionLocks(self.data_dir)
+        self.archive = ArchiveStore(self.data_dir)
+        self.events = EventFeed(self.data_dir)
         
         # Ensure data integrity on initialization
         self.ensure_data_integrity()
     
+    @locked(exclusive=['books.json'])
     def ensure_data_integrity(self):
         """Ensure all data files have consistent structure"""
         if os.path.exists(self.books_file):
@@ -51,25 +99,26 @@ class FileHandler:
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
         
-        # Initialize students.json
-        if not os.path.exists(self.students_file):
-            self._create_file_with_data(self.students_file, self._get_mock_students())
-        
-        # Initialize books.json
-        if not os.path.exists(self.books_file):
-            self._create_file_with_data(self.books_file, self._get_mock_books())
-        
-        # Initialize issued_books.json
-        if not os.path.exists(self.issued_books_file):
-            self._create_file_with_data(self.issued_books_file, [])
-        
-        # Initialize requests.json
-        if not os.path.exists(self.requests_file):
-            self._create_file_with_data(self.requests_file, [])
-        
-        # Initialize logs.csv
-        if not os.path.exists(self.logs_file):
-            self._create_logs_file()
+        with self.locks.exclusive('students.json', 'books.json', 'issued_books.json', 'requests.json', 'logs.csv'):
+            # Initialize students.json
+            if not os.path.exists(self.students_file):
+                self._create_file_with_data(self.students_file, self._get_mock_students())
+            
+            # Initialize books.json
+            if not os.path.exists(self.books_file):
+                self._create_file_with_data(self.books_file, self._get_mock_books())
+            
+            # Initialize issued_books.json
+            if not os.path.exists(self.issued_books_file):
+                self._create_file_with_data(self.issued_books_file, [])
+            
+            # Initialize requests.json
+            if not os.path.exists(self.requests_file):
+                self._create_file_with_data(self.requests_file, [])
+            
+            # Initialize logs.csv
+            if not os.path.exists(self.logs_file):
+                self._create_logs_file()
         
         # Ensure data integrity after initialization
         self.ensure_data_integrity()
@@ -77,8 +126,7 @@ class FileHandler:
     def _create_file_with_data(self, file_path, data):
         """Create a JSON file with the given data"""
         try:
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=4)
+            atomic_write_text(file_path, json.dumps(data, indent=4))
         except Exception as e:
             print(f"Error creating {file_path}: {str(e)}")
     
@@ -258,94 +306,709 @@ class FileHandler:
             if not os.path.exists(file_path):
                 return []
             
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            with self.locks.shared(file_name):
+                with open(file_path, 'r') as f:
+                    content = f.read()
+            
+            if METRICS.enabled:
+                METRICS.add_bytes_read(file_name, len(content))
+            
+            return json.loads(content)
         except Exception as e:
             print(f"Error reading {file_name}: {str(e)}")
             return []
     
+    def _read_shared(self, file_name):
+        """A collection for read-only use; may be shared with a cache, so don't modify it"""
+        return self.read_json_file(file_name)
+    
+    def read_records(self, file_name):
+        """A collection as compact records (services.records), for readers that keep it.
+        
+        Records are shared with caches and must not be modified; writers
+        use the dicts from read_json_file.
+        """
+        data = self.read_json_file(file_name)
+        return load_records(file_name, data) if file_name in RECORD_TYPES else data
+    
     def write_json_file(self, file_name, data):
         """Write data to a JSON file"""
         try:
             file_path = os.path.join(self.data_dir, file_name)
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=4)
+            content = json.dumps(data, indent=4)
+            with self.locks.exclusive(file_name):
+                atomic_write_text(file_path, content)
+            
+            if METRICS.enabled:
+                METRICS.add_bytes_written(file_name, len(content))
             return True
         except Exception as e:
             print(f"Error writing to {file_name}: {str(e)}")
             return False
     
+    def _next_id(self, file_name, records, prefix):
+        """Next sequential id, past both the hot records and anything archived"""
+        highest = max((record_seq(record['id']) for record in records), default=0)
+        return f"{prefix}-{max(highest, self.archive.high_water(file_name)) + 1}"
+    
+    @property
+    def timestamp_format(self):
+        """How new timestamps are stored: "string" or "epoch" (see services.timestamps)"""
+        return read_timestamp_format(self.data_dir)
+    
+    def _stamp(self, moment=None):
+        """A timestamp for a stored record, in the configured format"""
+        return stamp(moment or datetime.now(), self.timestamp_format)
+    
+    @locked(exclusive=['books.json', 'students.json', 'issued_books.json', 'requests.json', 'archive',
+                       'fines_ledger.json'])
+    def migrate_timestamps(self, timestamp_format):
+        """Convert every stored timestamp to timestamp_format and store new ones that way.
+        
+        Covers the archive too. Re-running is harmless; returns {file name: values converted}.
+        """
+        try:
+            converted = {}
+            for file_name, fields in TIMESTAMP_FIELDS.items():
+                records = self.read_json_file(file_name)
+                converted[file_name] = convert_records(records, fields, timestamp_format)
+                if converted[file_name] and not self.write_json_file(file_name, records):
+                    raise IOError(f"Could not write {file_name}")
+                
+                for partition in self.archive.partitions(file_name):
+                    records = [dict(as_dict(record)) for record in self.archive.read_partition(file_name, partition)]
+                    count = convert_records(records, fields, timestamp_format)
+                    if count:
+                        self.archive.write_partition(file_name, partition, records)
+                        converted[f"archive/{file_name}"] = converted.get(f"archive/{file_name}", 0) + count
+            
+            # The ledger keeps its timestamps on the entries and the last run
+            ledger = self.read_json_file('fines_ledger.json')
+            if ledger:
+                converted['fines_ledger.json'] = (convert_records(ledger.get('entries', []), ('created_at',), timestamp_format)
+                                                  + convert_records([ledger], ('computed_at',), timestamp_format))
+                if converted['fines_ledger.json'] and not self.write_json_file('fines_ledger.json', ledger):
+                    raise IOError("Could not write fines_ledger.json")
+            
+            # Readers accept both forms, so a migration stopped half way leaves the data readable
+            write_timestamp_format(self.data_dir, timestamp_format)
+            return converted
+        except Exception as e:
+            print(f"Error migrating timestamps: {str(e)}")
+            return {}
+    
+    @locked(exclusive=['issued_books.json', 'requests.json', 'archive', 'circulation.json', 'fines_ledger.json'],
+            shared=['books.json', 'fine_policy.json'])
+    def archive_history(self, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """Move returned issues and resolved requests older than max_age_days into the archive.
+        
+        Daily rollups and fines are brought up to date first so nothing
+        derived from the moved records is lost. Returns {file_name: records archived}.
+        """
+        try:
+            self.get_circulation_rollups()
+            self.recompute_fines()
+            
+            cutoff = archive_cutoff(max_age_days)
+            moved = {}
+            
+            for file_name in ('issued_books.json', 'requests.json'):
+                keep, archived = split_archivable(file_name, self.read_json_file(file_name), cutoff)
+                # Archive first: if the hot rewrite fails the records are in both places, never neither
+                self.archive.append(file_name, archived)
+                if archived:
+                    self.write_json_file(file_name, keep)
+                moved[file_name] = len(archived)
+            
+            if any(moved.values()):
+                self.events.append('history_archived', {"max_age_days": max_age_days, "moved": moved})
+            return moved
+        except Exception as e:
+            print(f"Error archiving history: {str(e)}")
+            return {}
+    
+    def read_history(self, file_name, since=None, student_id=None):
+        """Hot records plus archived ones, e.g. for history views.
+        
+        since limits the archive to partitions from that month on. Archive
+        files are replaced atomically, so no lock is needed. Records may be
+        shared with a cache and must not be modified.
+        """
+        records = self.read_archive(file_name, since) + self._read_shared(file_name)
+        if student_id is not None:
+            records = [record for record in records if record.get('student_id') == student_id]
+        return records
+    
+    def read_archive(self, file_name, since=None):
+        """Archived records only (empty for collections that are never archived); shared, don't modify"""
+        if file_name not in ('issued_books.json', 'requests.json'):
+            return []
+        return self.archive.read(file_name, since)
+    
+    def get_archive_manifest(self):
+        """Per-collection archive summary: high-water id, partitions and record counts"""
+        return self.archive.manifest()
+    
+    def events_since(self, seq=0, limit=None, types=None):
+        """Change events after seq, oldest first (see services.events)"""
+        return self.events.events_since(seq, limit, types)
+    
+    def last_event_seq(self):
+        """Sequence number of the newest change event (0 before any change)"""
+        return self.events.last_seq()
+    
+    def _emit_promoted(self, promoted):
+        """hold_promoted events for requests that just had a copy reserved"""
+        self.events.append_many(self._promoted_events(promoted))
+    
+    @staticmethod
+    def _promoted_events(promoted):
+        return [('hold_promoted', {
+            "request_id": request['id'],
+            "student_id": request['student_id'],
+            "book_id": request['book_id'],
+            "copy_id": request['reserved_copy_id'],
+            "hold_expires_at": to_display(request['hold_expires_at'])
+        }) for request in promoted]
+    
+    def _audit_scope(self, incremental, checkpoint):
+        """None for a full audit, else the records touched since the checkpoint"""
+        if not incremental or 'seq' not in checkpoint:
+            return None
+        return scope_from_events(self.events_since(checkpoint['seq']))
+    
+    def _save_audit(self, mode, seq, findings, repaired=0):
+        result = {
+            "mode": mode,
+            "seq": seq,
+            "audited_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "findings": findings,
+            "repaired": repaired
+        }
+        self.write_json_file('audit.json', result)
+        return result
+    
+    @locked(exclusive=['audit.json'],
+            shared=['books.json', 'students.json', 'issued_books.json', 'requests.json', 'copies.json'])
+    def audit_data(self, incremental=False):
+        """Check cross-collection invariants (see services.audit).
+        
+        Incremental audits re-check only records changed since the last
+        audit. Returns {mode, seq, audited_at, findings, repaired}.
+        """
+        try:
+            checkpoint = self.read_json_file('audit.json') or {}
+            seq = self.last_event_seq()
+            scope = self._audit_scope(incremental, checkpoint)
+            
+            findings = run_checks(AuditSnapshot(self.read_json_file), scope)
+            if scope is not None:
+                findings = merge_findings(checkpoint.get('findings', []), findings, scope)
+            
+            return self._save_audit("incremental" if scope is not None else "full", seq, findings)
+        except Exception as e:
+            print(f"Error auditing data: {str(e)}")
+            return {"mode": "failed", "seq": 0, "findings": [], "repaired": 0}
+    
+    @locked(exclusive=['audit.json', 'books.json', 'copies.json', 'issued_books.json', 'requests.json'],
+            shared=['students.json'])
+    def repair_data(self, incremental=False):
+        """Audit and apply every available repair, then re-audit what was checked.
+        
+        Findings without a repair (e.g. issues of unknown students) are
+        left for an admin to resolve.
+        """
+        try:
+            checkpoint = self.read_json_file('audit.json') or {}
+            scope = self._audit_scope(incremental, checkpoint)
+            snapshot = AuditSnapshot(self.read_json_file)
+            findings = run_checks(snapshot, scope)
+            
+            repaired, changed = apply_repairs(snapshot, findings)
+            
+            # Copies freed by a recount (or left free) go to waiting holds first
+            promoted = []
+            holds = HoldQueues(snapshot.requests, self.timestamp_format)
+            for book_id in {finding['repair']['book_id'] for finding in repaired if 'book_id' in finding['repair']}:
+                book = snapshot.books_by_id[book_id]
+                copies = self._title_copies(snapshot.inventory, book)
+                promoted.extend(allocate_to_holds(holds, copies))
+                sync_book_counts(book, copies)
+                changed.update(('books.json', 'copies.json'))
+            if promoted:
+                changed.add('requests.json')
+            
+            collections = {
+                'books.json': snapshot.books,
+                'issued_books.json': snapshot.issues,
+                'requests.json': snapshot.requests,
+            }
+            for file_name in sorted(changed):
+                if file_name == 'copies.json':
+                    self._write_inventory(snapshot.inventory)
+                else:
+                    self.write_json_file(file_name, collections[file_name])
+            
+            if repaired:
+                self.events.append('data_repaired', {"repairs": [finding['repair'] for finding in repaired]})
+                self._emit_promoted(promoted)
+            
+            remaining = run_checks(AuditSnapshot(self.read_json_file), scope)
+            if scope is not None:
+                remaining = merge_findings(checkpoint.get('findings', []), remaining, scope)
+            return self._save_audit("incremental" if scope is not None else "full", self.last_event_seq(), remaining,
+                                    len(repaired))
+        except Exception as e:
+            print(f"Error repairing data: {str(e)}")
+            return {"mode": "failed", "seq": 0, "findings": [], "repaired": 0}
+    
+    def _read_inventory(self):
+        """Load the per-copy inventory (copies.json)"""
+        return CopyInventory(self.read_json_file('copies.json') or {})
+    
+    def _write_inventory(self, inventory):
+        return self.write_json_file('copies.json', inventory.to_dict())
+    
+    def _title_copies(self, inventory, book):
+        """Copies of a book, creating copy records from its counters the first time"""
+        title = inventory.title(book['id'])
+        if title is None:
+            total = int(book.get('total_copies', 1))
+            available = int(book.get('available_copies', total if book.get('available', True) else 0))
+            title = inventory.create_title(book['id'], total, available)
+        return title
+    
+    def get_book_copies(self, book_id):
+        """Copy records of a book with their shelf status"""
+        books = self.read_json_file('books.json')
+        book = next((b for b in books if b['id'] == book_id), None)
+        if not book:
+            return []
+        return self._title_copies(self._read_inventory(), book).copy_rows()
+    
+    @locked(exclusive=['books.json', 'copies.json', 'requests.json'])
+    def update_copy(self, book_id, copy_id, condition=None, location=None):
+        """Update the condition or location of one physical copy"""
+        try:
+            books = self.read_json_file('books.json')
+            inventory = self._read_inventory()
+            
+            book = next((b for b in books if b['id'] == book_id), None)
+            if not book:
+                return False, "Book not found"
+            
+            title = self._title_copies(inventory, book)
+            if condition == WITHDRAWN and title.is_out(copy_id):
+                return False, "Copy is on loan or reserved; withdraw it once it is back on the shelf"
+            if not title.update_copy(copy_id, condition, location):
+                return False, "Copy not found"
+            
+            # A reinstated copy may be owed to the hold queue
+            requests = self.read_json_file('requests.json')
+            promoted = allocate_to_holds(HoldQueues(requests, self.timestamp_format), title)
+            sync_book_counts(book, title)
+            
+            if (self.write_json_file('books.json', books) and
+                self._write_inventory(inventory) and
+                (not promoted or self.write_json_file('requests.json', requests))):
+                self.events.append('copy_updated', {
+                    "book_id": book_id, "copy_id": copy_id, "condition": condition, "location": location
+                })
+                self._emit_promoted(promoted)
+                return True, "Copy updated successfully"
+            else:
+                return False, "Error writing to files"
+        except Exception as e:
+            return False, f"Error updating copy: {str(e)}"
+    
+    @locked(exclusive=['recommendations.json'], shared=['issued_books.json'])
+    def refresh_recommendations(self, rebuild=False):
+        """Fold new issues into the co-borrow recommendation table.
+        
+        New issues are read from the change feed after the table's
+        event_seq, so a refresh costs the delta, not the history. The
+        table is built from the whole history the first time (or with
+        rebuild=True). Issuing books doesn't refresh the table: it runs on
+        a timer via refresh_recommendations_if_due, from the admin
+        Maintenance tab or from python -m services.recommendations.
+        Returns the number of issues processed.
+        """
+        try:
+            file_path = os.path.join(self.data_dir, 'recommendations.json')
+            # Read before the issues, so an issue added meanwhile is picked up next time
+            event_seq = self.events.last_seq()
+            
+            if rebuild or not os.path.exists(file_path):
+                # Full builds include the archived history
+                history = self.read_history('issued_books.json')
+                recommender = CoBorrowRecommender()
+                recommender.rebuild(history)
+                processed = len(history)
+            else:
+                recommender = CoBorrowRecommender(self.read_json_file('recommendations.json'))
+                legacy = recommender.event_seq is None
+                if legacy:
+                    # Table written before it tracked the feed: saved below with its position
+                    new_issues = self.read_json_file('issued_books.json')
+                else:
+                    events = self.events_since(recommender.event_seq, types=['issue_created'])
+                    new_issues = [event['data'] for event in events]
+                    if events:
+                        event_seq = max(event_seq, events[-1]['seq'])
+                processed = recommender.update(new_issues)
+                if not processed and not legacy:
+                    return 0
+            
+            recommender.event_seq = event_seq
+            self.write_json_file('recommendations.json', recommender.to_dict())
+            return processed
+        except Exception as e:
+            print(f"Error refreshing recommendations: {str(e)}")
+            return 0
+    
+    def refresh_recommendations_if_due(self):
+        """Build the recommendation table if missing, else refresh it at most once per REFRESH_INTERVAL"""
+        file_path = os.path.join(self.data_dir, 'recommendations.json')
+        if os.path.exists(file_path) and not refresh_due(file_path):
+            return 0
+        return self.refresh_recommendations()
+    
+    def get_recommendations(self, book_id, limit=5):
+        """[book_id, score] pairs for books often borrowed with a book (none until the table is built)"""
+        file_path = os.path.join(self.data_dir, 'recommendations.json')
+        neighbors, hit = cached_neighbors(file_path, lambda: self.read_json_file('recommendations.json'))
+        if METRICS.enabled:
+            METRICS.record_cache('recommendations', hit)
+        return neighbors.get(book_id, [])[:limit]
+    
+    def get_catalog(self):
+        """books.json as a BookCatalog for vectorized filtering, rebuilt only when the file changes"""
+        catalog, hit = cached_catalog(self.books_file, lambda: self.read_json_file('books.json'))
+        if METRICS.enabled:
+            METRICS.record_cache('catalog', hit)
+        return catalog
+    
+    def search_books(self, prefix="", limit=10, available_only=False):
+        """Up to limit books whose title or id starts with prefix, for the book pickers"""
+        catalog = self.get_catalog()
+        return catalog.records(catalog.search(prefix, limit, available_only))
+    
+    def search_students(self, prefix="", limit=10, approved_only=False):
+        """Up to limit students whose name or id starts with prefix, for the student pickers"""
+        directory, hit = cached_directory(self.students_file, lambda: self.read_json_file('students.json'))
+        if METRICS.enabled:
+            METRICS.record_cache('students', hit)
+        return directory.search(prefix, limit, approved_only)
+    
+    @locked(exclusive=['circulation.json'], shared=['issued_books.json'])
+    def get_circulation_rollups(self):
+        """Per-day issue/return/late-return counts, aggregating only days not rolled up yet"""
+        try:
+            rollups = self.read_json_file('circulation.json') or {}
+            
+            if not rollups_current(rollups) and update_rollups(rollups, self.read_json_file('issued_books.json')):
+                self.write_json_file('circulation.json', rollups)
+            
+            return rollups
+        except Exception as e:
+            print(f"Error updating circulation rollups: {str(e)}")
+            return {}
+    
+    def get_fine_policy(self):
+        """Current fine policy as a dict (defaults until one is saved)"""
+        return FinePolicy.from_dict(self.read_json_file('fine_policy.json') or {}).to_dict()
+    
+    @locked(exclusive=['fine_policy.json'])
+    def update_fine_policy(self, policy):
+        """Save a fine policy dict (daily_rate, grace_days, max_fine, genre_overrides)"""
+        try:
+            policy = FinePolicy.from_dict(policy)
+            if policy.daily_rate < 0 or policy.grace_days < 0 or policy.max_fine < 0:
+                return False, "Fine policy values cannot be negative"
+            
+            if self.write_json_file('fine_policy.json', policy.to_dict()):
+                self.events.append('fine_policy_updated', policy.to_dict())
+                return True, "Fine policy updated successfully"
+            else:
+                return False, "Error writing to file"
+        except Exception as e:
+            return False, f"Error updating fine policy: {str(e)}"
+    
+    @locked(exclusive=['fines_ledger.json'], shared=['issued_books.json', 'books.json', 'fine_policy.json'])
+    def recompute_fines(self, now=None):
+        """Price every overdue issue and post changes to the fines ledger.
+        
+        Safe to run repeatedly (e.g. nightly); returns the number of ledger entries posted.
+        """
+        try:
+            ledger = FinesLedger(self.read_json_file('fines_ledger.json') or {}, self.timestamp_format)
+            policy = FinePolicy.from_dict(self.read_json_file('fine_policy.json') or {})
+            fines = compute_fines(
+                self.read_json_file('issued_books.json'),
+                self.read_json_file('books.json'),
+                policy, now, include_ids=list(ledger.assessed)
+            )
+            
+            posted = ledger.post_assessments(fines, now)
+            if self.write_json_file('fines_ledger.json', ledger.to_dict()) and posted:
+                self.events.append('fines_assessed', {"entries": posted, "computed_at": ledger.computed_at})
+            return posted
+        except Exception as e:
+            print(f"Error recomputing fines: {str(e)}")
+            return 0
+    
+    @locked(exclusive=['fines_ledger.json'])
+    def record_fine_payment(self, student_id, amount, entry_type="payment", note=""):
+        """Credit a student's fines balance with a payment or waiver"""
+        try:
+            if amount <= 0:
+                return False, "Amount must be positive"
+            
+            if entry_type not in ("payment", "waiver"):
+                return False, "Unknown entry type"
+            
+            ledger = FinesLedger(self.read_json_file('fines_ledger.json') or {}, self.timestamp_format)
+            balance = ledger.post_credit(student_id, amount, entry_type, note)
+            
+            if self.write_json_file('fines_ledger.json', ledger.to_dict()):
+                self.events.append('fine_payment_recorded', {
+                    "student_id": student_id, "type": entry_type, "amount": round(amount, 2), "balance": balance
+                })
+                return True, f"{entry_type.capitalize()} of {amount:.2f} recorded. New balance: {balance:.2f}"
+            else:
+                return False, "Error writing to file"
+        except Exception as e:
+            return False, f"Error recording {entry_type}: {str(e)}"
+    
+    def get_student_fines(self, student_id):
+        """A student's fines balance and ledger entries"""
+        ledger = FinesLedger(self.read_json_file('fines_ledger.json') or {})
+        return {
+            "balance": ledger.balances.get(student_id, 0.0),
+            "computed_at": ledger.computed_at,
+            "entries": ledger.student_entries(student_id)
+        }
+    
     def log_action(self, user_id, user_role, action, details):
         """Log an action to the logs.csv file"""
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open(self.logs_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([timestamp, user_id, user_role, action, details])
+            with self.locks.exclusive('logs.csv'):
+                with open(self.logs_file, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow([timestamp, user_id, user_role, action, details])
+            
+            if METRICS.enabled:
+                METRICS.add_bytes_written('logs.csv', len(timestamp) + len(str(user_id)) + len(str(user_role)) + len(str(action)) + len(str(details)) + 6)
             return True
         except Exception as e:
             print(f"Error logging action: {str(e)}")
             return False
     
-    def get_logs(self, limit=None):
-        """Get logs from the logs.csv file"""
+    def get_logs(self, limit=None, include_details=True):
+        """Get logs from the logs.csv file.
+        
+        user_id, user_role and action load as categoricals and timestamp as
+        datetime64, so filters compare integer codes; include_details=False
+        skips the free-text details column, which is most of the memory.
+        """
         try:
             if not os.path.exists(self.logs_file):
-                return pd.DataFrame(columns=['timestamp', 'user_id', 'user_role', 'action', 'details'])
+                return empty_logs_frame(include_details)
+            
+            if METRICS.enabled:
+                METRICS.add_bytes_read('logs.csv', os.path.getsize(self.logs_file))
             
-            logs_df = pd.read_csv(self.logs_file)
+            columns = LOG_COLUMNS if include_details else LOG_COLUMNS[:-1]
+            with self.locks.shared('logs.csv'):
+                logs_df = pd.read_csv(self.logs_file, usecols=columns, dtype=LOG_DTYPES, engine=CSV_ENGINE)
             
-            if limit and not logs_df.empty:
+            if logs_df.empty:
+                return empty_logs_frame(include_details)
+            
+            if not pd.api.types.is_datetime64_any_dtype(logs_df['timestamp']):
+                logs_df['timestamp'] = pd.to_datetime(logs_df['timestamp'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+            
+            logs_df = logs_df[columns]
+            if limit:
                 return logs_df.tail(limit)
             
             return logs_df
         except Exception as e:
             print(f"Error getting logs: {str(e)}")
-            return pd.DataFrame(columns=['timestamp', 'user_id', 'user_role', 'action', 'details'])
+            return empty_logs_frame(include_details)
+    
+    @staticmethod
+    def _next_book_seq(books):
+        """Number for the next BK- id, past every existing one"""
+        return max([len(books)] + [record_seq(book['id']) for book in books]) + 1
+    
+    def _new_book(self, book_id, title, author, genre, copies, isbn=None):
+        new_book = {
+            "id": book_id,
+            "title": title,
+            "author": author,
+            "genre": genre,
+            "available": True,
+            "total_copies": copies,
+            "available_copies": copies,
+            "added_at": self._stamp()
+        }
+        if isbn:
+            new_book["isbn"] = isbn
+        return new_book
     
-    def add_book(self, title, author, genre, copies=1):
-        """Add a new book to the books.json file with multiple copies"""
+    @staticmethod
+    def _check_isbn(isbn, catalog, added=None, book_id=None):
+        """(normalized ISBN or None, error message or None).
+        
+        Duplicates are looked up in the catalog's ISBN index and in added,
+        ISBN -> id of books being added in the same call.
+        """
+        if not isbn:
+            return None, None
+        normalized = normalize_isbn(isbn)
+        if not normalized:
+            return None, f"Invalid ISBN: {isbn}"
+        position = catalog.isbn_index.get(normalized)
+        holder = (added or {}).get(normalized) or (catalog.ids[position] if position is not None else None)
+        if holder is not None and holder != book_id:
+            return None, f"A book with ISBN {normalized} already exists ({holder})"
+        return normalized, None
+    
+    def find_book_by_isbn(self, isbn):
+        """The book with this ISBN (ISBN-10 or 13, hyphens allowed), or None"""
+        catalog = self.get_catalog()
+        position = catalog.find_isbn(isbn)
+        return None if position is None else catalog.books[position]
+    
+    @locked(exclusive=['books.json', 'copies.json'])
+    def add_book(self, title, author, genre, copies=1, isbn=None):
+        """Add a new book to the books.json file with multiple copies.
+        
+        isbn is optional; it is stored normalized to ISBN-13 and must not
+        belong to another book.
+        """
         try:
             books = self.read_json_file('books.json')
             
-            # Generate a new book ID
-            book_id = f"BK-{str(len(books) + 1).zfill(3)}"
-            
-            new_book = {
-                "id": book_id,
-                "title": title,
-                "author": author,
-                "genre": genre,
-                "available": True,
-                "total_copies": copies,
-                "available_copies": copies,
-                "added_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
+            isbn, error = self._check_isbn(isbn, self.get_catalog())
+            if error:
+                return False, error
             
+            # Generate a new book ID
+            book_id = f"BK-{str(self._next_book_seq(books)).zfill(3)}"
+            new_book = self._new_book(book_id, title, author, genre, copies, isbn)
             books.append(new_book)
             
-            if self.write_json_file('books.json', books):
+            # Track the physical copies of the new title
+            inventory = self._read_inventory()
+            inventory.create_title(book_id, copies)
+            
+            if self.write_json_file('books.json', books) and self._write_inventory(inventory):
+                self.events.append('book_added', new_book)
                 return True, book_id
             else:
                 return False, "Error writing to books file"
         except Exception as e:
             return False, f"Error adding book: {str(e)}"
     
-    def update_book(self, book_id, title, author, genre, total_copies, available_copies):
-        """Update a book in the books.json file"""
+    @locked(exclusive=['books.json', 'copies.json'])
+    def import_books(self, rows):
+        """Add many books in one write: rows are dicts with title, author, genre and optional copies and isbn.
+        
+        Rows missing a field, with an invalid ISBN, or whose ISBN is
+        already in the catalog (or earlier in rows) are skipped. Returns a
+        (title, success, book id or message) result per row.
+        """
         try:
             books = self.read_json_file('books.json')
+            inventory = self._read_inventory()
+            catalog = self.get_catalog()
+            added = {}
+            next_seq = self._next_book_seq(books)
+            results = []
+            new_books = []
+            
+            for row in rows:
+                title = str(row.get('title') or "").strip()
+                author = str(row.get('author') or "").strip()
+                genre = str(row.get('genre') or "").strip()
+                if not title or not author or not genre:
+                    results.append((title, False, "Title, author and genre are required"))
+                    continue
+                try:
+                    copies = int(row.get('copies') or 1)
+                except (TypeError, ValueError):
+                    results.append((title, False, f"Invalid number of copies: {row.get('copies')}"))
+                    continue
+                if copies < 1:
+                    results.append((title, False, "A book needs at least one copy"))
+                    continue
+                
+                isbn, error = self._check_isbn(row.get('isbn'), catalog, added)
+                if error:
+                    results.append((title, False, error))
+                    continue
+                
+                book_id = f"BK-{str(next_seq + len(new_books)).zfill(3)}"
+                new_book = self._new_book(book_id, title, author, genre, copies, isbn)
+                new_books.append(new_book)
+                inventory.create_title(book_id, copies)
+                if isbn:
+                    added[isbn] = book_id
+                results.append((title, True, book_id))
+            
+            if not new_books:
+                return results
+            
+            if self.write_json_file('books.json', books + new_books) and self._write_inventory(inventory):
+                self.events.append_many([('book_added', book) for book in new_books])
+                return results
+            return [(title, False, "Error writing to books file") for title, _, _ in results]
+        except Exception as e:
+            return [(str(row.get('title') or ""), False, f"Error importing book: {str(e)}") for row in rows]
+    
+    @locked(exclusive=['books.json', 'copies.json', 'requests.json'])
+    def update_book(self, book_id, title, author, genre, total_copies, available_copies=None, isbn=None):
+        """Update a book in the books.json file.
+        
+        Copy counts are derived from the copy records: changing total_copies
+        adds copies or withdraws copies that are on the shelf, and
+        available_copies is kept only for backwards compatibility. New
+        copies go to the title's hold queue first. isbn=None leaves the
+        ISBN as it is; "" removes it.
+        """
+        try:
+            books = self.read_json_file('books.json')
+            inventory = self._read_inventory()
+            requests = self.read_json_file('requests.json')
+            
+            if isbn:
+                isbn, error = self._check_isbn(isbn, self.get_catalog(), book_id=book_id)
+                if error:
+                    return False, error
             
             for book in books:
                 if book['id'] == book_id:
+                    if isbn:
+                        book['isbn'] = isbn
+                    elif isbn == "":
+                        book.pop('isbn', None)
                     book['title'] = title
                     book['author'] = author
                     book['genre'] = genre
-                    book['total_copies'] = total_copies
-                    book['available_copies'] = available_copies
-                    book['available'] = available_copies > 0
                     
-                    if self.write_json_file('books.json', books):
+                    copies = self._title_copies(inventory, book)
+                    copies.resize(total_copies)
+                    promoted = allocate_to_holds(HoldQueues(requests, self.timestamp_format), copies)
+                    sync_book_counts(book, copies)
+                    
+                    if (self.write_json_file('books.json', books) and
+                        self._write_inventory(inventory) and
+                        (not promoted or self.write_json_file('requests.json', requests))):
+                        self.events.append('book_updated', book)
+                        self._emit_promoted(promoted)
                         return True, "Book updated successfully"
                     else:
                         return False, "Error writing to books file"
@@ -354,6 +1017,7 @@ class FileHandler:
         except Exception as e:
             return False, f"Error updating book: {str(e)}"
     
+    @locked(exclusive=['books.json', 'copies.json'], shared=['issued_books.json'])
     def delete_book(self, book_id):
         """Delete a book from the books.json file"""
         try:
@@ -371,15 +1035,25 @@ class FileHandler:
             if len(updated_books) == len(books):
                 return False, "Book not found"
             
-            if self.write_json_file('books.json', updated_books):
+            inventory = self._read_inventory()
+            inventory.remove_title(book_id)
+            
+            if self.write_json_file('books.json', updated_books) and self._write_inventory(inventory):
+                self.events.append('book_deleted', {"book_id": book_id})
                 return True, "Book deleted successfully"
             else:
                 return False, "Error writing to books file"
         except Exception as e:
             return False, f"Error deleting book: {str(e)}"
     
-    def request_book_issue(self, student_id, book_id):
-        """Student requests to borrow a book"""
+    @locked(exclusive=['requests.json'], shared=['books.json', 'students.json', 'issued_books.json'])
+    def request_book_issue(self, student_id, book_id, idempotency_key=None):
+        """Student requests to borrow a book.
+        
+        Resubmitting (the same idempotency_key, or another request for a
+        title the student already has an open request for) returns the
+        existing request instead of creating a duplicate.
+        """
         try:
             books = self.read_json_file('books.json')
             students = self.read_json_file('students.json')
@@ -400,9 +1074,6 @@ class FileHandler:
             if not book_found:
                 return False, "Book not found"
             
-            if not book_available:
-                return False, "No copies of this book are available"
-            
             # Check if student exists and is approved
             student_found = False
             student_approved = False
@@ -423,6 +1094,15 @@ class FileHandler:
             if not student_approved:
                 return False, "Your account is not approved yet"
             
+            # A repeated submission gets the request it already created
+            pending = PendingIndex(requests)
+            existing = (pending.find_submission(idempotency_key, student_id, "issue", book_id=book_id)
+                        or pending.find(student_id, book_id, "issue"))
+            if existing:
+                if existing['status'] == ON_HOLD:
+                    return True, f"You are already in the hold queue for '{book_title}' ({existing['id']})."
+                return True, f"Your request to borrow '{book_title}' was already submitted ({existing['id']})."
+            
             # Check if flagged student already has a book
             if student_flagged:
                 issued_books = self.read_json_file('issued_books.json')
@@ -436,30 +1116,123 @@ class FileHandler:
             
             # Create a book issue request
             new_request = {
-                "id": f"REQ-{len(requests) + 1}",
+                "id": self._next_id('requests.json', requests, "REQ"),
                 "type": "issue",
                 "student_id": student_id,
                 "book_id": book_id,
-                "requested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "requested_at": self._stamp(),
                 "status": "pending"
             }
+            if idempotency_key and not pending.key_in_use(idempotency_key):
+                new_request["idempotency_key"] = idempotency_key
             
-            requests.append(new_request)
+            if book_available:
+                requests.append(new_request)
+                message = f"Request to borrow '{book_title}' submitted successfully. Waiting for admin approval."
+            else:
+                # No free copies: join the title's hold queue instead of failing
+                holds = HoldQueues(requests, self.timestamp_format)
+                position = holds.place(new_request)
+                message = f"No copies of '{book_title}' are available. You are #{position} in the hold queue."
             
             # Save changes
             if self.write_json_file('requests.json', requests):
-                return True, f"Request to borrow '{book_title}' submitted successfully. Waiting for admin approval."
+                self.events.append('request_created' if book_available else 'hold_placed', new_request)
+                return True, message
             else:
                 return False, "Error writing to files"
         except Exception as e:
             return False, f"Error requesting book: {str(e)}"
     
-    def request_book_return(self, student_id, issue_id):
-        """Student requests to return a book"""
+    def _release_reservation(self, book_id, copy_id):
+        """Pass a copy reserved for a hold that can't be issued to the next hold, or the shelf"""
+        requests = self.read_json_file('requests.json')
+        books = self.read_json_file('books.json')
+        inventory = self._read_inventory()
+        
+        book = next((b for b in books if b['id'] == book_id), None)
+        if not book:
+            return
+        
+        copies = self._title_copies(inventory, book)
+        copies.release(copy_id)
+        promoted = allocate_to_holds(HoldQueues(requests, self.timestamp_format), copies)
+        if promoted and self.write_json_file('requests.json', requests):
+            self._emit_promoted(promoted)
+        sync_book_counts(book, copies)
+        self.write_json_file('books.json', books)
+        self._write_inventory(inventory)
+    
+    def expire_holds(self):
+        """Expire uncollected hold reservations and pass their copies on.
+        
+        Due reservations are looked for under a shared lock first, so when
+        none are due (the usual case) no exclusive lock is taken and
+        nothing is written. Runs before approvals, from the admin Pending
+        Requests tab and from python -m services.holds. Returns the number
+        of reservations that expired.
+        """
+        if not self._holds_due():
+            return 0
+        return self._expire_holds()
+    
+    @locked(shared=['requests.json'])
+    def _holds_due(self):
+        return overdue_holds(self.read_json_file('requests.json')) > 0
+    
+    @locked(exclusive=['requests.json', 'books.json', 'copies.json'])
+    def _expire_holds(self):
+        try:
+            requests = self.read_json_file('requests.json')
+            holds = HoldQueues(requests, self.timestamp_format)
+            expired = holds.pop_expired()
+            
+            if not expired:
+                return 0
+            
+            books = self.read_json_file('books.json')
+            inventory = self._read_inventory()
+            books_by_id = {book['id']: book for book in books}
+            promoted = []
+            
+            for request in expired:
+                book = books_by_id.get(request['book_id'])
+                if not book:
+                    continue
+                copies = self._title_copies(inventory, book)
+                copies.release(request.get('reserved_copy_id'))
+                promoted.extend(allocate_to_holds(holds, copies))
+                sync_book_counts(book, copies)
+            
+            self.write_json_file('requests.json', requests)
+            self.write_json_file('books.json', books)
+            self._write_inventory(inventory)
+            
+            for request in expired:
+                self.events.append('hold_expired', {
+                    "request_id": request['id'],
+                    "student_id": request['student_id'],
+                    "book_id": request['book_id'],
+                    "copy_id": request.get('reserved_copy_id')
+                })
+            self._emit_promoted(promoted)
+            return len(expired)
+        except Exception as e:
+            print(f"Error expiring holds: {str(e)}")
+            return 0
+    
+    @locked(exclusive=['issued_books.json', 'requests.json'])
+    def request_book_return(self, student_id, issue_id, idempotency_key=None):
+        """Student requests to return a book; resubmitting returns the existing request"""
         try:
             issued_books = self.read_json_file('issued_books.json')
             requests = self.read_json_file('requests.json')
             
+            pending = PendingIndex(requests)
+            existing = pending.find_submission(idempotency_key, student_id, "return", issue_id=issue_id)
+            if existing:
+                return True, f"Return request already submitted ({existing['id']})"
+            
             # Find the issue record
             issue_found = False
             book_id = ""
@@ -473,6 +1246,9 @@ class FileHandler:
                         return False, "Book already returned"
                     
                     if issue.get('return_requested', False):
+                        existing = pending.find(student_id, book_id, "return")
+                        if existing and existing.get('issue_id') == issue_id:
+                            return True, f"Return request already submitted ({existing['id']})"
                         return False, "Return already requested"
                     
                     # Mark as return requested
@@ -484,28 +1260,34 @@ class FileHandler:
             
             # Create a return request
             new_request = {
-                "id": f"REQ-{len(requests) + 1}",
+                "id": self._next_id('requests.json', requests, "REQ"),
                 "type": "return",
                 "student_id": student_id,
                 "book_id": book_id,
                 "issue_id": issue_id,
-                "requested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "requested_at": self._stamp(),
                 "status": "pending"
             }
+            if idempotency_key and not pending.key_in_use(idempotency_key):
+                new_request["idempotency_key"] = idempotency_key
             
             requests.append(new_request)
             
             # Save changes
             if self.write_json_file('issued_books.json', issued_books) and self.write_json_file('requests.json', requests):
+                self.events.append('return_requested', new_request)
                 return True, "Return request submitted successfully"
             else:
                 return False, "Error writing to files"
         except Exception as e:
             return False, f"Error requesting return: {str(e)}"
     
+    @locked(exclusive=['requests.json', 'books.json', 'students.json', 'issued_books.json', 'copies.json'])
     def approve_book_request(self, request_id):
         """Admin approves a book issue request"""
         try:
+            # A reservation past its pickup deadline goes to the next hold, not to this student
+            self.expire_holds()
             requests = self.read_json_file('requests.json')
             
             # Find the request
@@ -514,6 +1296,7 @@ class FileHandler:
             student_id = ""
             book_id = ""
             issue_id = ""
+            reserved_copy_id = None
             
             for request in requests:
                 if request['id'] == request_id:
@@ -522,25 +1305,33 @@ class FileHandler:
                     student_id = request['student_id']
                     book_id = request['book_id']
                     issue_id = request.get('issue_id', "")
+                    reserved_copy_id = request.get('reserved_copy_id')
                     
+                    if request['status'] == EXPIRED:
+                        return False, "The hold reservation expired and the copy was passed on"
                     if request['status'] != "pending":
                         return False, "Request is not pending"
                     
                     # Mark as approved
                     request['status'] = "approved"
-                    request['approved_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    request['approved_at'] = self._stamp()
                     break
             
             if not request_found:
                 return False, "Request not found"
             
             # Save request changes first to avoid data inconsistency
-            self.write_json_file('requests.json', requests)
+            if self.write_json_file('requests.json', requests):
+                self.events.append('request_approved', {
+                    "request_id": request_id, "type": request_type, "student_id": student_id, "book_id": book_id
+                })
             
             # Process based on request type
             if request_type == "issue":
                 # Issue the book
-                success, message = self.issue_book_after_approval(student_id, book_id)
+                success, message = self.issue_book_after_approval(student_id, book_id, reserved_copy_id=reserved_copy_id)
+                if not success and reserved_copy_id:
+                    self._release_reservation(book_id, reserved_copy_id)
             elif request_type == "return":
                 # Return the book
                 success, message = self.return_book_after_approval(issue_id)
@@ -553,30 +1344,33 @@ class FileHandler:
             print(f"Detailed error in approve_book_request: {error_details}")
             return False, f"Error approving request: {str(e)}"
     
-    def issue_book_after_approval(self, student_id, book_id, days=7):
-        """Issue a book after admin approval"""
+    @locked(exclusive=['books.json', 'issued_books.json', 'copies.json'], shared=['students.json'])
+    def issue_book_after_approval(self, student_id, book_id, days=7, reserved_copy_id=None):
+        """Issue a book after admin approval.
+        
+        reserved_copy_id is the copy already set aside for a hold, if any.
+        """
         try:
             books = self.read_json_file('books.json')
             students = self.read_json_file('students.json')
             issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
             
-            # Check if book exists and has available copies
+            # Check if book exists and take a free copy off the shelf
             book_found = False
             book_available = False
             book_title = ""
+            copy_id = None
             
             for book in books:
                 if book['id'] == book_id:
                     book_found = True
-                    # Ensure available_copies exists
-                    if 'available_copies' not in book:
-                        book['available_copies'] = 1 if book.get('available', True) else 0
+                    copies = self._title_copies(inventory, book)
+                    copy_id = reserved_copy_id or copies.allocate()
                     
-                    if book['available_copies'] > 0:
+                    if copy_id:
                         book_available = True
-                        book['available_copies'] -= 1
-                        if book['available_copies'] == 0:
-                            book['available'] = False
+                        sync_book_counts(book, copies)
                     book_title = book['title']
                     break
             
@@ -604,11 +1398,12 @@ class FileHandler:
             due_date = issue_date + timedelta(days=days)
             
             new_issue = {
-                "id": f"ISS-{len(issued_books) + 1}",
+                "id": self._next_id('issued_books.json', issued_books, "ISS"),
                 "student_id": student_id,
                 "book_id": book_id,
-                "issue_date": issue_date.strftime("%Y-%m-%d %H:%M:%S"),
-                "due_date": due_date.strftime("%Y-%m-%d %H:%M:%S"),
+                "copy_id": copy_id,
+                "issue_date": self._stamp(issue_date),
+                "due_date": self._stamp(due_date),
                 "returned": False,
                 "return_date": None
             }
@@ -616,7 +1411,10 @@ class FileHandler:
             issued_books.append(new_issue)
             
             # Save changes
-            if self.write_json_file('issued_books.json', issued_books) and self.write_json_file('books.json', books):
+            if (self.write_json_file('issued_books.json', issued_books) and
+                self.write_json_file('books.json', books) and
+                self._write_inventory(inventory)):
+                self.events.append('issue_created', new_issue)
                 return True, f"Book '{book_title}' issued to {student_name} successfully"
             else:
                 return False, "Error writing to files"
@@ -625,17 +1423,23 @@ class FileHandler:
             print(f"Detailed error in issue_book_after_approval: {error_details}")
             return False, f"Error issuing book: {str(e)}"
     
+    @locked(exclusive=['books.json', 'students.json', 'issued_books.json', 'copies.json', 'requests.json'])
     def return_book_after_approval(self, issue_id):
         """Return a book after admin approval"""
         try:
             books = self.read_json_file('books.json')
             students = self.read_json_file('students.json')
             issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
+            requests = self.read_json_file('requests.json')
+            holds = HoldQueues(requests, self.timestamp_format)
+            promoted = []
             
             # Find the issue record
             issue_found = False
             book_id = ""
             student_id = ""
+            copy_id = None
             due_date = None
             
             for issue in issued_books:
@@ -643,25 +1447,16 @@ class FileHandler:
                     issue_found = True
                     book_id = issue['book_id']
                     student_id = issue['student_id']
+                    copy_id = issue.get('copy_id')
                     
-                    # Handle missing due_date
-                    if 'due_date' in issue:
-                        due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                    else:
-                        # If due_date is missing, set it to issue_date + 7 days
-                        if 'issue_date' in issue:
-                            issue_date = datetime.strptime(issue['issue_date'], "%Y-%m-%d %H:%M:%S")
-                            due_date = issue_date + timedelta(days=7)
-                        else:
-                            # If both are missing, use current date (no late penalty)
-                            due_date = datetime.now()
+                    due_date = self._loan_due_date(issue)
                     
                     if issue.get('returned', False):
                         return False, "Book already returned"
                     
                     # Mark as returned
                     issue['returned'] = True
-                    issue['return_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    issue['return_date'] = return_date = self._stamp()
                     issue['return_requested'] = False
                     break
             
@@ -674,40 +1469,17 @@ class FileHandler:
                 if book['id'] == book_id:
                     book_found = True
                     
-                    # Ensure total_copies exists
-                    if 'total_copies' not in book:
-                        book['total_copies'] = 1
-                    
-                    # Ensure available_copies exists and is an integer
-                    if 'available_copies' not in book:
-                        book['available_copies'] = 0
-                    
-                    # Convert to integer if it's a string
-                    try:
-                        available_copies = int(book['available_copies'])
-                    except (ValueError, TypeError):
-                        available_copies = 0
-                    
-                    # Increment available copies
-                    book['available_copies'] = available_copies + 1
-                    
-                    # Set available flag
-                    book['available'] = True
+                    # Put the copy back on the shelf, or reserve it for the
+                    # next student in the hold queue, and derive the counters
+                    copies = self._title_copies(inventory, book)
+                    copies.release(copy_id)
+                    promoted = allocate_to_holds(holds, copies)
+                    sync_book_counts(book, copies)
                     break
             
             # If book not found, create a placeholder
             if not book_found:
-                print(f"Book {book_id} not found in database, creating placeholder")
-                books.append({
-                    "id": book_id,
-                    "title": f"Book {book_id}",
-                    "author": "Unknown",
-                    "genre": "Unknown",
-                    "available": True,
-                    "total_copies": 1,
-                    "available_copies": 1,
-                    "added_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                })
+                books.append(self._placeholder_book(book_id, inventory))
             
             # Check if return is late and flag student if needed
             current_date = datetime.now()
@@ -724,7 +1496,17 @@ class FileHandler:
             # Save changes
             if (self.write_json_file('issued_books.json', issued_books) and 
                 self.write_json_file('books.json', books) and 
-                self.write_json_file('students.json', students)):
+                self.write_json_file('students.json', students) and
+                self._write_inventory(inventory) and
+                (not promoted or self.write_json_file('requests.json', requests))):
+                
+                self.events.append('issue_returned', {
+                    "issue_id": issue_id, "student_id": student_id, "book_id": book_id,
+                    "copy_id": copy_id, "return_date": to_display(return_date), "late": is_late
+                })
+                if is_late:
+                    self.events.append('student_flagged', {"student_id": student_id, "reason": "late_return"})
+                self._emit_promoted(promoted)
                 
                 message = "Book returned successfully"
                 if is_late:
@@ -738,26 +1520,26 @@ class FileHandler:
             print(f"Detailed error in return_book_after_approval: {error_details}")
             return False, f"Error returning book: {str(e)}"
     
+    @locked(exclusive=['books.json', 'issued_books.json', 'copies.json'], shared=['students.json'])
     def issue_book(self, student_id, book_id, days=7):
         """Direct issue book function (for admin use only)"""
         try:
             books = self.read_json_file('books.json')
             students = self.read_json_file('students.json')
             issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
             
-            # Check if book exists and has available copies
+            # Check if book exists and has a copy on the shelf
             book_found = False
             book_available = False
             book_title = ""
+            copies = None
             
             for book in books:
                 if book['id'] == book_id:
                     book_found = True
-                    # Ensure available_copies exists
-                    if 'available_copies' not in book:
-                        book['available_copies'] = 1 if book.get('available', True) else 0
-                    
-                    book_available = book['available_copies'] > 0
+                    copies = self._title_copies(inventory, book)
+                    book_available = copies.available > 0
                     book_title = book['title']
                     break
 
@@ -801,13 +1583,15 @@ class FileHandler:
             # Issue the book
             issue_date = datetime.now()
             due_date = issue_date + timedelta(days=days)
+            copy_id = copies.allocate()
             
             new_issue = {
-                "id": f"ISS-{len(issued_books) + 1}",
+                "id": self._next_id('issued_books.json', issued_books, "ISS"),
                 "student_id": student_id,
                 "book_id": book_id,
-                "issue_date": issue_date.strftime("%Y-%m-%d %H:%M:%S"),
-                "due_date": due_date.strftime("%Y-%m-%d %H:%M:%S"),
+                "copy_id": copy_id,
+                "issue_date": self._stamp(issue_date),
+                "due_date": self._stamp(due_date),
                 "returned": False,
                 "return_date": None
             }
@@ -817,17 +1601,14 @@ class FileHandler:
             # Update book availability
             for book in books:
                 if book['id'] == book_id:
-                    # Ensure available_copies exists
-                    if 'available_copies' not in book:
-                        book['available_copies'] = 1 if book.get('available', True) else 0
-                    
-                    book['available_copies'] -= 1
-                    if book['available_copies'] == 0:
-                        book['available'] = False
+                    sync_book_counts(book, copies)
                     break
             
             # Save changes
-            if self.write_json_file('issued_books.json', issued_books) and self.write_json_file('books.json', books):
+            if (self.write_json_file('issued_books.json', issued_books) and
+                self.write_json_file('books.json', books) and
+                self._write_inventory(inventory)):
+                self.events.append('issue_created', new_issue)
                 return True, f"Book '{book_title}' issued to {student_name} successfully"
             else:
                 return False, "Error writing to files"
@@ -836,17 +1617,48 @@ class FileHandler:
             print(f"Detailed error in issue_book: {error_details}")
             return False, f"Error issuing book: {str(e)}"
     
+    @staticmethod
+    def _loan_due_date(issue):
+        """A loan's due date; legacy loans without one are due 7 days after issue"""
+        if 'due_date' in issue:
+            return to_datetime(issue['due_date'])
+        if 'issue_date' in issue:
+            return to_datetime(issue['issue_date']) + timedelta(days=7)
+        # If both are missing, use current date (no late penalty)
+        return datetime.now()
+    
+    def _placeholder_book(self, book_id, inventory):
+        """Stand-in record, with one shelved copy, for a returned book missing from books.json"""
+        print(f"Book {book_id} not found in database, creating placeholder")
+        inventory.create_title(book_id, 1)
+        return {
+            "id": book_id,
+            "title": f"Book {book_id}",
+            "author": "Unknown",
+            "genre": "Unknown",
+            "available": True,
+            "total_copies": 1,
+            "available_copies": 1,
+            "added_at": self._stamp()
+        }
+    
+    @locked(exclusive=['books.json', 'students.json', 'issued_books.json', 'copies.json', 'requests.json'])
     def return_book(self, issue_id):
         """Direct return book function (for admin use only)"""
         try:
             books = self.read_json_file('books.json')
             students = self.read_json_file('students.json')
             issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
+            requests = self.read_json_file('requests.json')
+            holds = HoldQueues(requests, self.timestamp_format)
+            promoted = []
             
             # Find the issue record
             issue_found = False
             book_id = ""
             student_id = ""
+            copy_id = None
             due_date = None
             
             for issue in issued_books:
@@ -854,25 +1666,16 @@ class FileHandler:
                     issue_found = True
                     book_id = issue['book_id']
                     student_id = issue['student_id']
+                    copy_id = issue.get('copy_id')
                     
-                    # Handle missing due_date
-                    if 'due_date' in issue:
-                        due_date = datetime.strptime(issue['due_date'], "%Y-%m-%d %H:%M:%S")
-                    else:
-                        # If due_date is missing, set it to issue_date + 7 days
-                        if 'issue_date' in issue:
-                            issue_date = datetime.strptime(issue['issue_date'], "%Y-%m-%d %H:%M:%S")
-                            due_date = issue_date + timedelta(days=7)
-                        else:
-                            # If both are missing, use current date (no late penalty)
-                            due_date = datetime.now()
+                    due_date = self._loan_due_date(issue)
                     
                     if issue.get('returned', False):
                         return False, "Book already returned"
                     
                     # Mark as returned
                     issue['returned'] = True
-                    issue['return_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    issue['return_date'] = return_date = self._stamp()
                     break
             
             if not issue_found:
@@ -884,40 +1687,17 @@ class FileHandler:
                 if book['id'] == book_id:
                     book_found = True
                     
-                    # Ensure total_copies exists
-                    if 'total_copies' not in book:
-                        book['total_copies'] = 1
-                    
-                    # Ensure available_copies exists and is an integer
-                    if 'available_copies' not in book:
-                        book['available_copies'] = 0
-                    
-                    # Convert to integer if it's a string
-                    try:
-                        available_copies = int(book['available_copies'])
-                    except (ValueError, TypeError):
-                        available_copies = 0
-                    
-                    # Increment available copies
-                    book['available_copies'] = available_copies + 1
-                    
-                    # Set available flag
-                    book['available'] = True
+                    # Put the copy back on the shelf, or reserve it for the
+                    # next student in the hold queue, and derive the counters
+                    copies = self._title_copies(inventory, book)
+                    copies.release(copy_id)
+                    promoted = allocate_to_holds(holds, copies)
+                    sync_book_counts(book, copies)
                     break
             
             # If book not found, create a placeholder
             if not book_found:
-                print(f"Book {book_id} not found in database, creating placeholder")
-                books.append({
-                    "id": book_id,
-                    "title": f"Book {book_id}",
-                    "author": "Unknown",
-                    "genre": "Unknown",
-                    "available": True,
-                    "total_copies": 1,
-                    "available_copies": 1,
-                    "added_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                })
+                books.append(self._placeholder_book(book_id, inventory))
             
             # Check if return is late and flag student if needed
             current_date = datetime.now()
@@ -934,7 +1714,17 @@ class FileHandler:
             # Save changes
             if (self.write_json_file('issued_books.json', issued_books) and 
                 self.write_json_file('books.json', books) and 
-                self.write_json_file('students.json', students)):
+                self.write_json_file('students.json', students) and
+                self._write_inventory(inventory) and
+                (not promoted or self.write_json_file('requests.json', requests))):
+                
+                self.events.append('issue_returned', {
+                    "issue_id": issue_id, "student_id": student_id, "book_id": book_id,
+                    "copy_id": copy_id, "return_date": to_display(return_date), "late": is_late
+                })
+                if is_late:
+                    self.events.append('student_flagged', {"student_id": student_id, "reason": "late_return"})
+                self._emit_promoted(promoted)
                 
                 message = "Book returned successfully"
                 if is_late:
@@ -948,6 +1738,201 @@ class FileHandler:
             print(f"Detailed error in return_book: {error_details}")
             return False, f"Error returning book: {str(e)}"
     
+    @locked(exclusive=['books.json', 'issued_books.json', 'copies.json'], shared=['students.json'])
+    def issue_books(self, student_id, codes, days=7):
+        """Desk check-out: issue every scanned book id, copy id or barcode to one student.
+        
+        Each item is validated against the state left by the items before
+        it, and all successful items are written together: one write per
+        collection however many books are scanned. Returns a
+        (code, success, message) result per code.
+        """
+        try:
+            students = self.read_json_file('students.json')
+            student = next((s for s in students if s['id'] == student_id), None)
+            if not student:
+                return [(code, False, "Student not found") for code in codes]
+            if not student.get('approved', False):
+                return [(code, False, "Student is not approved") for code in codes]
+            
+            books = self.read_json_file('books.json')
+            issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
+            books_by_id = {book['id']: book for book in books}
+            open_loans = sum(1 for issue in issued_books
+                             if issue['student_id'] == student_id and not issue.get('returned', False))
+            
+            issue_date = datetime.now()
+            due_date = issue_date + timedelta(days=days)
+            next_seq = record_seq(self._next_id('issued_books.json', issued_books, "ISS"))
+            results = []
+            new_issues = []
+            
+            catalog = self.get_catalog()
+            for code in codes:
+                book_id, copy_id = parse_code(code)
+                if book_id not in books_by_id and not copy_id:
+                    # The barcode on the back of the book: its ISBN
+                    position = catalog.find_isbn(code)
+                    book_id = catalog.ids[position] if position is not None else book_id
+                book = books_by_id.get(book_id)
+                if not book:
+                    results.append((code, False, "Book not found"))
+                    continue
+                
+                # Flagged students can only have one book at a time
+                if student.get('flagged', False) and open_loans >= 1:
+                    results.append((code, False, "Flagged students can only have one book at a time"))
+                    continue
+                
+                copies = self._title_copies(inventory, book)
+                if copy_id:
+                    copy_id = copies.take(copy_id)
+                    if not copy_id:
+                        results.append((code, False, "This copy is not on the shelf"))
+                        continue
+                else:
+                    copy_id = copies.allocate()
+                    if not copy_id:
+                        results.append((code, False, "No copies of this book are available"))
+                        continue
+                
+                new_issue = {
+                    "id": f"ISS-{next_seq + len(new_issues)}",
+                    "student_id": student_id,
+                    "book_id": book_id,
+                    "copy_id": copy_id,
+                    "issue_date": self._stamp(issue_date),
+                    "due_date": self._stamp(due_date),
+                    "returned": False,
+                    "return_date": None
+                }
+                issued_books.append(new_issue)
+                new_issues.append(new_issue)
+                sync_book_counts(book, copies)
+                open_loans += 1
+                results.append((code, True, f"'{book['title']}' issued as {new_issue['id']} (copy {copy_id})"))
+            
+            if not new_issues:
+                return results
+            
+            # Save changes: one write per collection for the whole batch
+            if (self.write_json_file('issued_books.json', issued_books) and
+                self.write_json_file('books.json', books) and
+                self._write_inventory(inventory)):
+                self.events.append_many([('issue_created', issue) for issue in new_issues])
+                return results
+            return [(code, False, "Error writing to files") for code in codes]
+        except Exception as e:
+            error_details = traceback.format_exc()
+            print(f"Detailed error in issue_books: {error_details}")
+            return [(code, False, f"Error issuing book: {str(e)}") for code in codes]
+    
+    @locked(exclusive=['books.json', 'students.json', 'issued_books.json', 'copies.json', 'requests.json'])
+    def return_books(self, codes):
+        """Desk check-in: return a stack of loans by issue id, copy id or barcode.
+        
+        A book id is accepted when exactly one copy of the title is out.
+        Like issue_books, the whole stack is written once per collection;
+        returns a (code, success, message) result per code.
+        """
+        try:
+            books = self.read_json_file('books.json')
+            students = self.read_json_file('students.json')
+            issued_books = self.read_json_file('issued_books.json')
+            inventory = self._read_inventory()
+            requests = self.read_json_file('requests.json')
+            holds = HoldQueues(requests, self.timestamp_format)
+            
+            books_by_id = {book['id']: book for book in books}
+            students_by_id = {student['id']: student for student in students}
+            issues_by_id = {}
+            open_by_copy = {}
+            open_by_book = {}
+            for issue in issued_books:
+                issues_by_id[issue['id']] = issue
+                if not issue.get('returned', False):
+                    if issue.get('copy_id'):
+                        open_by_copy[issue['copy_id']] = issue
+                    open_by_book.setdefault(issue['book_id'], []).append(issue)
+            
+            current_date = datetime.now()
+            return_date = self._stamp(current_date)
+            results = []
+            events = []
+            promoted = []
+            flagged = False
+            
+            for code in codes:
+                book_id, copy_id = parse_code(code)
+                if copy_id:
+                    issue = open_by_copy.get(copy_id)
+                elif code.strip() in issues_by_id:
+                    issue = issues_by_id[code.strip()]
+                else:
+                    loans = [loan for loan in open_by_book.get(book_id, ()) if not loan.get('returned', False)]
+                    if len(loans) > 1:
+                        results.append((code, False, "Several copies of this title are out: scan the copy or issue ID"))
+                        continue
+                    issue = loans[0] if loans else None
+                
+                if issue is None:
+                    results.append((code, False, "No open loan found"))
+                    continue
+                if issue.get('returned', False):
+                    results.append((code, False, "Book already returned"))
+                    continue
+                
+                issue['returned'] = True
+                issue['return_date'] = return_date
+                book_id = issue['book_id']
+                open_by_copy.pop(issue.get('copy_id'), None)
+                
+                book = books_by_id.get(book_id)
+                if book:
+                    # Back on the shelf, or reserved for the title's next hold
+                    copies = self._title_copies(inventory, book)
+                    copies.release(issue.get('copy_id'))
+                    promoted.extend(allocate_to_holds(holds, copies))
+                    sync_book_counts(book, copies)
+                else:
+                    books_by_id[book_id] = self._placeholder_book(book_id, inventory)
+                    books.append(books_by_id[book_id])
+                
+                is_late = current_date > self._loan_due_date(issue)
+                events.append(('issue_returned', {
+                    "issue_id": issue['id'], "student_id": issue['student_id'], "book_id": book_id,
+                    "copy_id": issue.get('copy_id'), "return_date": to_display(return_date), "late": is_late
+                }))
+                
+                message = f"Returned {issue['id']}"
+                student = students_by_id.get(issue['student_id'])
+                if is_late and student:
+                    if not student.get('flagged', False):
+                        student['flagged'] = True
+                        flagged = True
+                        events.append(('student_flagged', {"student_id": student['id'], "reason": "late_return"}))
+                    message += " (Late return - Student flagged)"
+                results.append((code, True, message))
+            
+            if not events:
+                return results
+            
+            # Save changes: one write per collection for the whole stack
+            if (self.write_json_file('issued_books.json', issued_books) and
+                self.write_json_file('books.json', books) and
+                (not flagged or self.write_json_file('students.json', students)) and
+                self._write_inventory(inventory) and
+                (not promoted or self.write_json_file('requests.json', requests))):
+                self.events.append_many(events + self._promoted_events(promoted))
+                return results
+            return [(code, False, "Error writing to files") for code in codes]
+        except Exception as e:
+            error_details = traceback.format_exc()
+            print(f"Detailed error in return_books: {error_details}")
+            return [(code, False, f"Error returning book: {str(e)}") for code in codes]
+    
+    @locked(exclusive=['students.json'])
     def approve_student(self, student_id):
         """Approve a student's library card application"""
         try:
@@ -961,6 +1946,7 @@ class FileHandler:
                     student['approved'] = True
                     
                     if self.write_json_file('students.json', students):
+                        self.events.append('student_approved', {"student_id": student_id})
                         return True, "Student approved successfully"
                     else:
                         return False, "Error writing to students file"
@@ -969,6 +1955,7 @@ class FileHandler:
         except Exception as e:
             return False, f"Error approving student: {str(e)}"
     
+    @locked(exclusive=['students.json'])
     def block_student(self, student_id):
         """Block a student's library access"""
         try:
@@ -979,6 +1966,7 @@ class FileHandler:
                     student['approved'] = False
                     
                     if self.write_json_file('students.json', students):
+                        self.events.append('student_blocked', {"student_id": student_id})
                         return True, "Student blocked successfully"
                     else:
                         return False, "Error writing to students file"
@@ -987,6 +1975,7 @@ class FileHandler:
         except Exception as e:
             return False, f"Error blocking student: {str(e)}"
     
+    @locked(exclusive=['students.json'])
     def flag_student(self, student_id, flag_status=True):
         """Flag or unflag a student for late returns"""
         try:
@@ -998,6 +1987,7 @@ class FileHandler:
                     
                     if self.write_json_file('students.json', students):
                         action = "flagged" if flag_status else "unflagged"
+                        self.events.append(f'student_{action}', {"student_id": student_id, "reason": "admin"})
                         return True, f"Student {action} successfully"
                     else:
                         return False, "Error writing to students file"
@@ -1006,6 +1996,7 @@ class FileHandler:
         except Exception as e:
             return False, f"Error updating student flag status: {str(e)}"
     
+    @locked(shared=['books.json', 'students.json', 'issued_books.json'])
     def get_analytics(self):
         """Get library analytics"""
         try:
@@ -1013,6 +2004,15 @@ class FileHandler:
             students = self.read_json_file('students.json')
             issued_books = self.read_json_file('issued_books.json')
             
+            return FileHandler.compute_analytics(books, students, issued_books)
+        except Exception as e:
+            print(f"Error getting analytics: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def compute_analytics(books, students, issued_books):
+        """Compute library analytics from already loaded collections"""
+        try:
             total_books = sum(book.get('total_copies', 1) for book in books)
             available_books = sum(book.get('available_copies', 1 if book['available'] else 0) for book in books)
             issued_books_count = total_books - available_books
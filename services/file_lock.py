@@ -0,0 +1,173 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locks only
+    fcntl = None
+
+# One lock per collection so unrelated operations don't serialize
+COLLECTION_LOCKS = {
+    'books.json': 'books',
+    'students.json': 'students',
+    'issued_books.json': 'issues',
+    'requests.json': 'requests',
+    'logs.csv': 'logs',
+    'admin.json': 'admin',
+    'copies.json': 'copies',
+    'recommendations.json': 'recommendations',
+    'circulation.json': 'circulation',
+    'fines_ledger.json': 'fines',
+    'fine_policy.json': 'fine_policy',
+    'archive': 'archive',
+    'events.jsonl': 'events',
+    'audit.json': 'audit',
+}
+
+SHARED = 'shared'
+EXCLUSIVE = 'exclusive'
+
+# Locks held by the current thread: lock path -> [fd, mode, depth].
+# Module level so every CollectionLocks instance for the same data
+# directory sees the same state and nested acquisitions are re-entrant.
+_thread_state = threading.local()
+
+# Fallback used when fcntl is unavailable
+_fallback_locks = {}
+_fallback_guard = threading.Lock()
+
+
+def _held_locks():
+    held = getattr(_thread_state, 'held', None)
+    if held is None:
+        held = _thread_state.held = {}
+    return held
+
+
+def lock_name(file_name):
+    """Lock stripe used for a data file"""
+    base = os.path.basename(file_name)
+    return COLLECTION_LOCKS.get(base, os.path.splitext(base)[0])
+
+
+class CollectionLocks:
+    """Advisory per-collection file locks for a data directory.
+
+    Readers take shared locks and writers exclusive ones. A method that
+    reads, modifies and writes several collections must acquire all of
+    them in one ``acquire`` call: locks are always taken in sorted order,
+    so two operations can't deadlock on each other, and calls nested
+    inside an acquired block reuse the locks already held by the thread.
+    Upgrading a shared lock to exclusive inside the same block is not
+    supported and raises RuntimeError.
+    """
+
+    def __init__(self, data_dir):
+        self.lock_dir = os.path.join(data_dir, '.locks')
+
+    def _lock_path(self, file_name):
+        return os.path.join(self.lock_dir, f"{lock_name(file_name)}.lock")
+
+    @contextmanager
+    def acquire(self, exclusive=(), shared=()):
+        """Hold exclusive locks on some collections and shared locks on others"""
+        modes = {}
+        for file_name in shared:
+            modes[self._lock_path(file_name)] = SHARED
+        for file_name in exclusive:
+            modes[self._lock_path(file_name)] = EXCLUSIVE
+
+        held = _held_locks()
+        acquired = []
+        try:
+            for path in sorted(modes):
+                mode = modes[path]
+                entry = held.get(path)
+
+                if entry is not None:
+                    if mode == EXCLUSIVE and entry[1] == SHARED:
+                        raise RuntimeError(f"Cannot upgrade shared lock on {path} to exclusive")
+                    entry[2] += 1
+                else:
+                    held[path] = [self._lock(path, mode), mode, 1]
+
+                acquired.append(path)
+            yield
+        finally:
+            for path in reversed(acquired):
+                entry = held[path]
+                entry[2] -= 1
+                if entry[2] == 0:
+                    del held[path]
+                    self._unlock(path, entry[0])
+
+    def shared(self, *file_names):
+        return self.acquire(shared=file_names)
+
+    def exclusive(self, *file_names):
+        return self.acquire(exclusive=file_names)
+
+    def _lock(self, path, mode):
+        if fcntl is None:
+            with _fallback_guard:
+                lock = _fallback_locks.setdefault(path, threading.Lock())
+            lock.acquire()
+            return lock
+
+        os.makedirs(self.lock_dir, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if mode == EXCLUSIVE else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _unlock(self, path, handle):
+        if fcntl is None:
+            handle.release()
+            return
+
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            os.close(handle)
+
+
+def locked(exclusive=(), shared=()):
+    """Method decorator holding collection locks for the whole call (needs self.locks)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.locks.acquire(exclusive, shared):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def atomic_write_text(file_path, content):
+    """Write content to a temp file in the same directory and rename it into place"""
+    _atomic_write(file_path, content, 'w')
+
+
+def atomic_write_bytes(file_path, content):
+    """atomic_write_text for binary content"""
+    _atomic_write(file_path, content, 'wb')
+
+
+def _atomic_write(file_path, content, mode):
+    directory = os.path.dirname(file_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(content)
+        # mkstemp creates 0600 files; keep the usual permissions of data files
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
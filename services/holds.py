@@ -0,0 +1,145 @@
+import argparse
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+
+from services.timestamps import STRING, stamp, to_epoch
+
+ON_HOLD = "on_hold"
+EXPIRED = "expired"
+
+# Days a student has to collect a copy reserved for their hold
+HOLD_PICKUP_DAYS = 3
+
+
+class HoldQueues:
+    """Hold queues over the issue requests in requests.json.
+
+    An issue request for a title with no free copies waits with status
+    "on_hold". Each title has a FIFO queue of its waiting requests, in the
+    order they were placed. When a copy comes back it is reserved for the
+    head of the queue, whose request turns "pending" with a
+    reserved_copy_id and a hold_expires_at deadline; reserved requests are
+    indexed in a heap by that deadline (as epoch seconds, whichever way
+    it is stored) so expiry only looks at the front. New timestamps are
+    written in timestamp_format (see services.timestamps).
+
+    The request records are mutated in place, so the caller writes the
+    same list back to requests.json.
+    """
+
+    def __init__(self, requests, timestamp_format=STRING):
+        self.requests = requests
+        self.timestamp_format = timestamp_format
+        self.by_id = {}
+        self.queues = {}
+        self.expiry = []
+
+        for request in requests:
+            if request['type'] != "issue":
+                continue
+            self.by_id[request['id']] = request
+            if request['status'] == ON_HOLD:
+                self.queues.setdefault(request['book_id'], deque()).append(request['id'])
+            elif request['status'] == "pending" and request.get('hold_expires_at'):
+                self.expiry.append((to_epoch(request['hold_expires_at']), request['id']))
+        heapq.heapify(self.expiry)
+
+    def waiting(self, book_id):
+        """Number of requests queued for a title"""
+        return len(self.queues.get(book_id, ()))
+
+    def find(self, student_id, book_id):
+        """A student's open hold (queued or reserved) on a title, if any"""
+        for request_id in self.queues.get(book_id, ()):
+            if self.by_id[request_id]['student_id'] == student_id:
+                return self.by_id[request_id]
+        for _, request_id in self.expiry:
+            request = self.by_id[request_id]
+            if request['book_id'] == book_id and request['student_id'] == student_id and request['status'] == "pending":
+                return request
+        return None
+
+    def place(self, request):
+        """Queue a new issue request; returns its 1-based queue position"""
+        request['status'] = ON_HOLD
+        self.requests.append(request)
+        self.by_id[request['id']] = request
+        queue = self.queues.setdefault(request['book_id'], deque())
+        queue.append(request['id'])
+        return len(queue)
+
+    def promote(self, book_id, copy_id, now=None, pickup_days=HOLD_PICKUP_DAYS):
+        """Reserve a copy for the head of a title's queue; returns the request or None"""
+        queue = self.queues.get(book_id)
+        if not queue:
+            return None
+
+        now = now or datetime.now()
+        request = self.by_id[queue.popleft()]
+        request['status'] = "pending"
+        request['reserved_copy_id'] = copy_id
+        request['hold_ready_at'] = stamp(now, self.timestamp_format)
+        request['hold_expires_at'] = stamp(now + timedelta(days=pickup_days), self.timestamp_format)
+        heapq.heappush(self.expiry, (to_epoch(request['hold_expires_at']), request['id']))
+        return request
+
+    def pop_expired(self, now=None):
+        """Mark reservations past their deadline expired and return those requests"""
+        now = now or datetime.now()
+        cutoff = to_epoch(now)
+        expired = []
+        while self.expiry and self.expiry[0][0] <= cutoff:
+            _, request_id = heapq.heappop(self.expiry)
+            request = self.by_id[request_id]
+            # Entries for requests approved since the heap was built are stale
+            if request['status'] != "pending":
+                continue
+            request['status'] = EXPIRED
+            request['expired_at'] = stamp(now, self.timestamp_format)
+            expired.append(request)
+        return expired
+
+    def positions(self):
+        """{request_id: 1-based queue position} for every queued request"""
+        return {
+            request_id: position
+            for queue in self.queues.values()
+            for position, request_id in enumerate(queue, 1)
+        }
+
+
+def overdue_holds(requests, now=None):
+    """Number of reservations past their pickup deadline, without building the queues"""
+    cutoff = to_epoch(now or datetime.now())
+    return sum(
+        1 for request in requests
+        if request['type'] == "issue" and request['status'] == "pending"
+        and request.get('hold_expires_at') and to_epoch(request['hold_expires_at']) <= cutoff
+    )
+
+
+def allocate_to_holds(holds, copies, now=None):
+    """Reserve a title's free copies for the head of its hold queue.
+
+    Returns the requests that were promoted.
+    """
+    promoted = []
+    while copies.available and holds.waiting(copies.book_id):
+        promoted.append(holds.promote(copies.book_id, copies.allocate(), now))
+    return promoted
+
+
+def main(argv=None):
+    from services.file_handler import FileHandler
+
+    parser = argparse.ArgumentParser(description="Expire uncollected hold reservations and pass their copies on")
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args(argv)
+
+    expired = FileHandler(data_dir=args.data_dir).expire_holds()
+    print(f"Expired {expired} hold reservations")
+
+
+if __name__ == "__main__":
+    main()
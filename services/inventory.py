@@ -0,0 +1,224 @@
+import re
+from datetime import datetime
+
+DEFAULT_CONDITION = "good"
+DEFAULT_LOCATION = "Main Library"
+WITHDRAWN = "withdrawn"
+
+
+def copy_id_for(book_id, index):
+    """Copy ids encode their position so lookups need no search"""
+    return f"{book_id}-C{index + 1:04d}"
+
+
+def copy_index(copy_id):
+    """Position of a copy within its title, from its copy id"""
+    return int(copy_id.rsplit('-C', 1)[1]) - 1
+
+
+_COPY_ID = re.compile(r'^(.+)-C(\d{4,})$')
+_BARCODE = re.compile(r'^([A-Za-z]+)(\d+)C(\d{4,})$')
+
+
+def parse_code(code):
+    """(book_id, copy_id) for a scanned copy id or barcode; (code, None) for anything else"""
+    code = code.strip()
+    match = _COPY_ID.match(code)
+    if match:
+        return match.group(1), code
+    match = _BARCODE.match(code)
+    if match:
+        book_id = f"{match.group(1)}-{match.group(2)}"
+        return book_id, f"{book_id}-C{match.group(3)}"
+    return code, None
+
+
+class TitleCopies:
+    """Physical copies of one title with a bitset of free copies.
+
+    Bit i of ``free`` is set when copy i is on the shelf. Copies are
+    never removed, only withdrawn, so positions (and copy ids) are
+    stable and the bitset stays aligned with the copy list.
+    """
+
+    __slots__ = ('book_id', 'copies', 'free')
+
+    def __init__(self, book_id, copies=None, free=0):
+        self.book_id = book_id
+        self.copies = copies or []
+        self.free = free
+
+    @classmethod
+    def from_dict(cls, book_id, data):
+        return cls(book_id, data.get('copies', []), int(data.get('free', '0'), 16))
+
+    def to_dict(self):
+        return {"copies": self.copies, "free": format(self.free, 'x')}
+
+    @property
+    def total(self):
+        return sum(1 for copy in self.copies if copy.get('condition') != WITHDRAWN)
+
+    @property
+    def available(self):
+        return self.free.bit_count()
+
+    def add_copies(self, count, location=DEFAULT_LOCATION, condition=DEFAULT_CONDITION):
+        """Add new copies on the shelf and return their ids"""
+        added = []
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for _ in range(count):
+            index = len(self.copies)
+            copy_id = copy_id_for(self.book_id, index)
+            self.copies.append({
+                "copy_id": copy_id,
+                "barcode": copy_id.replace('-', ''),
+                "condition": condition,
+                "location": location,
+                "added_at": timestamp
+            })
+            self.free |= 1 << index
+            added.append(copy_id)
+        return added
+
+    def allocate(self):
+        """Take the lowest free copy off the shelf; returns its id or None"""
+        if not self.free:
+            return None
+        lowest = self.free & -self.free
+        self.free ^= lowest
+        return self.copies[lowest.bit_length() - 1]['copy_id']
+
+    def take(self, copy_id):
+        """Take a specific copy off the shelf; returns its id, or None if it isn't free"""
+        if not self.is_free(copy_id):
+            return None
+        self.free &= ~(1 << copy_index(copy_id))
+        return copy_id
+
+    def release(self, copy_id=None):
+        """Put a copy back on the shelf.
+
+        Without a copy id (loans made before copies were tracked) the
+        lowest out-of-shelf active copy is released instead.
+        """
+        if copy_id is None:
+            for index, copy in enumerate(self.copies):
+                if not (self.free >> index) & 1 and copy.get('condition') != WITHDRAWN:
+                    self.free |= 1 << index
+                    return copy['copy_id']
+            return None
+
+        index = copy_index(copy_id)
+        if index >= len(self.copies) or self.copies[index].get('condition') == WITHDRAWN:
+            return None
+        self.free |= 1 << index
+        return copy_id
+
+    def is_free(self, copy_id):
+        index = copy_index(copy_id)
+        return index < len(self.copies) and bool((self.free >> index) & 1)
+
+    def withdraw_free(self, count):
+        """Withdraw up to count copies that are on the shelf, newest first"""
+        withdrawn = []
+        for index in range(len(self.copies) - 1, -1, -1):
+            if len(withdrawn) == count:
+                break
+            if (self.free >> index) & 1:
+                self.free &= ~(1 << index)
+                self.copies[index]['condition'] = WITHDRAWN
+                withdrawn.append(self.copies[index]['copy_id'])
+        return withdrawn
+
+    def resize(self, total):
+        """Add or withdraw copies so the active total matches; returns the new total"""
+        current = self.total
+        if total > current:
+            self.add_copies(total - current)
+        elif total < current:
+            self.withdraw_free(current - total)
+        return self.total
+
+    def is_out(self, copy_id):
+        """True for an active copy that is off the shelf: on loan or reserved for a hold"""
+        index = copy_index(copy_id)
+        return (index < len(self.copies) and self.copies[index].get('condition') != WITHDRAWN
+                and not (self.free >> index) & 1)
+
+    def update_copy(self, copy_id, condition=None, location=None):
+        """Change a copy's condition or location; False if it's unknown or out and being withdrawn.
+
+        A copy out on loan or reserved can't be withdrawn: total would no
+        longer count it while the loan or reservation still does.
+        """
+        index = copy_index(copy_id)
+        if index >= len(self.copies):
+            return False
+        copy = self.copies[index]
+        if condition:
+            if condition == WITHDRAWN:
+                if self.is_out(copy_id):
+                    return False
+                self.free &= ~(1 << index)
+            elif copy.get('condition') == WITHDRAWN:
+                # A reinstated copy goes back on the shelf
+                self.free |= 1 << index
+            copy['condition'] = condition
+        if location:
+            copy['location'] = location
+        return True
+
+    def copy_rows(self):
+        """Copies with their shelf status, for display"""
+        return [
+            dict(copy, status="Withdrawn" if copy.get('condition') == WITHDRAWN
+                 else "Available" if (self.free >> index) & 1 else "Issued")
+            for index, copy in enumerate(self.copies)
+        ]
+
+
+class CopyInventory:
+    """All titles' copies, as stored in copies.json ({book_id: {copies, free}})"""
+
+    def __init__(self, data=None):
+        self._raw = data or {}
+        self._titles = {}
+
+    def title(self, book_id):
+        """Copies of one title, or None if the title isn't tracked yet"""
+        title = self._titles.get(book_id)
+        if title is None and book_id in self._raw:
+            title = self._titles[book_id] = TitleCopies.from_dict(book_id, self._raw[book_id])
+        return title
+
+    def create_title(self, book_id, total, available=None, location=DEFAULT_LOCATION):
+        """Start tracking a title with total copies, of which `available` are free"""
+        title = TitleCopies(book_id)
+        title.add_copies(total, location=location)
+        if available is not None and available < total:
+            # The first (total - available) copies are out on loan
+            for index in range(total - max(available, 0)):
+                title.free &= ~(1 << index)
+        self._titles[book_id] = title
+        return title
+
+    def remove_title(self, book_id):
+        self._titles.pop(book_id, None)
+        self._raw.pop(book_id, None)
+
+    def __contains__(self, book_id):
+        return book_id in self._titles or book_id in self._raw
+
+    def to_dict(self):
+        data = dict(self._raw)
+        for book_id, title in self._titles.items():
+            data[book_id] = title.to_dict()
+        return data
+
+
+def sync_book_counts(book, title):
+    """Derive a book record's copy counters from its copy records"""
+    book['total_copies'] = title.total
+    book['available_copies'] = title.available
+    book['available'] = book['available_copies'] > 0
@@ -0,0 +1,37 @@
+"""ISBN normalization.
+
+Books may carry an ISBN, stored as the 13 digits of its ISBN-13 form:
+ISBN-10s are converted, and hyphens and spaces are dropped, so the same
+edition always has the same key whichever way it was typed or scanned.
+"""
+
+
+def isbn13_check_digit(digits):
+    """Check digit for the first 12 digits of an ISBN-13"""
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_valid(value):
+    if not (value[:9].isdigit() and (value[9].isdigit() or value[9] == 'X')):
+        return False
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(value[:9]))
+    total += 10 if value[9] == 'X' else int(value[9])
+    return total % 11 == 0
+
+
+def normalize_isbn(value):
+    """13-digit ISBN for an ISBN-10 or ISBN-13 string; None when value isn't a valid ISBN"""
+    if not value:
+        return None
+    value = str(value).replace('-', '').replace(' ', '').upper()
+
+    if len(value) == 13 and value.isdigit():
+        return value if value[12] == isbn13_check_digit(value) else None
+
+    if len(value) == 10 and _isbn10_valid(value):
+        digits = "978" + value[:9]
+        return digits + isbn13_check_digit(digits)
+
+    return None
+
@@ -0,0 +1,251 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# Histogram bucket upper bounds in nanoseconds (1us .. 10s)
+BUCKET_BOUNDS_NS = [
+    1_000, 5_000, 10_000, 50_000, 100_000, 500_000,
+    1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000, 500_000_000,
+    1_000_000_000, 5_000_000_000, 10_000_000_000
+]
+
+
+class MethodStats:
+    """Call count, failures and latency histogram for one instrumented method"""
+
+    __slots__ = ('component', 'method', 'count', 'errors', 'failures', 'total_ns', 'buckets')
+
+    def __init__(self, component, method):
+        self.component = component
+        self.method = method
+        self.count = 0
+        self.errors = 0
+        self.failures = 0
+        self.total_ns = 0
+        # One bucket per bound plus the +Inf bucket
+        self.buckets = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+
+    def quantile_ms(self, q):
+        """Estimate a latency quantile from the histogram (bucket upper bound)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for i, bucket in enumerate(self.buckets):
+            running += bucket
+            if running >= target:
+                if i < len(BUCKET_BOUNDS_NS):
+                    return BUCKET_BOUNDS_NS[i] / 1e6
+                break
+        return BUCKET_BOUNDS_NS[-1] / 1e6
+
+
+class MetricsRegistry:
+    """Process-wide registry of data layer metrics.
+
+    When disabled nothing is wrapped, so instrumented objects run their
+    original methods with no overhead. Updates are plain attribute
+    increments without a lock; counts can be off by one under heavy
+    thread contention, which is acceptable for monitoring.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.methods = {}
+        self.bytes_read = {}
+        self.bytes_written = {}
+        self.cache = {}
+        self._last_export = 0.0
+        self._lock = threading.Lock()
+
+    def _stats_for(self, component, method):
+        key = (component, method)
+        stats = self.methods.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.methods.setdefault(key, MethodStats(component, method))
+        return stats
+
+    def instrument(self, obj, component):
+        """Wrap every public method of obj with timing; no-op when disabled"""
+        if not self.enabled:
+            return obj
+
+        for name in dir(type(obj)):
+            if name.startswith('_'):
+                continue
+            method = getattr(obj, name, None)
+            if not callable(method) or getattr(method, '__wrapped_metrics__', False):
+                continue
+            setattr(obj, name, self._wrap(method, self._stats_for(component, name)))
+
+        return obj
+
+    def _wrap(self, func, stats):
+        perf_counter_ns = time.perf_counter_ns
+        bounds = BUCKET_BOUNDS_NS
+        buckets = stats.buckets
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                elapsed = perf_counter_ns() - start
+                stats.count += 1
+                stats.total_ns += elapsed
+                buckets[bisect_left(bounds, elapsed)] += 1
+            # (False, message) is how the data layer reports failed operations
+            if type(result) is tuple and result and result[0] is False:
+                stats.failures += 1
+            return result
+
+        wrapper.__wrapped_metrics__ = True
+        return wrapper
+
+    def add_bytes_read(self, collection, count):
+        self.bytes_read[collection] = self.bytes_read.get(collection, 0) + count
+
+    def add_bytes_written(self, collection, count):
+        self.bytes_written[collection] = self.bytes_written.get(collection, 0) + count
+
+    def record_cache(self, cache_name, hit):
+        """Count a cache lookup; callers check `enabled` first"""
+        counts = self.cache.get(cache_name)
+        if counts is None:
+            counts = self.cache.setdefault(cache_name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.methods = {}
+            self.bytes_read = {}
+            self.bytes_written = {}
+            self.cache = {}
+
+    def method_rows(self):
+        """Per-method summary rows for display"""
+        rows = []
+        for stats in sorted(self.methods.values(), key=lambda s: s.total_ns, reverse=True):
+            if not stats.count:
+                continue
+            rows.append({
+                "Component": stats.component,
+                "Method": stats.method,
+                "Calls": stats.count,
+                "Failures": stats.failures,
+                "Errors": stats.errors,
+                "Mean (ms)": round(stats.total_ns / stats.count / 1e6, 4),
+                "p50 (ms)": stats.quantile_ms(0.5),
+                "p95 (ms)": stats.quantile_ms(0.95),
+                "p99 (ms)": stats.quantile_ms(0.99),
+                "Total (ms)": round(stats.total_ns / 1e6, 3)
+            })
+        return rows
+
+    def io_rows(self):
+        collections = sorted(set(self.bytes_read) | set(self.bytes_written))
+        return [
+            {
+                "Collection": collection,
+                "Bytes Read": self.bytes_read.get(collection, 0),
+                "Bytes Written": self.bytes_written.get(collection, 0)
+            }
+            for collection in collections
+        ]
+
+    def cache_rows(self):
+        rows = []
+        for cache_name, (hits, misses) in sorted(self.cache.items()):
+            total = hits + misses
+            rows.append({
+                "Cache": cache_name,
+                "Hits": hits,
+                "Misses": misses,
+                "Hit Rate": f"{hits / total:.1%}" if total else "-"
+            })
+        return rows
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP library_call_duration_seconds Latency of data layer calls",
+            "# TYPE library_call_duration_seconds histogram"
+        ]
+        for stats in self.methods.values():
+            labels = f'component="{stats.component}",method="{stats.method}"'
+            running = 0
+            for bound, bucket in zip(BUCKET_BOUNDS_NS + [None], stats.buckets):
+                running += bucket
+                le = "+Inf" if bound is None else repr(bound / 1e9)
+                lines.append(f'library_call_duration_seconds_bucket{{{labels},le="{le}"}} {running}')
+            lines.append(f"library_call_duration_seconds_sum{{{labels}}} {stats.total_ns / 1e9}")
+            lines.append(f"library_call_duration_seconds_count{{{labels}}} {stats.count}")
+
+        lines += [
+            "# HELP library_call_failures_total Calls that returned a (False, message) result",
+            "# TYPE library_call_failures_total counter"
+        ]
+        for stats in self.methods.values():
+            lines.append(f'library_call_failures_total{{component="{stats.component}",method="{stats.method}"}} {stats.failures}')
+
+        lines += [
+            "# HELP library_call_errors_total Calls that raised an exception",
+            "# TYPE library_call_errors_total counter"
+        ]
+        for stats in self.methods.values():
+            lines.append(f'library_call_errors_total{{component="{stats.component}",method="{stats.method}"}} {stats.errors}')
+
+        lines += [
+            "# HELP library_bytes_read_total Bytes read from data files",
+            "# TYPE library_bytes_read_total counter"
+        ]
+        for collection, count in self.bytes_read.items():
+            lines.append(f'library_bytes_read_total{{collection="{collection}"}} {count}')
+
+        lines += [
+            "# HELP library_bytes_written_total Bytes written to data files",
+            "# TYPE library_bytes_written_total counter"
+        ]
+        for collection, count in self.bytes_written.items():
+            lines.append(f'library_bytes_written_total{{collection="{collection}"}} {count}')
+
+        lines += [
+            "# HELP library_cache_requests_total Cache lookups by result",
+            "# TYPE library_cache_requests_total counter"
+        ]
+        for cache_name, (hits, misses) in self.cache.items():
+            lines.append(f'library_cache_requests_total{{cache="{cache_name}",result="hit"}} {hits}')
+            lines.append(f'library_cache_requests_total{{cache="{cache_name}",result="miss"}} {misses}')
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path):
+        """Write the Prometheus text file atomically"""
+        try:
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, file_path)
+            self._last_export = time.time()
+            return True
+        except Exception as e:
+            print(f"Error exporting metrics: {str(e)}")
+            return False
+
+    def maybe_export(self, file_path, interval=15):
+        """Export at most once per interval seconds"""
+        if self.enabled and time.time() - self._last_export >= interval:
+            return self.export(file_path)
+        return False
+
+
+METRICS = MetricsRegistry(enabled=os.environ.get('LIBRARY_METRICS', '').lower() in ('1', 'true', 'yes', 'on'))
@@ -0,0 +1,263 @@
+from datetime import datetime
+
+from services.timestamps import DATE_FORMAT, to_datetime, to_display, to_epoch
+
+SECONDS_PER_DAY = 86400
+
+# Book list sort choices -> (BookCatalog sort field, descending)
+BOOK_SORT_OPTIONS = {
+    "Catalog order": (None, False),
+    "Title": ("title", False),
+    "Author": ("author", False),
+    "Newest first": ("added_at", True),
+    "Most available": ("available_copies", True),
+}
+
+
+def index_by_id(records):
+    """Build an id -> record lookup for a list of records"""
+    return {record['id']: record for record in records}
+
+
+def parse_codes(text):
+    """Scanned or typed codes, one per line (commas and spaces also separate)"""
+    return [code for code in text.replace(',', ' ').split() if code]
+
+
+def parse_date(value):
+    """Parse a stored timestamp (string or epoch seconds)"""
+    return to_datetime(value)
+
+
+def filter_books(books, search_term="", genre_filter="All", availability_filter="All"):
+    """Filter books by search term, genre and availability"""
+    filtered_books = books
+
+    if search_term:
+        term = search_term.lower()
+        filtered_books = [
+            book for book in filtered_books
+            if term in book['title'].lower() or term in book['author'].lower()
+        ]
+
+    if genre_filter != "All":
+        filtered_books = [book for book in filtered_books if book['genre'] == genre_filter]
+
+    if availability_filter == "Available":
+        filtered_books = [book for book in filtered_books if book['available']]
+    elif availability_filter == "Not Available":
+        filtered_books = [book for book in filtered_books if not book['available']]
+
+    return filtered_books
+
+
+def due_soon_rows(issued_books, books, students, current_date=None, within_days=3):
+    """Rows for open issues due within the given number of days (admin view), soonest first"""
+    now = to_epoch(current_date or datetime.now())
+    # days_left <= within_days, as one integer comparison on epoch seconds
+    horizon = now + (within_days + 1) * SECONDS_PER_DAY
+    books_by_id = index_by_id(books)
+    students_by_id = index_by_id(students)
+    due_soon = []
+
+    for issue in issued_books:
+        if issue.get('returned', False):
+            continue
+
+        due = to_epoch(issue['due_date'])
+
+        if due < horizon:
+            book = books_by_id.get(issue['book_id'])
+            student = students_by_id.get(issue['student_id'])
+
+            if book and student:
+                due_soon.append((due, issue, book, student))
+
+    due_soon.sort(key=lambda entry: entry[0])
+    return [
+        {
+            "Issue ID": issue['id'],
+            "Book": book['title'],
+            "Student": student['name'],
+            "Due Date": to_display(issue['due_date']),
+            "Days Left": (due - now) // SECONDS_PER_DAY
+        }
+        for due, issue, book, student in due_soon
+    ]
+
+
+def currently_issued_rows(issued_books, books, students, current_date=None):
+    """Rows for every open issue (admin view)"""
+    current_date = current_date or datetime.now()
+    books_by_id = index_by_id(books)
+    students_by_id = index_by_id(students)
+    rows = []
+
+    for issue in issued_books:
+        if issue.get('returned', False):
+            continue
+
+        book = books_by_id.get(issue['book_id'])
+        student = students_by_id.get(issue['student_id'])
+
+        if book and student:
+            days_left = (parse_date(issue['due_date']) - current_date).days
+
+            rows.append({
+                "Issue ID": issue['id'],
+                "Book": book['title'],
+                "Student": student['name'],
+                "Issue Date": to_display(issue['issue_date']),
+                "Due Date": to_display(issue['due_date']),
+                "Days Left": days_left,
+                "Status": "Overdue" if days_left < 0 else "Active"
+            })
+
+    return rows
+
+
+def request_rows(requests, books, students, request_type):
+    """Rows for pending requests of one type (admin view)"""
+    books_by_id = index_by_id(books)
+    students_by_id = index_by_id(students)
+    rows = []
+
+    for req in requests:
+        if req['status'] != "pending" or req['type'] != request_type:
+            continue
+
+        book = books_by_id.get(req['book_id'])
+        student = students_by_id.get(req['student_id'])
+
+        if book and student:
+            row = {
+                "Request ID": req['id'],
+                "Student": student['name'],
+                "Book": book['title']
+            }
+            if request_type == "return":
+                row["Issue ID"] = req['issue_id']
+            row["Requested At"] = to_display(req['requested_at'])
+            if request_type == "issue":
+                row["Hold Expires"] = to_display(req.get('hold_expires_at')) or ""
+            rows.append(row)
+
+    return rows
+
+
+def student_issues(issued_books, student_id):
+    """Split a student's issues into (all, current, past)"""
+    my_issues = [issue for issue in issued_books if issue['student_id'] == student_id]
+    current_issues = [issue for issue in my_issues if not issue.get('returned', False)]
+    past_issues = [issue for issue in my_issues if issue.get('returned', False)]
+    return my_issues, current_issues, past_issues
+
+
+def _due_status(days_left):
+    return "Overdue" if days_left < 0 else "Due Soon" if days_left <= 3 else "Active"
+
+
+def student_due_rows(current_issues, books, current_date=None):
+    """Rows for a student's borrowed books with days left (student overview)"""
+    current_date = current_date or datetime.now()
+    books_by_id = index_by_id(books)
+    rows = []
+
+    for issue in current_issues:
+        book = books_by_id.get(issue['book_id'])
+
+        if book:
+            days_left = (parse_date(issue['due_date']) - current_date).days
+
+            rows.append({
+                "Book": book['title'],
+                "Author": book['author'],
+                "Due Date": to_display(issue['due_date']),
+                "Days Left": days_left,
+                "Status": _due_status(days_left)
+            })
+
+    return rows
+
+
+def student_current_rows(current_issues, books, current_date=None):
+    """Rows for the student's "Currently Borrowed" table"""
+    current_date = current_date or datetime.now()
+    books_by_id = index_by_id(books)
+    rows = []
+
+    for issue in current_issues:
+        book = books_by_id.get(issue['book_id'])
+
+        if book:
+            days_left = (parse_date(issue['due_date']) - current_date).days
+
+            rows.append({
+                "Issue ID": issue['id'],
+                "Book": book['title'],
+                "Author": book['author'],
+                "Genre": book['genre'],
+                "Issue Date": to_display(issue['issue_date']),
+                "Due Date": to_display(issue['due_date']),
+                "Days Left": days_left,
+                "Status": _due_status(days_left),
+                "Return Requested": "Yes" if issue.get('return_requested', False) else "No"
+            })
+
+    return rows
+
+
+def student_history_rows(past_issues, books):
+    """Rows for the student's "Return History" table"""
+    books_by_id = index_by_id(books)
+    rows = []
+
+    for issue in past_issues:
+        book = books_by_id.get(issue['book_id'])
+
+        if book:
+            # Check if return was late
+            was_late = parse_date(issue['return_date']) > parse_date(issue['due_date'])
+
+            rows.append({
+                "Book": book['title'],
+                "Author": book['author'],
+                "Genre": book['genre'],
+                "Issue Date": to_display(issue['issue_date']),
+                "Due Date": to_display(issue['due_date']),
+                "Return Date": to_display(issue['return_date']),
+                "Status": "Late Return" if was_late else "On Time"
+            })
+
+    return rows
+
+
+def student_request_rows(requests, books, student_id, positions):
+    """Rows for a student's open requests, with hold queue positions"""
+    books_by_id = index_by_id(books)
+    rows = []
+
+    for req in requests:
+        if req['student_id'] != student_id or req['status'] not in ("pending", "on_hold"):
+            continue
+
+        book = books_by_id.get(req['book_id'])
+        if not book:
+            continue
+
+        if req['status'] == "on_hold":
+            status = f"On hold (#{positions.get(req['id'], '?')} in queue)"
+        elif req.get('reserved_copy_id'):
+            status = f"Copy reserved until {to_display(req['hold_expires_at'])}"
+        else:
+            status = "Pending approval"
+
+        rows.append({
+            "Request ID": req['id'],
+            "Type": req['type'].capitalize(),
+            "Book": book['title'],
+            "Requested At": to_display(req['requested_at']),
+            "Status": status
+        })
+
+    return rows
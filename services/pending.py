@@ -0,0 +1,58 @@
+"""Duplicate detection for issue and return requests.
+
+A double-click or a rerun used to submit the same request twice, and
+admins had to process both. PendingIndex maps every open request
+(pending or on hold) to its (student_id, book_id, type) triple, and
+every request that carries one to its client idempotency key, so a
+submission can be matched to the request it repeats with two dict
+lookups. The index is built in the same pass that loads requests.json
+for the submission, and a student holds at most one open request per
+title and type, which bounds the pending queue admins see.
+"""
+from services.archive import ACTIVE_REQUEST_STATUSES
+
+
+def request_key(student_id, book_id, request_type):
+    return (student_id, book_id, request_type)
+
+
+class PendingIndex:
+    """Open requests by (student_id, book_id, type) and requests by idempotency key"""
+
+    def __init__(self, requests):
+        self.open = {}
+        self.by_idempotency_key = {}
+        for request in requests:
+            self.add(request)
+
+    def add(self, request):
+        if request['status'] in ACTIVE_REQUEST_STATUSES:
+            self.open[request_key(request['student_id'], request['book_id'], request['type'])] = request
+        idempotency_key = request.get('idempotency_key')
+        if idempotency_key:
+            self.by_idempotency_key[idempotency_key] = request
+
+    def find(self, student_id, book_id, request_type):
+        """The open request a new one would duplicate, if any"""
+        return self.open.get(request_key(student_id, book_id, request_type))
+
+    def find_submission(self, idempotency_key, student_id, request_type, book_id=None, issue_id=None):
+        """The request already created by a submission with this key for the same target, if any.
+
+        A key held by a request for another student, type, book or loan
+        (a stale key left by a submission whose response was lost) is not
+        a repeat of this call and is ignored.
+        """
+        if not idempotency_key:
+            return None
+        request = self.by_idempotency_key.get(idempotency_key)
+        if request is None or request['student_id'] != student_id or request['type'] != request_type:
+            return None
+        if book_id is not None and request['book_id'] != book_id:
+            return None
+        if issue_id is not None and request.get('issue_id') != issue_id:
+            return None
+        return request
+
+    def key_in_use(self, idempotency_key):
+        return idempotency_key in self.by_idempotency_key
@@ -0,0 +1,226 @@
+import argparse
+import heapq
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional: full rebuilds fall back to pure Python co-counting
+    np = None
+    sparse = None
+
+# Neighbours kept per book
+TOP_K = 10
+
+# Seconds between automatic refreshes of the table from the change feed
+REFRESH_INTERVAL = 600
+
+_table_cache = {}
+_table_cache_lock = threading.Lock()
+_last_refresh = {}
+
+
+def issue_seq(issue_id):
+    """Numeric part of an issue id (ISS-42 -> 42); issues are processed in this order"""
+    try:
+        return int(str(issue_id).rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def _top_neighbors(book_id, co_counts, borrower_counts, top_k):
+    """Top-k [book_id, cosine score] pairs from a row of co-borrow counts"""
+    own = borrower_counts[book_id]
+    scored = (
+        (round(count / math.sqrt(own * borrower_counts[other]), 4), other)
+        for other, count in co_counts.items() if other != book_id
+    )
+    return [[other, score] for score, other in heapq.nsmallest(top_k, scored, key=lambda pair: (-pair[0], pair[1]))]
+
+
+class CoBorrowRecommender:
+    """Item-item "borrowed together" similarities over the issue history.
+
+    Books are compared by the students who borrowed them (a binary
+    student x book matrix): score(a, b) = co_borrowers / sqrt(borrowers_a
+    * borrowers_b). Each book's top-k neighbours are precomputed, so a
+    lookup is a dict access. New issues only recompute the rows of the
+    books their students have borrowed; other rows pick up the changed
+    borrower counts the next time they are touched or rebuilt.
+
+    Stored in recommendations.json as {"last_seq", "event_seq",
+    "student_books", "book_students", "neighbors"}; event_seq is the
+    change feed position new issues are read from, and book_students is
+    the inverted index, kept so an update doesn't rebuild it.
+    """
+
+    def __init__(self, data=None, top_k=TOP_K):
+        data = data or {}
+        self.top_k = top_k
+        self.last_seq = data.get('last_seq', 0)
+        self.event_seq = data.get('event_seq')
+        self.student_books = {student_id: set(book_ids) for student_id, book_ids in data.get('student_books', {}).items()}
+        self.neighbors = data.get('neighbors', {})
+        self._book_students = None
+        if 'book_students' in data:
+            self._book_students = {book_id: set(student_ids) for book_id, student_ids in data['book_students'].items()}
+
+    def to_dict(self):
+        return {
+            "last_seq": self.last_seq,
+            "event_seq": self.event_seq,
+            "student_books": {student_id: sorted(book_ids) for student_id, book_ids in self.student_books.items()},
+            "book_students": {book_id: sorted(student_ids) for book_id, student_ids in self._borrowers().items()},
+            "neighbors": self.neighbors
+        }
+
+    def recommend(self, book_id, limit=None):
+        return self.neighbors.get(book_id, [])[:limit or self.top_k]
+
+    def _borrowers(self):
+        if self._book_students is None:
+            self._book_students = {}
+            for student_id, book_ids in self.student_books.items():
+                for book_id in book_ids:
+                    self._book_students.setdefault(book_id, set()).add(student_id)
+        return self._book_students
+
+    def _row(self, book_id):
+        book_students = self._borrowers()
+        co_counts = Counter()
+        for student_id in book_students.get(book_id, ()):
+            co_counts.update(self.student_books[student_id])
+        borrower_counts = {other: len(book_students[other]) for other in co_counts}
+        return _top_neighbors(book_id, co_counts, borrower_counts, self.top_k)
+
+    def rebuild(self, issued_books):
+        """Recompute every book's neighbours from the full issue history"""
+        self.student_books = {}
+        self._book_students = None
+        self.last_seq = 0
+        for issue in issued_books:
+            self.student_books.setdefault(issue['student_id'], set()).add(issue['book_id'])
+            self.last_seq = max(self.last_seq, issue_seq(issue['id']))
+
+        if sparse is not None:
+            self.neighbors = self._sparse_neighbors()
+        else:
+            self.neighbors = {}
+            for book_id in self._borrowers():
+                row = self._row(book_id)
+                if row:
+                    self.neighbors[book_id] = row
+
+    def _sparse_neighbors(self):
+        """All rows at once: co-borrow counts are X^T X for the binary student x book matrix"""
+        book_ids = sorted({book_id for book_ids in self.student_books.values() for book_id in book_ids})
+        book_index = {book_id: i for i, book_id in enumerate(book_ids)}
+        rows, cols = [], []
+        for row, book_ids_of_student in enumerate(self.student_books.values()):
+            for book_id in book_ids_of_student:
+                rows.append(row)
+                cols.append(book_index[book_id])
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(self.student_books), len(book_ids))
+        )
+        co_counts = (matrix.T @ matrix).tocsr()
+        borrower_counts = co_counts.diagonal().astype(np.int64)
+        co_counts.setdiag(0)
+        co_counts.eliminate_zeros()
+
+        # Score every pair at once, then order each row by (-score, book id);
+        # column order is book id order because book_ids is sorted
+        row_of = np.repeat(np.arange(len(book_ids)), np.diff(co_counts.indptr))
+        scores = np.round(co_counts.data / np.sqrt(borrower_counts[row_of] * borrower_counts[co_counts.indices]), 4)
+        order = np.lexsort((co_counts.indices, -scores, row_of))
+        columns, scores = co_counts.indices[order], scores[order]
+
+        neighbors = {}
+        for i, book_id in enumerate(book_ids):
+            start = co_counts.indptr[i]
+            end = min(co_counts.indptr[i + 1], start + self.top_k)
+            if start < end:
+                neighbors[book_id] = [[book_ids[j], float(score)] for j, score in zip(columns[start:end], scores[start:end])]
+        return neighbors
+
+    def update(self, issued_books):
+        """Fold in issues newer than the last one processed; returns how many were new"""
+        new_issues = [issue for issue in issued_books if issue_seq(issue['id']) > self.last_seq]
+        if not new_issues:
+            return 0
+
+        book_students = self._borrowers()
+        affected = set()
+        for issue in new_issues:
+            student_id, book_id = issue['student_id'], issue['book_id']
+            self.last_seq = max(self.last_seq, issue_seq(issue['id']))
+            books_of_student = self.student_books.setdefault(student_id, set())
+            if book_id in books_of_student:
+                continue
+            books_of_student.add(book_id)
+            book_students.setdefault(book_id, set()).add(student_id)
+            # Every book this student borrowed gains (or strengthens) a co-borrow pair
+            affected |= books_of_student
+
+        for book_id in affected:
+            row = self._row(book_id)
+            if row:
+                self.neighbors[book_id] = row
+            else:
+                self.neighbors.pop(book_id, None)
+
+        return len(new_issues)
+
+
+def refresh_due(path, interval=REFRESH_INTERVAL):
+    """True at most once per interval per table; the caller then refreshes it"""
+    now = time.monotonic()
+    with _table_cache_lock:
+        if now - _last_refresh.get(path, float('-inf')) < interval:
+            return False
+        _last_refresh[path] = now
+    return True
+
+
+def cached_neighbors(path, load):
+    """The neighbour table at path, parsed once per process and reloaded when the file changes.
+
+    Returns (neighbors, cache_hit); load() parses the file on a miss.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return {}, False
+
+    entry = _table_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1], True
+
+    neighbors = (load() or {}).get('neighbors', {})
+    with _table_cache_lock:
+        _table_cache[path] = (signature, neighbors)
+    return neighbors, False
+
+
+def main(argv=None):
+    from services.file_handler import FileHandler
+
+    parser = argparse.ArgumentParser(description="Fold new issues into the co-borrow recommendation table")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the table from the full issue history")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    processed = FileHandler(data_dir=args.data_dir).refresh_recommendations(rebuild=args.rebuild)
+    print(f"Processed {processed} issues in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Compact record classes for collections held in memory.
+
+JSON records load as dicts, each with its own hash table of key
+pointers. The classes here store the known fields of a book, student,
+issue, request or log entry in ``__slots__`` instead, and share the
+strings that repeat across records (ids of books, students and copies,
+statuses, genres) through sys.intern. A 1M-issue history takes well
+under half the memory of the equivalent dicts.
+
+Records keep the JSON layout: fields that are absent from the JSON stay
+unset (so ``record.get('returned', False)`` behaves as for the dict),
+unknown fields go to an overflow dict, and to_dict() reproduces the
+original record. Each record points to a layout shared by every record
+with the same fields, which reads all of them at once, so to_dict()
+builds the dict without a Python-level loop over the fields. The dict-style accessors ([], get, in, keys, items)
+let code written against dicts read records unchanged; writers should
+keep using dicts from read_json_file.
+"""
+import gc
+import sys
+from operator import attrgetter
+
+_MISSING = object()
+
+
+class _Layout:
+    """The known fields a record has, in JSON order, and a getter returning their values"""
+
+    __slots__ = ('fields', 'values', 'setters', 'shared')
+
+    def __init__(self, record_class, fields):
+        self.fields = fields
+        self.setters = tuple(record_class._setters[field] for field in fields)
+        self.shared = tuple((field, record_class._shared_setters[field])
+                            for field in fields if field in record_class._shared_setters)
+        if len(fields) > 1:
+            self.values = attrgetter(*fields)
+        elif fields:
+            getter = attrgetter(fields[0])
+            self.values = lambda record: (getter(record),)
+        else:
+            self.values = lambda record: ()
+
+
+class Record:
+    """Base for slotted records with dict-style read access"""
+
+    __slots__ = ('_extra', '_layout')
+
+    # Known fields, in JSON order
+    FIELDS = ()
+    # Fields whose values repeat across records and are interned
+    SHARED_FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+        # Slot descriptors' setters, called directly: cheaper than setattr per field
+        cls._setters = {field: getattr(cls, field).__set__ for field in cls.FIELDS}
+        cls._shared_setters = {field: cls._setters[field] for field in cls.SHARED_FIELDS}
+        cls._layouts = {}
+
+    @classmethod
+    def _layout_for(cls, fields):
+        layout = cls._layouts.get(fields)
+        if layout is None:
+            layout = cls._layouts[fields] = _Layout(cls, fields)
+        return layout
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        # Fast path: a dict of known fields in a layout seen before
+        layout = cls._layouts.get(tuple(data))
+        if layout is not None:
+            for setter, value in zip(layout.setters, data.values()):
+                setter(record, value)
+            for field, setter in layout.shared:
+                value = data[field]
+                if value.__class__ is str:
+                    setter(record, sys.intern(value))
+            record._extra = None
+            record._layout = layout
+            return record
+
+        extra = None
+        setters = cls._setters
+        shared = cls._shared_setters
+        for key, value in data.items():
+            setter = setters.get(key)
+            if setter is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            elif key in shared and value.__class__ is str:
+                setter(record, sys.intern(value))
+            else:
+                setter(record, value)
+        record._extra = extra
+        fields = tuple(data) if extra is None else tuple(key for key in data if key not in extra)
+        record._layout = cls._layout_for(fields)
+        return record
+
+    def to_dict(self):
+        layout = self._layout
+        data = dict(zip(layout.fields, layout.values(self)))
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+            if key not in self._layout.fields:
+                self._layout = self._layout_for(self._layout.fields + (key,))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Book(Record):
+    """A title in books.json"""
+
+    FIELDS = ('id', 'title', 'author', 'genre', 'available', 'total_copies', 'available_copies', 'added_at', 'isbn')
+    SHARED_FIELDS = ('author', 'genre')
+    __slots__ = FIELDS
+
+
+class Student(Record):
+    """A student account in students.json"""
+
+    FIELDS = ('id', 'name', 'email', 'password', 'role', 'approved', 'flagged', 'created_at')
+    SHARED_FIELDS = ('role',)
+    __slots__ = FIELDS
+
+
+class Issue(Record):
+    """A loan in issued_books.json"""
+
+    FIELDS = ('id', 'student_id', 'book_id', 'copy_id', 'issue_date', 'due_date', 'returned', 'return_date',
+              'return_requested')
+    SHARED_FIELDS = ('student_id', 'book_id', 'copy_id')
+    __slots__ = FIELDS
+
+
+class Request(Record):
+    """An issue or return request in requests.json"""
+
+    FIELDS = ('id', 'type', 'student_id', 'book_id', 'issue_id', 'requested_at', 'status', 'approved_at',
+              'reserved_copy_id', 'hold_ready_at', 'hold_expires_at', 'expired_at', 'idempotency_key')
+    SHARED_FIELDS = ('type', 'student_id', 'book_id', 'status', 'reserved_copy_id')
+    __slots__ = FIELDS
+
+
+class LogEntry(Record):
+    """A row of logs.csv"""
+
+    FIELDS = ('timestamp', 'user_id', 'user_role', 'action', 'details')
+    SHARED_FIELDS = ('user_id', 'user_role', 'action')
+    __slots__ = FIELDS
+
+
+RECORD_TYPES = {
+    'books.json': Book,
+    'students.json': Student,
+    'issued_books.json': Issue,
+    'requests.json': Request,
+    'logs.csv': LogEntry,
+}
+
+
+def load_records(file_name, records):
+    """Convert a collection's dicts to its record class"""
+    from_dict = RECORD_TYPES[file_name].from_dict
+    # Records hold no reference cycles; pausing the cyclic GC while creating
+    # many of them avoids repeated full collections
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return [from_dict(record) for record in records]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def as_dict(record):
+    """A plain dict for a record or dict (e.g. for JSON serialization)"""
+    return record.to_dict() if isinstance(record, Record) else record
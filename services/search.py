@@ -0,0 +1,103 @@
+"""Prefix search for the book and student pickers.
+
+Selectboxes over every book or student send the whole list to the
+browser on each rerun. The pickers instead ask for the first few
+records whose title, name or id starts with what was typed. PrefixIndex
+keeps the lower-cased keys sorted next to their record positions, so a
+lookup is two binary searches plus a walk over at most the matches it
+returns.
+
+Indexes are built on first search and kept until the file changes: the
+book index lives on the BookCatalog (services.catalog), the student one
+in a StudentDirectory (see cached_directory).
+"""
+import os
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+# Sorts after any character a prefix can continue with
+_KEY_END = '\U0010ffff'
+
+_directory_cache = {}
+_directory_cache_lock = threading.Lock()
+
+
+class PrefixIndex:
+    """Sorted (key, position) pairs answering prefix lookups"""
+
+    def __init__(self, keys, positions):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.positions = np.asarray(positions)[order].tolist()
+
+    def search(self, prefix, limit=10, accept=None):
+        """Positions whose key starts with prefix (case-insensitive), in key order.
+
+        A position indexed under several keys is returned once; accept, a
+        boolean array over positions, drops the positions it marks False.
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + _KEY_END, start)
+
+        found = []
+        seen = set()
+        for i in range(start, stop):
+            position = self.positions[i]
+            if position in seen or (accept is not None and not accept[position]):
+                continue
+            seen.add(position)
+            found.append(position)
+            if len(found) >= limit:
+                break
+        return found
+
+
+def keyed_index(*columns):
+    """PrefixIndex over several key columns of the same records (e.g. title and id)"""
+    keys = []
+    for column in columns:
+        keys.extend(str(value).lower() for value in column)
+    size = len(columns[0]) if columns else 0
+    return PrefixIndex(keys, np.tile(np.arange(size), len(columns)))
+
+
+class StudentDirectory:
+    """students.json with a name/id prefix index"""
+
+    def __init__(self, students):
+        self.students = students
+        self.approved = np.array([bool(student.get('approved', False)) for student in students], dtype=bool)
+        self.index = keyed_index([student.get('name', "") for student in students],
+                                 [student.get('id', "") for student in students])
+
+    def __len__(self):
+        return len(self.students)
+
+    def search(self, prefix="", limit=10, approved_only=False):
+        """Up to limit students whose name or id starts with prefix"""
+        positions = self.index.search(prefix, limit, self.approved if approved_only else None)
+        return [self.students[i] for i in positions]
+
+
+def cached_directory(path, load):
+    """The StudentDirectory of the students file at path, rebuilt when the file changes.
+
+    Returns (directory, cache_hit); load() reads the students on a miss.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return StudentDirectory([]), False
+
+    entry = _directory_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1], True
+
+    directory = StudentDirectory(load() or [])
+    with _directory_cache_lock:
+        _directory_cache[path] = (signature, directory)
+    return directory, False
@@ -0,0 +1,69 @@
+"""Per-render snapshot of the library collections.
+
+A page render reads the same collections from several sections: the
+student dashboard alone read books.json four times per rerun.
+RenderSnapshot wraps a FileHandler (or StorageClient) for one render and
+loads each collection at most once, on first access, as compact records
+(services.records); every section gets the same list. Other methods pass straight through to the handler, and
+any that may change data (everything outside READ_METHODS) drops the
+snapshot, so reads after a write see it.
+
+Snapshot collections are shared between sections and must not be
+modified.
+"""
+from services.file_handler import READ_METHODS
+
+ARCHIVED_COLLECTIONS = ('issued_books.json', 'requests.json')
+
+
+class RenderSnapshot:
+    """Collections read at most once per page render"""
+
+    def __init__(self, file_handler):
+        self.file_handler = file_handler
+        self._collections = {}
+        self._archives = {}
+        self._catalog = None
+
+    def read_json_file(self, file_name):
+        records = self._collections.get(file_name)
+        if records is None:
+            records = self.file_handler.read_records(file_name)
+            self._collections[file_name] = records
+        return records
+
+    def read_history(self, file_name, student_id=None):
+        """Hot records plus archived ones, as FileHandler.read_history, from the snapshot"""
+        records = self.read_json_file(file_name)
+        if file_name in ARCHIVED_COLLECTIONS:
+            archived = self._archives.get(file_name)
+            if archived is None:
+                archived = self.file_handler.read_archive(file_name)
+                self._archives[file_name] = archived
+            records = archived + records
+        if student_id is not None:
+            records = [record for record in records if record.get('student_id') == student_id]
+        return records
+
+    def get_catalog(self):
+        if self._catalog is None:
+            self._catalog = self.file_handler.get_catalog()
+        return self._catalog
+
+    def invalidate(self):
+        """Forget everything read so far"""
+        self._collections.clear()
+        self._archives.clear()
+        self._catalog = None
+
+    def __getattr__(self, name):
+        attribute = getattr(self.file_handler, name)
+        if name in READ_METHODS or not callable(attribute):
+            return attribute
+
+        def write(*args, **kwargs):
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self.invalidate()
+        return write
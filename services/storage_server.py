@@ -0,0 +1,362 @@
+"""Local storage daemon for the library data.
+
+One server process per host keeps the JSON collections in memory and
+serves the FileHandler API over a Unix domain socket, so several
+Streamlit processes share one parsed copy of the data and every write is
+serialized in one place.
+
+    python -m services.storage_server --data-dir data
+
+Set LIBRARY_STORAGE_SOCKET (or construct StorageClient directly) to use
+it from the app; StorageClient has the same methods as FileHandler.
+
+Wire protocol: each message is a 4-byte big-endian length followed by a
+compact UTF-8 JSON body. Requests are {"m": method, "a": args, "k": kwargs},
+responses {"ok": true, "r": result} or {"ok": false, "e": message}.
+Tuples travel as {"__tuple__": [...]} and DataFrames as
+{"__df__": {"columns": [...], "dtypes": {...}, "data": [[...], ...]}},
+dtypes naming the categorical and datetime columns to restore.
+"""
+import argparse
+import copy
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+import pandas as pd
+
+from services.catalog import BookCatalog
+from services.file_handler import READ_METHODS, FileHandler
+from services.records import RECORD_TYPES, Record, load_records
+
+HEADER = struct.Struct('>I')
+MAX_MESSAGE = 256 * 1024 * 1024
+
+# Calls StorageClient may repeat after the request reached the server
+RETRY_METHODS = READ_METHODS | {'ping'}
+
+# Pure helpers over data the caller already holds; the client runs these locally
+LOCAL_METHODS = {'compute_analytics'}
+
+# Results that can't travel as JSON; StorageClient builds them from served data
+CLIENT_METHODS = {'get_catalog', 'read_records'}
+
+# Public FileHandler API served by the daemon
+SERVED_METHODS = sorted(
+    name for name in dir(FileHandler)
+    if not name.startswith('_') and callable(getattr(FileHandler, name))
+    and name not in LOCAL_METHODS and name not in CLIENT_METHODS
+)
+
+
+class StorageError(Exception):
+    """Raised by StorageClient when the server can't be reached or rejects a call"""
+
+
+def default_socket_path(data_dir):
+    return os.path.join(data_dir, '.storage.sock')
+
+
+def _json_default(value):
+    # Archived history is held as record objects; they travel as plain dicts
+    return value.to_dict() if isinstance(value, Record) else str(value)
+
+
+def _encode(message):
+    body = json.dumps(message, separators=(',', ':'), default=_json_default).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_message(sock):
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE:
+        raise StorageError(f"Message of {length} bytes exceeds limit")
+    body = _recv_exact(sock, length)
+    if body is None:
+        return None
+    return json.loads(body)
+
+
+def _encode_result(result):
+    if isinstance(result, tuple):
+        return {"__tuple__": list(result)}
+    if isinstance(result, pd.DataFrame):
+        # Categorical and datetime columns are restored on the client
+        dtypes = {column: str(dtype) for column, dtype in result.dtypes.items()
+                  if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_datetime64_any_dtype(dtype)}
+        return {"__df__": {"columns": list(result.columns), "dtypes": dtypes,
+                           "data": result.astype(object).where(result.notna(), None).values.tolist()}}
+    return result
+
+
+def _decode_result(result):
+    if isinstance(result, dict):
+        if "__tuple__" in result:
+            return tuple(result["__tuple__"])
+        if "__df__" in result:
+            frame = result["__df__"]
+            df = pd.DataFrame(frame["data"], columns=frame["columns"])
+            for column, dtype in frame.get("dtypes", {}).items():
+                df[column] = pd.to_datetime(df[column]) if dtype.startswith("datetime") else df[column].astype(dtype)
+            return df
+    return result
+
+
+def _copy_collection(data):
+    """Copy a collection deep enough that callers can mutate its records, as dicts"""
+    if isinstance(data, list):
+        return [record.to_dict() if isinstance(record, Record)
+                else dict(record) if isinstance(record, dict) else record for record in data]
+    return copy.deepcopy(data)
+
+
+def _cached_form(file_name, data):
+    """What the cache keeps for a collection: records where there is a record class, else a copy"""
+    if file_name in RECORD_TYPES and isinstance(data, list):
+        return load_records(file_name, data)
+    return _copy_collection(data)
+
+
+class MemoryFileHandler(FileHandler):
+    """FileHandler that keeps parsed JSON collections in memory.
+
+    Books, students, issues and requests are kept as compact records
+    (services.records). Writes go to memory and through to disk. Reads
+    hand out per-record dict copies because FileHandler methods mutate
+    what they read before deciding whether to write it back; read_records
+    hands out the cached records themselves. A collection is reloaded if
+    its file changes on disk behind the server's back.
+    """
+
+    def __init__(self, data_dir='data'):
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        super().__init__(data_dir=data_dir)
+
+    def _file_signature(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _cached(self, file_name):
+        """A collection from memory, loading it from disk on first use"""
+        file_path = os.path.join(self.data_dir, file_name)
+        signature = self._file_signature(file_path)
+        entry = self._cache.get(file_name)
+
+        if entry is None or entry[0] != signature:
+            data = _cached_form(file_name, super().read_json_file(file_name))
+            with self._cache_lock:
+                entry = self._cache[file_name] = (signature, data)
+
+        return entry[1]
+
+    def read_json_file(self, file_name):
+        """Read a collection from memory as dicts the caller may modify"""
+        return _copy_collection(self._cached(file_name))
+
+    def read_records(self, file_name):
+        """The cached records of a collection; shared, don't modify"""
+        return self._cached(file_name)
+
+    def _read_shared(self, file_name):
+        return self._cached(file_name)
+
+    def write_json_file(self, file_name, data):
+        """Write a collection through to disk and keep it in memory"""
+        if not super().write_json_file(file_name, data):
+            return False
+
+        file_path = os.path.join(self.data_dir, file_name)
+        with self._cache_lock:
+            self._cache[file_name] = (self._file_signature(file_path), _cached_form(file_name, data))
+        return True
+
+
+class StorageRequestHandler(socketserver.BaseRequestHandler):
+    """Serves calls on one client connection until it closes"""
+
+    def handle(self):
+        while True:
+            try:
+                message = _recv_message(self.request)
+            except (OSError, ValueError, StorageError):
+                return
+            if message is None:
+                return
+            try:
+                self.request.sendall(_encode(self.server.dispatch(message)))
+            except OSError:
+                return
+
+
+class StorageServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server owning one MemoryFileHandler"""
+
+    daemon_threads = True
+
+    def __init__(self, data_dir='data', socket_path=None):
+        self.data_dir = data_dir
+        self.socket_path = socket_path or default_socket_path(data_dir)
+        self.file_handler = MemoryFileHandler(data_dir=data_dir)
+        self.write_lock = threading.RLock()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        super().__init__(self.socket_path, StorageRequestHandler)
+        os.chmod(self.socket_path, 0o660)
+
+    def dispatch(self, message):
+        method = message.get('m')
+        if method == 'ping':
+            return {"ok": True, "r": "pong"}
+        if method not in SERVED_METHODS:
+            return {"ok": False, "e": f"Unknown method: {method}"}
+
+        func = getattr(self.file_handler, method)
+        args = message.get('a') or []
+        kwargs = message.get('k') or {}
+        try:
+            if method in READ_METHODS:
+                result = func(*args, **kwargs)
+            else:
+                with self.write_lock:
+                    result = func(*args, **kwargs)
+            return {"ok": True, "r": _encode_result(result)}
+        except Exception as e:
+            return {"ok": False, "e": f"{type(e).__name__}: {str(e)}"}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class StorageClient:
+    """Drop-in replacement for FileHandler that calls a StorageServer.
+
+    Each thread keeps its own persistent connection.
+    """
+
+    def __init__(self, data_dir='data', socket_path=None, timeout=30):
+        self.data_dir = data_dir
+        self.socket_path = socket_path or default_socket_path(data_dir)
+        self.timeout = timeout
+        self.metrics_file = os.path.join(data_dir, 'metrics.prom')
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def call(self, method, *args, **kwargs):
+        """Call a method on the server and return its result"""
+        payload = _encode({"m": method, "a": list(args), "k": kwargs})
+
+        # Retry once on a fresh connection in case the server restarted, but
+        # only when the call can't have run: the server runs a message only
+        # once it has all of it, so a failed connect or send is safe to
+        # repeat. After a complete send only read-only calls are retried;
+        # a write may already have been applied.
+        for attempt in range(2):
+            sent = False
+            try:
+                sock = self._connection()
+                sock.sendall(payload)
+                sent = True
+                response = _recv_message(sock)
+                if response is None:
+                    raise ConnectionError("Storage server closed the connection")
+                break
+            except OSError as e:
+                self._reset_connection()
+                if attempt or (sent and method not in RETRY_METHODS):
+                    raise StorageError(f"Storage server unavailable at {self.socket_path}: {str(e)}")
+
+        if not response.get('ok'):
+            raise StorageError(response.get('e', "Unknown storage error"))
+
+        return _decode_result(response.get('r'))
+
+    def ping(self):
+        return self.call('ping') == "pong"
+
+    def get_catalog(self):
+        """Column view of the served books (see services.catalog), rebuilt on each call"""
+        return BookCatalog(self.read_json_file('books.json'))
+
+    def read_records(self, file_name):
+        """A served collection as compact records (services.records)"""
+        data = self.read_json_file(file_name)
+        return load_records(file_name, data) if file_name in RECORD_TYPES else data
+
+    def close(self):
+        self._reset_connection()
+
+
+def _remote_method(name):
+    def method(self, *args, **kwargs):
+        return self.call(name, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(FileHandler, name).__doc__
+    return method
+
+
+for _name in SERVED_METHODS:
+    setattr(StorageClient, _name, _remote_method(_name))
+
+for _name in LOCAL_METHODS:
+    setattr(StorageClient, _name, staticmethod(getattr(FileHandler, _name)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the library data over a Unix socket")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--socket", help="socket path (default: <data-dir>/.storage.sock)")
+    args = parser.parse_args(argv)
+
+    server = StorageServer(args.data_dir, args.socket)
+    print(f"Serving {os.path.abspath(args.data_dir)} on {server.socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Stored timestamp formats.
+
+Timestamps in books, students, issued_books, requests and the fines
+ledger are stored either as "%Y-%m-%d %H:%M:%S" strings (the default)
+or as integer epoch seconds, chosen by "timestamp_format" in
+data/storage.json. With epoch
+storage, date comparisons across loans are integer comparisons and
+columns convert to datetime64 without parsing text; the string form is
+derived only for display.
+
+Readers go through the helpers here, which accept both forms, so records
+written before a migration (or kept in the archive) stay readable.
+Epoch values count seconds from 1970-01-01 00:00:00 of the same
+wall-clock time the strings record (the app stores local time without a
+zone), so conversions never depend on the server's time zone and agree
+with pandas' unit='s'.
+
+    python -m services.timestamps --data-dir data --to epoch
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from services.file_lock import atomic_write_text
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STRING = 'string'
+EPOCH = 'epoch'
+FORMATS = (STRING, EPOCH)
+
+SETTINGS_FILE = 'storage.json'
+
+# Collection -> fields holding timestamps
+TIMESTAMP_FIELDS = {
+    'books.json': ('added_at',),
+    'students.json': ('created_at',),
+    'issued_books.json': ('issue_date', 'due_date', 'return_date'),
+    'requests.json': ('requested_at', 'approved_at', 'hold_ready_at', 'hold_expires_at', 'expired_at'),
+}
+
+_EPOCH_START = datetime(1970, 1, 1)
+_ONE_SECOND = timedelta(seconds=1)
+_NUMBER_TYPES = (int, float)
+
+_format_cache = {}
+
+
+def is_epoch(value):
+    return isinstance(value, _NUMBER_TYPES) and not isinstance(value, bool)
+
+
+def to_datetime(value):
+    """datetime for a stored timestamp (string or epoch seconds); None when missing"""
+    if value is None or value == "":
+        return None
+    if is_epoch(value):
+        return _EPOCH_START + timedelta(seconds=int(value))
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def to_epoch(value):
+    """Epoch seconds for a stored timestamp; None when missing"""
+    if value is None or value == "":
+        return None
+    if is_epoch(value):
+        return int(value)
+    moment = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return (moment - _EPOCH_START) // _ONE_SECOND
+
+
+def to_display(value):
+    """"%Y-%m-%d %H:%M:%S" text for a stored timestamp; missing values pass through"""
+    if is_epoch(value):
+        return str(_EPOCH_START + timedelta(seconds=int(value)))
+    return value
+
+
+def day(value):
+    """'YYYY-MM-DD' of a stored timestamp ('' when missing)"""
+    if not value:
+        return ""
+    return to_display(value)[:10]
+
+
+def stamp(moment, timestamp_format=STRING):
+    """A datetime in the given storage format"""
+    if timestamp_format == EPOCH:
+        return (moment - _EPOCH_START) // _ONE_SECOND
+    return moment.strftime(DATE_FORMAT)
+
+
+def datetime_series(values):
+    """Stored timestamps as a datetime64 Series (NaT when missing or unparseable).
+
+    Strings are parsed in one vectorized call and epoch values converted
+    without parsing; a list may hold both.
+    """
+    values = list(values)
+    kinds = set(map(type, values))
+    kinds.discard(type(None))
+    if not kinds & {int, float}:
+        return pd.to_datetime(pd.Series(values, dtype=object), format=DATE_FORMAT, errors='coerce')
+    if kinds <= {int, float}:
+        return pd.to_datetime(pd.Series(values, dtype='float64'), unit='s')
+
+    # Both forms, e.g. archived records not migrated yet
+    values = pd.Series(values, dtype=object)
+    epoch = np.fromiter(map(is_epoch, values), dtype=bool, count=len(values))
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[s]')
+    result[epoch] = pd.to_datetime(values[epoch].astype('float64'), unit='s')
+    result[~epoch] = pd.to_datetime(values[~epoch], format=DATE_FORMAT, errors='coerce')
+    return result
+
+
+def convert_records(records, fields, timestamp_format):
+    """Rewrite the timestamp fields of records (dicts) in place; returns how many values changed"""
+    convert = to_epoch if timestamp_format == EPOCH else to_display
+    changed = 0
+    for record in records:
+        for field in fields:
+            value = record.get(field)
+            if value is None or value == "":
+                continue
+            converted = convert(value)
+            if converted != value or type(converted) is not type(value):
+                record[field] = converted
+                changed += 1
+    return changed
+
+
+def read_timestamp_format(data_dir):
+    """The configured storage format, re-read only when storage.json changes"""
+    path = os.path.join(data_dir, SETTINGS_FILE)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return STRING
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    entry = _format_cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    try:
+        with open(path, 'r') as f:
+            timestamp_format = json.load(f).get('timestamp_format', STRING)
+    except (OSError, ValueError):
+        timestamp_format = STRING
+    if timestamp_format not in FORMATS:
+        timestamp_format = STRING
+    _format_cache[path] = (signature, timestamp_format)
+    return timestamp_format
+
+
+def write_timestamp_format(data_dir, timestamp_format):
+    path = os.path.join(data_dir, SETTINGS_FILE)
+    try:
+        with open(path, 'r') as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        settings = {}
+    settings['timestamp_format'] = timestamp_format
+    atomic_write_text(path, json.dumps(settings, indent=4))
+
+
+def main(argv=None):
+    from services.file_handler import FileHandler
+
+    parser = argparse.ArgumentParser(description="Convert stored timestamps between strings and epoch seconds")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--to", choices=FORMATS, required=True, dest="timestamp_format")
+    args = parser.parse_args(argv)
+
+    converted = FileHandler(data_dir=args.data_dir).migrate_timestamps(args.timestamp_format)
+    for name, count in converted.items():
+        print(f"{name}: converted {count} timestamps")
+    print(f"Timestamps are now stored as {args.timestamp_format}")
+
+
+if __name__ == "__main__":
+    main()